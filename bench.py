@@ -0,0 +1,471 @@
+"""宠物养成游戏的基准测试
+
+按文件路径加载任意版本的游戏(main_GUI_V4.x.py、main_GUI_V5.py等),只使用各版本共有的接口
+计时核心操作,结果写成JSON,便于跟踪不同版本之间的性能变化:
+
+    python bench.py                                    # 测试main_GUI_V5.py
+    python bench.py main_GUI_V4.2.py main_GUI_V5.py --sizes 1000 100000
+    python bench.py --only "save_game*" --sizes 1000000
+    python bench.py --compare bench_results/旧.json bench_results/新.json
+
+没有图形环境(无法创建Tk窗口)时界面测试使用替身tkinter,只统计Python侧的绘制开销,
+结果中的"tk"字段记录使用的是真实Tk还是替身,两者的界面数据不能直接比较。
+"""
+
+import argparse
+import gc
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+from fnmatch import fnmatch
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_GAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_GUI_V5.py")
+DEFAULT_SIZES = (1000, 100000, 1000000)  # 宠物名册规模
+DEFAULT_OUTPUT = "bench_results"
+MIN_TIME = 0.2  # 每批调用至少持续的秒数
+REPEAT = 3  # 每项测试重复的批数,取最快的一批
+LEVEL_TARGET = 99  # 经验测试升到的等级(V4在满级后继续获得经验会死循环)
+
+
+class _StubWidget:
+    """替身控件: 接受任何参数,任何属性和调用都返回新的替身,不绘制任何内容。
+    替身是假值、空序列、空字符串和0,界面代码按"没有内容"的分支执行"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _StubWidget()
+
+    def __call__(self, *args, **kwargs):
+        return _StubWidget()
+
+    def __getitem__(self, key):
+        return _StubWidget()
+
+    def __setitem__(self, key, value) -> None:
+        pass
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self) -> int:
+        return 0
+
+    def __str__(self) -> str:
+        return ""
+
+    def __int__(self) -> int:
+        return 0
+
+    def __float__(self) -> float:
+        return 0.0
+
+    __index__ = __int__
+
+
+class _StubModule(types.ModuleType):
+    """替身tkinter模块: 以Error结尾的名字是异常类,其他大写名字是控件类,小写名字是替身函数"""
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name.endswith("Error"):
+            value = type(name, (Exception,), {})
+        elif name[:1].isupper():
+            value = type(name, (_StubWidget,), {})
+        else:
+            value = _StubWidget()
+        # 记住取出的值,except tk.TclError和isinstance检查每次得到同一个类
+        setattr(self, name, value)
+        return value
+
+
+def install_stub_tk() -> None:
+    """用替身替换tkinter,必须在加载游戏模块之前调用"""
+    package = _StubModule("tkinter")
+    package.__path__ = []
+    for name in ("ttk", "messagebox", "filedialog", "simpledialog", "font", "scrolledtext"):
+        module = _StubModule(f"tkinter.{name}")
+        setattr(package, name, module)
+        sys.modules[module.__name__] = module
+    sys.modules["tkinter"] = package
+
+
+def choose_tk(mode: str) -> str:
+    """选择界面测试使用的Tk: auto时能创建窗口就用真实Tk,否则换成替身;返回"real"或"stub" """
+    if mode != "stub":
+        try:
+            import tkinter
+            tkinter.Tk().destroy()
+            return "real"
+        except Exception as e:  # 没有tkinter,或没有图形环境(tkinter.TclError)
+            error = e
+        if mode == "real":
+            raise SystemExit(f"无法创建Tk窗口: {error}")
+    install_stub_tk()
+    return "stub"
+
+
+def load_game_module(path: str) -> types.ModuleType:
+    """按路径加载游戏文件(文件名可以含点,例如main_GUI_V4.1.py),不会运行其main()"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = "bench_" + re.sub(r"\W", "_", stem)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # 数据类等按模块名查找定义,执行前先登记
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def file_revision(path: str) -> Dict[str, Optional[str]]:
+    """游戏文件的版本标识: 内容的sha256,以及所在git仓库的当前提交(不在仓库中时为None)"""
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(path),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"sha256": digest, "git_commit": commit}
+
+
+class GameBench:
+    """对一个游戏模块运行全部基准测试,结果按"测试名@名册规模"记录单次耗时"""
+
+    FOOD = "regular_food"
+    GAME = "fetch"
+    ITEM = "medicine"
+    CONTEST = 0  # 简单难度的比赛,1级宠物即可参加
+    SAVE_FILE = "bench_save"
+
+    def __init__(self, module: types.ModuleType, sizes: Iterable[int], tk_mode: str,
+                 min_time: float = MIN_TIME, seed: int = 0, only: Optional[List[str]] = None):
+        self.module = module
+        self.sizes = list(sizes)
+        self.tk_mode = tk_mode
+        self.min_time = min_time
+        self.seed = seed
+        self.only = only
+        self.species = list(module.Pet.SPECIES_BASE_STATS)
+        self.results: Dict[str, dict] = {}
+
+    def run(self) -> Dict[str, dict]:
+        """运行全部测试: 先是与名册规模无关的单宠物操作,再按规模逐个建立名册测试"""
+        self.bench_pet_actions()
+        self.bench_contests()
+        for size in self.sizes:
+            if not any(self.enabled(name) for name in
+                       ("find_pet", "use_item", "save_game*", "load_game*", "update_all_displays*")):
+                break
+            game = self.build_game(size)
+            self.bench_roster(game, size)
+            self.bench_save_load(game, size)
+            self.bench_display(game, size)
+            del game
+            gc.collect()
+        return self.results
+
+    # ---- 计时 ----
+
+    def enabled(self, name: str) -> bool:
+        """测试是否被--only选中(name可以带通配符)"""
+        return not self.only or any(fnmatch(name, pattern) or fnmatch(pattern, name)
+                                    for pattern in self.only)
+
+    def reseed(self) -> None:
+        """每项测试前重置随机数,同一版本多次运行的随机事件相同"""
+        random.seed(self.seed)
+        if hasattr(self.module, "GameRandom"):
+            self.module.RANDOM = self.module.GameRandom(self.seed)
+
+    def record(self, name: str, size: Optional[int], calls: int, seconds: float, **extra) -> None:
+        key = name if size is None else f"{name}@{size}"
+        per_call = seconds / calls * 1e6
+        self.results[key] = {"calls": calls, "seconds": seconds, "per_call_us": per_call, **extra}
+        count = f"每批{extra['entries']}项" if "entries" in extra else f"{calls}次"
+        print(f"  {key:<36}{per_call:>16.2f} 微秒/次  ({count})", flush=True)
+
+    @staticmethod
+    def _timed(func: Callable, *args) -> float:
+        """计时一次调用,计时期间暂停垃圾回收(与timeit相同)"""
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func(*args)
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    def time_batches(self, name: str, prepare: Callable[[int], object], run: Callable[[object], None],
+                     size: Optional[int] = None, batched: bool = False, **extra) -> None:
+        """按批计时: 每批先用prepare(n)准备数据(不计时),再计时run(数据)完成n次调用。
+        批量翻倍直到一批至少持续min_time秒,再重复REPEAT批取最快的一批。
+        batched为真时run是一次批量接口调用,处理全部n项: per_call_us仍按项平均,
+        可以与逐项调用的测试直接比较,结果另外记录每批的项数(entries)和整批耗时(per_batch_us)"""
+        if not self.enabled(name):
+            return
+        self.reseed()
+        calls = 1
+        while True:
+            seconds = self._timed(run, prepare(calls))
+            if seconds >= self.min_time:
+                break
+            calls *= 2
+        for _ in range(REPEAT - 1):
+            seconds = min(seconds, self._timed(run, prepare(calls)))
+        if batched:
+            extra.update(entries=calls, per_batch_us=seconds * 1e6)
+        self.record(name, size, calls, seconds, **extra)
+
+    def time_once(self, name: str, func: Callable[[], None], size: Optional[int] = None) -> Optional[float]:
+        """只计时一次的大操作(存档和读档),返回耗时;未选中时返回None"""
+        if not self.enabled(name):
+            return None
+        self.reseed()
+        seconds = self._timed(func)
+        self.record(name, size, 1, seconds)
+        return seconds
+
+    # ---- 测试数据 ----
+
+    def new_pets(self, count: int) -> list:
+        """创建count个新宠物,品种轮流使用"""
+        pet_class = self.module.Pet
+        species = self.species
+        return [pet_class(f"宠物{i}", species[i % len(species)]) for i in range(count)]
+
+    def build_game(self, size: int):
+        """创建有size个宠物的游戏。直接加入宠物列表而不经过add_pet,
+        V4的add_pet逐个检查重名,建立百万名册需要平方时间"""
+        game = self.module.PetGame()
+        pet_class = self.module.Pet
+        species = self.species
+        for i in range(size):
+            game.pets.append(pet_class(f"宠物{i}", species[i % len(species)]))
+        return game
+
+    # ---- 测试项 ----
+
+    def bench_pet_actions(self) -> None:
+        """单个宠物的喂食、玩耍和连续升级,每个宠物只操作一次(避免满级和体力不足的分支)"""
+        food, game_type = self.FOOD, self.GAME
+
+        def feed(pets):
+            for pet in pets:
+                pet.feed(food)
+
+        def play(pets):
+            for pet in pets:
+                pet.play(game_type)
+
+        def level_up(pets):
+            for pet in pets:
+                while pet.level < LEVEL_TARGET:
+                    pet.gain_experience(pet.get_exp_needed() - pet.experience)
+
+        self.time_batches("feed", self.new_pets, feed)
+        self.time_batches("play", self.new_pets, play)
+        self.time_batches("gain_experience_levels", self.new_pets, level_up, levels=LEVEL_TARGET - 1)
+
+    def bench_contests(self) -> None:
+        """参加比赛的吞吐量;游戏有批量参赛接口时同时测试批量参赛。
+        两项都按每只宠物报名一次的耗时记录,批量参赛整批的耗时见结果中的per_batch_us"""
+        contests = self.module.ContestSystem()
+        index = self.CONTEST
+
+        def enter(pets):
+            for pet in pets:
+                contests.enter_contest(pet, index)
+
+        self.time_batches("enter_contest", self.new_pets, enter)
+        if hasattr(contests, "enter_contests"):
+            self.time_batches("enter_contests",
+                              lambda count: [(pet, index) for pet in self.new_pets(count)],
+                              contests.enter_contests, batched=True)
+
+    def bench_roster(self, game, size: int) -> None:
+        """在大名册中按名字查找宠物和使用道具,名字随机抽取"""
+        names = [pet.name for pet in game.pets]
+        rng = random.Random(self.seed)
+        item = self.ITEM
+
+        def find(batch):
+            for name in batch:
+                game.find_pet(name)
+
+        def prepare_items(count):
+            game.items_inventory[item] = count
+            return rng.choices(names, k=count)
+
+        def use(batch):
+            for name in batch:
+                game.use_item(item, name)
+
+        self.time_batches("find_pet", lambda count: rng.choices(names, k=count), find, size)
+        self.time_batches("use_item", prepare_items, use, size)
+
+    def save_extensions(self) -> List[str]:
+        """游戏支持的存档格式扩展名;没有GameStorage的旧版本只有JSON"""
+        storage = getattr(self.module, "GameStorage", None)
+        if storage is None:
+            return [".json"]
+        return [cls.EXTENSIONS[0] for cls in storage.__subclasses__() if cls.EXTENSIONS]
+
+    def bench_save_load(self, game, size: int) -> None:
+        """按每种存档格式保存一次(新文件,不是增量保存),再读入新游戏一次"""
+        for extension in self.save_extensions():
+            path = self.SAVE_FILE + extension
+            seconds = self.time_once(f"save_game{extension}", lambda: game.save_game(path), size)
+            if seconds is None:
+                continue
+            self.results[f"save_game{extension}@{size}"]["file_bytes"] = os.path.getsize(path)
+
+            loaded = self.module.PetGame()
+            result = []
+            if self.time_once(f"load_game{extension}",
+                              lambda: result.append(loaded.load_game(path)), size) is not None:
+                if result[0] != "游戏已加载" or len(loaded.pets) != size:
+                    self.results[f"load_game{extension}@{size}"]["error"] = result[0]
+            del loaded, result
+            os.remove(path)
+            gc.collect()
+
+    def bench_display(self, game, size: int) -> None:
+        """界面整体重绘的耗时(有脏视图标记的版本先标记全部视图),以及没有变化时的重绘耗时"""
+        if not self.enabled("update_all_displays*"):
+            return
+        tk = self.module.tk
+        root = tk.Tk()
+        if self.tk_mode == "real":
+            root.withdraw()
+        app = self.module.PetGameGUI(root, game)
+        try:
+            app.current_pet = next(iter(game.pets), None)
+            mark_dirty = getattr(game, "mark_dirty", None)
+
+            def render(count):
+                for _ in range(count):
+                    if mark_dirty:
+                        mark_dirty()
+                    app.update_all_displays()
+                    root.update_idletasks()
+
+            def render_idle(count):
+                for _ in range(count):
+                    app.update_all_displays()
+                    root.update_idletasks()
+
+            self.time_batches("update_all_displays", lambda count: count, render, size, tk=self.tk_mode)
+            self.time_batches("update_all_displays_idle", lambda count: count, render_idle, size,
+                              tk=self.tk_mode)
+        finally:
+            if hasattr(app, "quit_game"):
+                app.quit_game()
+            root.destroy()
+
+
+def run_game(path: str, args: argparse.Namespace, tk_mode: str) -> dict:
+    """测试一个游戏文件,返回写入JSON的结果"""
+    print(f"{os.path.basename(path)}:", flush=True)
+    module = load_game_module(path)
+    bench = GameBench(module, args.sizes, tk_mode, args.min_time, args.seed, args.only)
+
+    # 存档、操作日志等文件都写在临时目录中
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="pet_bench_") as workdir:
+        os.chdir(workdir)
+        try:
+            results = bench.run()
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "game": os.path.basename(path),
+        **file_revision(path),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": getattr(module, "np", None) is not None,
+        "tk": tk_mode,
+        "sizes": bench.sizes,
+        "min_time": bench.min_time,
+        "seed": bench.seed,
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """打印两次结果中共有测试项的单次耗时和比例(新/旧),比例大于1表示变慢"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"旧: {old['game']} {old['timestamp']} (tk={old['tk']})")
+    print(f"新: {new['game']} {new['timestamp']} (tk={new['tk']})")
+    print(f"{'测试项':<34}{'旧(微秒)':>14}{'新(微秒)':>14}{'新/旧':>10}")
+    for key, old_result in old["results"].items():
+        new_result = new["results"].get(key)
+        if new_result is None:
+            print(f"{key:<36}{old_result['per_call_us']:>16.2f}{'-':>16}")
+            continue
+        ratio = new_result["per_call_us"] / old_result["per_call_us"]
+        print(f"{key:<36}{old_result['per_call_us']:>16.2f}{new_result['per_call_us']:>16.2f}"
+              f"{ratio:>11.2f}x")
+    for key, new_result in new["results"].items():
+        if key not in old["results"]:
+            print(f"{key:<36}{'-':>16}{new_result['per_call_us']:>16.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="宠物养成游戏的基准测试")
+    parser.add_argument("games", nargs="*", default=[DEFAULT_GAME], help="要测试的游戏文件")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="宠物名册规模")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果JSON所在的目录")
+    parser.add_argument("--tk", choices=("auto", "real", "stub"), default="auto",
+                        help="界面测试使用真实Tk还是替身(auto: 没有图形环境时用替身)")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="每批调用至少持续的秒数")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--only", nargs="+", help="只运行匹配的测试项(可用通配符,例如save_game*)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比较两个结果文件")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    tk_mode = choose_tk(args.tk)
+    output = os.path.abspath(args.output)
+    os.makedirs(output, exist_ok=True)
+    for game in args.games:
+        path = os.path.abspath(game)
+        report = run_game(path, args, tk_mode)
+        stem = os.path.splitext(report["game"])[0]
+        filename = os.path.join(output, f"{stem}-{datetime.now():%Y%m%d-%H%M%S}.json")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"结果已写入 {filename}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
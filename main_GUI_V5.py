@@ -1,18 +1,659 @@
 import random  # 用于随机数生成
 import time    # 用于时间戳
 import json    # 用于存档数据序列化
+import copy
 import os      # 用于文件和目录操作
+import sys     # 用于字符串驻留
+import struct  # 用于二进制存档
+import threading  # 用于后台存档
+import queue
+import heapq
+import asyncio  # 用于无界面运行定时器调度
+import sqlite3  # 用于SQLite存档
+import mmap      # 用于已售宠物存档区
+import tempfile
+import io
+import cProfile  # 用于界面中开启的性能分析
+import pstats
+import tracemalloc  # 用于性能统计中的内存分配
+import contextvars  # 用于无界面引擎各自的游戏时钟
+import warnings    # 用于规则文件无效时的提示
+from functools import wraps
+from contextlib import closing, contextmanager
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, TypedDict, Tuple  # 用于类型提示
+from typing import List, Optional, Dict, TypedDict, Tuple, Iterable, Iterator, Union, Callable  # 用于类型提示
+from itertools import islice, accumulate
+from operator import attrgetter
+from bisect import bisect_left, bisect_right
 from enum import Enum, auto  # 用于枚举类型
 from dataclasses import dataclass  # 用于数据类
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor  # 用于大型锦标赛的并行对决和多户模拟
+from multiprocessing import shared_memory
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+try:
+    import numpy as np  # 可选依赖,用于列式宠物名册的批量运算
+except ImportError:
+    np = None
+
+
+class GameClock:
+    """游戏时钟,默认使用真实时间,无界面模拟时固定为模拟时间。
+    游戏规则通过game_time()读取当前生效的时钟,默认是全局的CLOCK;
+    无界面引擎用activate换成自己的时钟,不修改全局时钟"""
+
+    def __init__(self, simulated_time: Optional[float] = None):
+        self.simulated_time = simulated_time
+
+    def now(self) -> float:
+        """获取当前游戏时间戳"""
+        if self.simulated_time is None:
+            return time.time()
+        return self.simulated_time
+
+    @contextmanager
+    def activate(self) -> Iterator["GameClock"]:
+        """在with块中(只影响当前线程或协程)让game_time()读取这个时钟"""
+        token = _ACTIVE_CLOCK.set(self)
+        try:
+            yield self
+        finally:
+            _ACTIVE_CLOCK.reset(token)
+
+
+CLOCK = GameClock()
+_ACTIVE_CLOCK: contextvars.ContextVar = contextvars.ContextVar("active_clock", default=CLOCK)
+
+
+def game_time() -> float:
+    """当前生效的游戏时钟的时间戳"""
+    return _ACTIVE_CLOCK.get().now()
+
+
+def drifted_stat(value, since, current_time: float, per_hour):
+    """随时间变化的属性在current_time的值: 从since时的value起每小时变化per_hour,上限100。
+    参数为numpy数组时逐项计算"""
+    drifted = value + per_hour * (current_time - since) / 3600
+    if np is not None and isinstance(drifted, np.ndarray):
+        return np.minimum(100, drifted)
+    return min(100, drifted)
+
+
+class GameRandom:
+    """一局游戏的随机数发生器,按用途分为互相独立的子流(random.Random)
+
+    每个子流的种子由总种子和子流名字确定,某一类随机事件多抽或少抽一次
+    不会影响其他子流;相同的种子得到逐位相同的结果。子流状态可以写入存档,
+    并行模拟时用spawn为每个工作进程派生独立的发生器,不共享随机数状态。
+    """
+
+    STREAMS = ("skills", "contests", "rewards")
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = random.SystemRandom().getrandbits(64) if seed is None else seed
+        self._streams: Dict[str, random.Random] = {}
+        for name in self.STREAMS:
+            self.stream(name)
+
+    def stream(self, name: str) -> random.Random:
+        """取得名为name的子流,不存在时按种子创建"""
+        if name not in self._streams:
+            self._streams[name] = random.Random(f"{self.seed}:{name}")
+        return self._streams[name]
+
+    @property
+    def skills(self) -> random.Random:
+        """技能解锁和训练"""
+        return self._streams["skills"]
+
+    @property
+    def contests(self) -> random.Random:
+        """比赛刷新和比赛结果"""
+        return self._streams["contests"]
+
+    @property
+    def rewards(self) -> random.Random:
+        """比赛物品奖励"""
+        return self._streams["rewards"]
+
+    def spawn(self, name: str) -> "GameRandom":
+        """派生一个独立的发生器(例如并行模拟中的一个工作单元),结果只由种子和name决定"""
+        return GameRandom(random.Random(f"{self.seed}:spawn:{name}").getrandbits(64))
+
+    def to_dict(self) -> dict:
+        """种子和各子流的状态,用于存档"""
+        streams = {}
+        for name, stream in self._streams.items():
+            version, state, gauss_next = stream.getstate()
+            streams[name] = [version, list(state), gauss_next]
+        return {"seed": self.seed, "streams": streams}
+
+    def load_dict(self, data: dict) -> None:
+        """恢复存档中的种子和子流状态(原地修改,已取得的子流对象继续有效)"""
+        self.seed = data["seed"]
+        self.load_streams(data["streams"])
+
+    def load_streams(self, streams: dict) -> None:
+        """恢复to_dict或changed_streams格式的子流状态"""
+        for name, (version, state, gauss_next) in streams.items():
+            self.stream(name).setstate((version, tuple(state), gauss_next))
+
+    def changed_streams(self, known: Dict[str, tuple]) -> dict:
+        """返回状态与known中记录的不同的子流(格式同to_dict中的streams),并更新known;
+        操作日志借此只记录抽取过随机数的子流"""
+        changed = {}
+        for name, stream in self._streams.items():
+            state = stream.getstate()
+            if known.get(name) != state:
+                known[name] = state
+                version, internal, gauss_next = state
+                changed[name] = [version, list(internal), gauss_next]
+        return changed
+
+
+# 不属于某局游戏时(例如单独创建的宠物)使用的随机数发生器
+RANDOM = GameRandom()
+
+
+class ScheduledTimer:
+    """调度器中的一个定时器"""
+
+    __slots__ = ("when", "callback", "interval", "name", "cancelled")
+
+    def __init__(self, when: float, callback: Callable[[float], None],
+                 interval: Optional[float], name: Optional[str]):
+        self.when = when
+        self.callback = callback
+        self.interval = interval  # 周期定时器的间隔(秒),一次性定时器为None
+        self.name = name
+        self.cancelled = False
+
+
+class GameScheduler:
+    """游戏定时器调度器(时间轮)
+
+    定时器按到期时间落入RESOLUTION秒宽的槽位,只保存有定时器的槽位,
+    并用最小堆记录槽位顺序,取得下一个期限只需查看最早的槽位。
+    调用者(Tk桥接TkSchedulerBridge、asyncio的run_async或GameEngine)
+    睡眠到下一个期限再调用run_due,没有到期的定时器时不做任何工作。
+    最早期限提前时调用on_change通知调用者重新安排睡眠时间。
+    定时器回调的参数为当前时间戳;同名定时器只保留最后登记的一个。
+    """
+
+    RESOLUTION = 1.0
+
+    def __init__(self):
+        self._slots: Dict[int, List[ScheduledTimer]] = {}
+        self._ticks: List[int] = []  # 有定时器的槽位(最小堆)
+        self._named: Dict[str, ScheduledTimer] = {}
+        self._running = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self.on_change: Optional[Callable[[], None]] = None
+
+    def _insert(self, timer: ScheduledTimer) -> None:
+        tick = int(timer.when // self.RESOLUTION)
+        slot = self._slots.get(tick)
+        if slot is None:
+            self._slots[tick] = [timer]
+            earliest = not self._ticks or tick < self._ticks[0]
+            heapq.heappush(self._ticks, tick)
+        else:
+            slot.append(timer)
+            earliest = tick == self._ticks[0]
+        if earliest and not self._running:
+            self._notify()
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self.on_change:
+            self.on_change()
+
+    def call_at(self, when: float, callback: Callable[[float], None],
+                name: Optional[str] = None, interval: Optional[float] = None) -> ScheduledTimer:
+        """登记在时间戳when执行的定时器,interval不为空时之后每隔interval秒执行一次"""
+        if name is not None:
+            self.cancel(name)
+        timer = ScheduledTimer(when, callback, interval, name)
+        if name is not None:
+            self._named[name] = timer
+        self._insert(timer)
+        return timer
+
+    def call_every(self, interval: float, callback: Callable[[float], None],
+                   name: Optional[str] = None, start: Optional[float] = None) -> ScheduledTimer:
+        """登记周期定时器,第一次在start(默认为现在加一个间隔)执行"""
+        if start is None:
+            start = game_time() + interval
+        return self.call_at(start, callback, name, interval)
+
+    def cancel(self, name: str) -> None:
+        """取消同名定时器(槽位中的定时器在检查时才移除)"""
+        timer = self._named.pop(name, None)
+        if timer is not None:
+            timer.cancelled = True
+
+    def has(self, name: str) -> bool:
+        return name in self._named
+
+    def next_deadline(self) -> Optional[float]:
+        """最早的定时器到期时间,没有定时器时为None"""
+        while self._ticks:
+            tick = self._ticks[0]
+            timers = [timer for timer in self._slots[tick] if not timer.cancelled]
+            if timers:
+                self._slots[tick] = timers
+                return min(timer.when for timer in timers)
+            heapq.heappop(self._ticks)
+            del self._slots[tick]
+        return None
+
+    def run_due(self, now: float) -> int:
+        """执行到期的定时器,返回执行的个数;周期定时器跳过错过的周期后重新登记"""
+        current = int(now // self.RESOLUTION)
+        due = []
+        later = []
+        while self._ticks and self._ticks[0] <= current:
+            tick = heapq.heappop(self._ticks)
+            for timer in self._slots.pop(tick):
+                if timer.cancelled:
+                    continue
+                (due if timer.when <= now else later).append(timer)
+        due.sort(key=attrgetter("when"))
+
+        self._running = True
+        try:
+            for timer in later:
+                self._insert(timer)
+            fired = 0
+            for timer in due:
+                if timer.cancelled:
+                    continue  # 被前面的回调取消
+                if timer.interval:
+                    missed = int((now - timer.when) // timer.interval) + 1
+                    timer.when += missed * timer.interval
+                    self._insert(timer)
+                elif timer.name is not None and self._named.get(timer.name) is timer:
+                    del self._named[timer.name]
+                timer.callback(now)
+                fired += 1
+        finally:
+            self._running = False
+        return fired
+
+    async def run_async(self, clock: Callable[[], float] = game_time) -> None:
+        """在asyncio事件循环中运行调度器: 睡眠到下一个期限,有更早的定时器时提前醒来"""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                self.run_due(clock())
+                deadline = self.next_deadline()
+                timeout = None if deadline is None else max(0.0, deadline - clock())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            self._wakeup = None
+
+
+class TkSchedulerBridge:
+    """把GameScheduler接入Tk事件循环: 始终只保留一个root.after,
+    在下一个期限到来时执行到期的定时器,空闲时不会被唤醒"""
+
+    # 单次睡眠的上限(秒),避免系统时间调整后长时间不醒
+    MAX_SLEEP = 3600.0
+
+    def __init__(self, root, scheduler: GameScheduler, clock: Callable[[], float] = game_time):
+        self.root = root
+        self.scheduler = scheduler
+        self.clock = clock
+        self._after_id = None
+        self._armed_for: Optional[float] = None
+        scheduler.on_change = self.wake
+        self.wake()
+
+    def wake(self) -> None:
+        """按最新的下一个期限重新安排root.after"""
+        deadline = self.scheduler.next_deadline()
+        if self._after_id is not None:
+            if deadline == self._armed_for:
+                return
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._armed_for = deadline
+        if deadline is None:
+            return
+        delay = min(self.MAX_SLEEP, max(0.0, deadline - self.clock()))
+        self._after_id = self.root.after(int(delay * 1000), self._fire)
+
+    def _fire(self) -> None:
+        self._after_id = None
+        self.scheduler.run_due(self.clock())
+        self.wake()
+
+    def close(self) -> None:
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self.scheduler.on_change = None
+
+# 所有未学技能的宠物共享的只读空熟练度表,学会第一个技能时才分配字典
+NO_SKILLS = MappingProxyType({})
+
+# 默认游戏规则,可被规则数据文件(JSON,结构相同)中的同名表覆盖
+DEFAULT_RULES = {
+    # 食物效果
+    "foods": {
+        "regular_food": {"hunger": 30, "health": 5, "exp": 10},
+        "premium_food": {"hunger": 50, "health": 10, "exp": 20},
+        "treats": {"hunger": 10, "health": 0, "exp": 5, "happiness": 15},
+        "fresh_meat": {"hunger": 40, "health": 15, "exp": 25},
+        "fish": {"hunger": 35, "health": 12, "exp": 22},
+        "vegetables": {"hunger": 25, "health": 8, "exp": 15},
+        "fruits": {"hunger": 20, "health": 10, "exp": 18},
+        "special_meal": {"hunger": 60, "health": 20, "exp": 30}
+    },
+    # 玩耍游戏
+    "games": {
+        "fetch": {"energy": -20, "happiness": 30, "exp": 15},
+        "chase": {"energy": -30, "happiness": 40, "exp": 20},
+        "hide_seek": {"energy": -25, "happiness": 35, "exp": 18},
+        "training": {"energy": -35, "happiness": 25, "exp": 25}
+    },
+    # 物品效果
+    "items": {
+        "toy_ball": {"happiness": 20, "energy": -10},
+        "pet_bed": {"energy": 90, "health": 10},
+        "training_book": {"experience": 50},
+        "medicine": {"health": 30},
+        "grooming_kit": {"happiness": 30, "health": -10},
+        "vitamins": {"health": 15, "energy": 15}
+    },
+    # 免费活动
+    "activities": {
+        "遛宠物": {"energy_cost": 10, "happiness_gain": 15, "exp_gain": 10, "coin_gain": 20},
+        "清理": {"energy_cost": 5, "happiness_gain": 10, "exp_gain": 5, "coin_gain": 15},
+        "基础训练": {"energy_cost": 15, "happiness_gain": 5, "exp_gain": 15, "coin_gain": 25}
+    },
+    # 各品种可学技能
+    "species_skills": {
+        "猫咪": ["灵巧跳跃", "夜视能力", "优雅姿态", "捕猎技巧", "九命"],
+        "小狗": ["忠诚守护", "寻物技能", "游泳技巧", "救援能力", "领袖气质"],
+        "兔子": ["快速跳跃", "挖掘技能", "隐藏技巧", "萝卜探测", "群体治愈"],
+        "仓鼠": ["储物技能", "迷宫记忆", "平衡行走", "食物探索", "团队协作"]
+    },
+    # 比赛难度对应的等级要求和报名费(按ContestDifficulty成员名索引)
+    "contest_difficulties": {
+        "EASY": {"min_level": 1, "entry_fee": 50},
+        "NORMAL": {"min_level": 5, "entry_fee": 100},
+        "HARD": {"min_level": 15, "entry_fee": 200},
+        "MASTER": {"min_level": 30, "entry_fee": 500}
+    },
+    # 比赛类型考察的属性(取平均值,按ContestType成员名索引)
+    "contest_attributes": {
+        "AGILITY": ["agility"],
+        "STRENGTH": ["strength"],
+        "INTELLIGENCE": ["intelligence"],
+        "TALENT": ["intelligence", "agility"],
+        "BEAUTY": ["happiness"]
+    },
+    # 比赛类型的加成技能(按ContestType成员名索引)
+    "contest_skills": {
+        "AGILITY": ["灵巧跳跃", "快速跳跃"],
+        "STRENGTH": ["忠诚守护", "救援能力"],
+        "INTELLIGENCE": ["夜视能力", "迷宫记忆"],
+        "TALENT": ["优雅姿态", "团队协作"],
+        "BEAUTY": ["优雅姿态", "九命"]
+    }
+}
+
+# 规则数据文件,与本模块放在同一目录,存在时在导入时加载
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_rules.json")
+
+
+def _freeze(value):
+    """把规则数据转换为不可变结构"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class RuleTable:
+    """只读规则表,可按名字、枚举成员或整数编号索引"""
+
+    __slots__ = ("_entries", "_names")
+
+    def __init__(self, entries: dict):
+        self._entries = MappingProxyType({key: _freeze(value) for key, value in entries.items()})
+        self._names = tuple(self._entries)
+
+    def _key(self, key):
+        """把枚举成员或编号转换为名字"""
+        if isinstance(key, int):
+            return self._names[key]
+        if isinstance(key, Enum):
+            return key.name if key.name in self._entries else key.value
+        return key
+
+    def __getitem__(self, key):
+        return self._entries[self._key(key)]
+
+    def __contains__(self, key) -> bool:
+        try:
+            return self._key(key) in self._entries
+        except (IndexError, TypeError):
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def get(self, key, default=None):
+        """按名字、枚举或编号查找,不存在时返回default"""
+        try:
+            return self[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+
+    def id_of(self, name: str) -> int:
+        """获取名字对应的整数编号"""
+        return self._names.index(name)
+
+    def names(self) -> Tuple[str, ...]:
+        """按编号顺序返回所有名字"""
+        return self._names
+
+
+class GameRules:
+    """游戏规则注册表,导入时加载一次,可从数据文件重新加载"""
+
+    TABLES = tuple(DEFAULT_RULES)
+
+    def __init__(self, data: Optional[dict] = None):
+        self.reload_from(data or {})
+
+    @classmethod
+    def validate(cls, data) -> None:
+        """检查规则数据的结构,与默认规则不一致时抛出ValueError
+
+        每张表必须是非空对象;条目的类型与默认规则相同(数值效果表或名字列表),
+        并包含默认规则中所有条目共有的字段;按枚举成员名索引的比赛表必须覆盖所有成员
+        """
+        if not isinstance(data, dict):
+            raise ValueError("规则数据必须是JSON对象")
+        for table, entries in data.items():
+            if table not in DEFAULT_RULES:
+                raise ValueError(f"未知的规则表: {table}")
+            defaults = DEFAULT_RULES[table]
+            if not isinstance(entries, dict) or not entries:
+                raise ValueError(f"规则表{table}必须是非空对象")
+            numeric = isinstance(next(iter(defaults.values())), dict)
+            required = set.intersection(*map(set, defaults.values())) if numeric else set()
+            for name, entry in entries.items():
+                if numeric:
+                    valid = isinstance(entry, dict) and all(
+                        isinstance(value, (int, float)) and not isinstance(value, bool)
+                        for value in entry.values())
+                    missing = required - set(entry) if valid else set()
+                else:
+                    valid = isinstance(entry, list) and all(isinstance(item, str) for item in entry)
+                    missing = set()
+                if not valid:
+                    raise ValueError(f"规则表{table}中的{name}格式错误")
+                if missing:
+                    raise ValueError(f"规则表{table}中的{name}缺少字段: {', '.join(sorted(missing))}")
+            if table.startswith("contest_"):
+                missing = set(defaults) - set(entries)
+                if missing:
+                    raise ValueError(f"规则表{table}缺少: {', '.join(sorted(missing))}")
+
+    def reload_from(self, data: dict) -> None:
+        """用数据中的表覆盖默认规则,未提供的表保持默认值,数据无效时不做任何修改"""
+        self.validate(data)
+        for table in self.TABLES:
+            setattr(self, table, RuleTable(data.get(table, DEFAULT_RULES[table])))
+
+    def reload(self, filename: str = RULES_FILE) -> str:
+        """从JSON规则文件重新加载规则"""
+        with open(filename, 'r', encoding='utf-8') as f:
+            self.reload_from(json.load(f))
+        return f"已从{filename}加载游戏规则"
+
+    @classmethod
+    def load(cls, filename: str = RULES_FILE) -> "GameRules":
+        """加载规则,文件不存在时使用默认规则;文件无法读取或格式错误时给出警告并使用默认规则"""
+        rules = cls()
+        if os.path.exists(filename):
+            try:
+                rules.reload(filename)
+            except (OSError, ValueError) as e:
+                warnings.warn(f"规则文件{filename}无效,使用默认规则: {e}", RuntimeWarning, stacklevel=2)
+        return rules
+
+
+RULES = GameRules.load()
+
+MAX_LEVEL = 100  # 最高等级
+SKILL_UNLOCK_LEVELS = (5, 10, 15, 20, 30)  # 解锁新技能的等级
+
+
+def exp_needed_for_level(level: int) -> int:
+    """计算指定等级升级所需经验"""
+    return int(100 * (1 + (level - 1) * 0.5))
+
+
+# 累计经验表: CUMULATIVE_EXP[n] 为从1级升到n+1级所需的总经验
+CUMULATIVE_EXP = tuple(accumulate(
+    (exp_needed_for_level(level) for level in range(1, MAX_LEVEL)), initial=0))
+
+
+def atomic_write(filename: str, write: Callable, binary: bool = True) -> None:
+    """先写入临时文件并fsync,再原子地替换目标文件,写入中途出错或中断时原文件保持不变"""
+    temp_name = f"{filename}.tmp"
+    with open(temp_name, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_name, filename)
+
+
+class PetSaveCatalog:
+    """宠物存档目录的索引,记录每个存档的名字、品种、等级、睡眠状态和文件修改时间。
+    加载对话框只需读取索引;修改时间或大小与索引不一致的存档(例如旧版本保存的)才重新解析。
+    保存宠物时只在内存中记下摘要,索引文件在下次列出存档时一次性写入,保存一只宠物的开销与索引大小无关"""
+
+    INDEX_FILE = "catalog.json"
+    VERSION = 1
+    _lock = threading.Lock()  # 前台和后台存档可能同时更新索引
+    _pending: Dict[str, Dict[str, dict]] = {}  # {索引路径: {文件名: 摘要}},尚未写入索引文件的更新
+
+    def __init__(self, save_dir: str = "pet_saves"):
+        self.save_dir = save_dir
+        self.index_path = os.path.join(save_dir, self.INDEX_FILE)
+
+    @staticmethod
+    def _summary(pet_data: dict, stat: os.stat_result) -> dict:
+        return {
+            "name": pet_data["name"],
+            "species": pet_data["species"],
+            "level": pet_data["level"],
+            "is_sleeping": pet_data["is_sleeping"],
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size
+        }
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != self.VERSION:
+            return {}
+        return index["pets"]
+
+    def _write(self, pets: Dict[str, dict]) -> None:
+        index = {"version": self.VERSION, "pets": pets}
+        atomic_write(self.index_path, lambda f: json.dump(index, f, ensure_ascii=False), binary=False)
+
+    def update(self, file_name: str, pet_data: dict) -> None:
+        """存档写入后记下索引中的一项,下次调用entries()时写入索引文件"""
+        stat = os.stat(os.path.join(self.save_dir, file_name))
+        with self._lock:
+            self._pending.setdefault(self.index_path, {})[file_name] = self._summary(pet_data, stat)
+
+    def entries(self) -> Dict[str, dict]:
+        """返回{文件名: 摘要},按目录内容校验索引,新增或变化的存档才打开解析"""
+        if not os.path.isdir(self.save_dir):
+            return {}
+        with self._lock:
+            pets = self._read()
+            pending = self._pending.pop(self.index_path, {})
+            changed = bool(pending)
+            pets.update(pending)
+            current = {}
+            with os.scandir(self.save_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.json') or entry.name == self.INDEX_FILE:
+                        continue
+                    stat = entry.stat()
+                    summary = pets.get(entry.name)
+                    if summary is None or summary["mtime"] != stat.st_mtime_ns \
+                            or summary["size"] != stat.st_size:
+                        try:
+                            with open(entry.path, 'r', encoding='utf-8') as f:
+                                summary = self._summary(json.load(f), stat)
+                        except Exception as e:
+                            print(f"加载宠物文件 {entry.name} 时出错: {str(e)}")
+                            continue
+                        changed = True
+                    current[entry.name] = summary
+            if changed or len(current) != len(pets):
+                self._write(current)
+        return current
+
 
 class Pet:
     """增强的宠物类,包含更多属性和功能"""
 
+    # 使用__slots__代替实例字典,大量宠物时显著节省内存
+    __slots__ = (
+        "name", "species", "level", "experience",
+        "health", "strength", "agility", "intelligence",
+        "_hunger", "hunger_since", "happiness", "_energy", "energy_since", "is_sleeping",
+        "skill_exp", "birth_time", "last_feed_time", "last_interaction_time",
+        "total_training_time", "won_contests", "total_training_sessions", "friends",
+        "revision"
+    )
+
     # 定义宠物品种的基础属性
     SPECIES_BASE_STATS = {
         "猫咪": {
@@ -45,10 +686,16 @@ class Pet:
         }
     }
 
+    # 随时间变化的属性(每小时变化量),读取时按经过的时间惰性计算:
+    # 不喂食时饥饿度每小时+5,初始的50约6小时后超过80(饥饿);
+    # 体力只在睡眠时每小时恢复10,从20(疲惫)睡满8小时恢复到100,清醒时保持不变
+    HUNGER_PER_HOUR = 5
+    ENERGY_PER_HOUR = 10
+
     def __init__(self, name: str, species: str):
         """初始化宠物"""
         self.name = name
-        self.species = species
+        self.species = sys.intern(species)
         self.level = 1
         self.experience = 0
 
@@ -58,48 +705,59 @@ class Pet:
         self.strength = base_stats["strength"]
         self.agility = base_stats["agility"]
         self.intelligence = base_stats["intelligence"]
-        self.growth_rate = base_stats["growth_rate"]
 
-        # 状态属性
-        self.hunger = 50
+        # 状态属性(所有时间戳共享同一个对象)
+        now = game_time()
+        self._hunger = 50
+        self.hunger_since = now
         self.happiness = 50
-        self.energy = 100
-        self.mood = "正常"
+        self._energy = 100
+        self.energy_since = now
         self.is_sleeping = False
 
-        # 技能相关
-        self.skills: List[str] = []
-        self.skill_exp: Dict[str, int] = {}
+        # 技能相关(已学技能即熟练度字典的键,按学会顺序排列)
+        self.skill_exp: Dict[str, int] = NO_SKILLS
 
         # 记录数据
-        self.birth_time = time.time()
-        self.last_feed_time = time.time()
-        self.last_interaction_time = time.time()
+        self.birth_time = now
+        self.last_feed_time = now
+        self.last_interaction_time = now
         self.total_training_time = 0
 
         # 成就数据
         self.won_contests = 0
         self.total_training_sessions = 0
-        self.friends: List[str] = []
-
-    def feed(self, food_type: str) -> str:
-        """喂食系统"""
-        foods = {
-            "regular_food": {"hunger": 30, "health": 5, "exp": 10},
-            "premium_food": {"hunger": 50, "health": 10, "exp": 20},
-            "treats": {"hunger": 10, "health": 0, "exp": 5, "happiness": 15},
-            "fresh_meat": {"hunger": 40, "health": 15, "exp": 25},
-            "fish": {"hunger": 35, "health": 12, "exp": 22},
-            "vegetables": {"hunger": 25, "health": 8, "exp": 15},
-            "fruits": {"hunger": 20, "health": 10, "exp": 18},
-            "special_meal": {"hunger": 60, "health": 20, "exp": 30}
-        }
-
-        if food_type not in foods:
+        self.friends: Tuple[str, ...] = ()
+
+        # 数据版本号,每次变化加一,界面据此判断是否需要重绘
+        self.revision = 0
+
+    def touch(self) -> None:
+        """标记宠物数据已变化"""
+        self.revision += 1
+
+    @property
+    def growth_rate(self) -> float:
+        """成长率,由品种决定"""
+        return self.SPECIES_BASE_STATS[self.species]["growth_rate"]
+
+    @property
+    def skills(self) -> Tuple[str, ...]:
+        """已学技能(只读,由skill_exp的键得到),学习新技能使用unlock_skill"""
+        return tuple(self.skill_exp)
+
+    def add_friend(self, name: str) -> None:
+        """添加朋友"""
+        if name not in self.friends:
+            self.friends += (sys.intern(name),)
+            self.touch()
+
+    def feed(self, food_type: str, rng: Optional[random.Random] = None) -> str:
+        """喂食系统,rng为升级解锁技能使用的随机数子流(默认RANDOM.skills)"""
+        food = RULES.foods.get(food_type)
+        if food is None:
             return f"{self.name}对这个食物不感兴趣..."
 
-        food = foods[food_type]
-
         # 计算食物效果
         hunger_reduction = food["hunger"] * self.growth_rate
         exp_gain = food["exp"]
@@ -109,66 +767,72 @@ class Pet:
         self.hunger = max(0, min(100, self.hunger - hunger_reduction))
         self.health = min(100, self.health + food["health"])
         self.happiness = min(100, self.happiness + happiness_gain)
-        self.gain_experience(exp_gain)
+        self.gain_experience(exp_gain, rng)
 
-        # 更新时间和心情
-        self.last_feed_time = time.time()
-        self.update_mood()
+        # 更新时间
+        self.last_feed_time = game_time()
 
         return f"{self.name}吃了{food_type},看起来很满意! (获得{exp_gain}经验)"
 
-    def gain_experience(self, exp: int) -> None:
-        """获得经验值"""
-        self.experience += exp
-        while self.experience >= self.get_exp_needed():
-            self.level_up()
+    def gain_experience(self, exp: int, rng: Optional[random.Random] = None) -> None:
+        """获得经验值,通过累计经验表一次结算连续升级,多余经验保留"""
+        self.touch()
+        total_exp = CUMULATIVE_EXP[self.level - 1] + self.experience + exp
+        new_level = bisect_right(CUMULATIVE_EXP, total_exp)
+
+        if new_level > self.level:
+            self._advance_levels(new_level - self.level, rng)
+            self.experience = total_exp - CUMULATIVE_EXP[new_level - 1]
+        else:
+            self.experience += exp
 
     def get_exp_needed(self) -> int:
         """计算升级所需经验"""
-        return int(100 * (1 + (self.level - 1) * 0.5))
+        return exp_needed_for_level(self.level)
 
-    def level_up(self) -> str:
+    def level_up(self, rng: Optional[random.Random] = None) -> str:
         """升级"""
-        if self.level >= 100:
+        if self.level >= MAX_LEVEL:
             return f"{self.name}已达到最高等级!"
 
-        self.level += 1
+        new_skills = self._advance_levels(1, rng)
         self.experience = 0
 
+        if new_skills:
+            return f"{self.name}升到{self.level}级了！学会了新技能: {new_skills[0]}!"
+
+        return f"{self.name}升到{self.level}级了！"
+
+    def _advance_levels(self, levels: int, rng: Optional[random.Random] = None) -> List[str]:
+        """一次提升若干等级,按顺序解锁途经等级的技能,返回新学会的技能"""
+        old_level = self.level
+        self.level = old_level + levels
+
         # 属性提升
         growth = self.growth_rate
-        self.health += 5 * growth
-        self.strength += 3 * growth
-        self.agility += 3 * growth
-        self.intelligence += 3 * growth
+        self.health += 5 * growth * levels
+        self.strength += 3 * growth * levels
+        self.agility += 3 * growth * levels
+        self.intelligence += 3 * growth * levels
 
         # 解锁新技能
-        if self.level in [5, 10, 15, 20, 30]:
-            new_skill = self.unlock_skill()
-            return f"{self.name}升到{self.level}级了！学会了新技能: {new_skill}!"
+        return [self.unlock_skill(rng) for level in SKILL_UNLOCK_LEVELS
+                if old_level < level <= self.level]
 
-        return f"{self.name}升到{self.level}级了！"
-
-    def unlock_skill(self) -> str:
+    def unlock_skill(self, rng: Optional[random.Random] = None) -> str:
         """解锁新技能"""
-        species_skills = {
-            "猫咪": ["灵巧跳跃", "夜视能力", "优雅姿态", "捕猎技巧", "九命"],
-            "小狗": ["忠诚守护", "寻物技能", "游泳技巧", "救援能力", "领袖气质"],
-            "兔子": ["快速跳跃", "挖掘技能", "隐藏技巧", "萝卜探测", "群体治愈"],
-            "仓鼠": ["储物技能", "迷宫记忆", "平衡行走", "食物探索", "团队协作"]
-        }
-
-        available_skills = [s for s in species_skills[self.species] if s not in self.skills]
+        available_skills = [s for s in RULES.species_skills[self.species] if s not in self.skill_exp]
         if available_skills:
-            new_skill = random.choice(available_skills)
-            self.skills.append(new_skill)
+            new_skill = (rng or RANDOM.skills).choice(available_skills)
+            if self.skill_exp is NO_SKILLS:
+                self.skill_exp = {}
             self.skill_exp[new_skill] = 0
             return new_skill
         return "没有新技能可以学习"
 
-    def train_skill(self, skill_name: str) -> str:
+    def train_skill(self, skill_name: str, rng: Optional[random.Random] = None) -> str:
         """训练特定技能"""
-        if skill_name not in self.skills:
+        if skill_name not in self.skill_exp:
             return f"{self.name}还没有学会这个技能"
 
         if self.energy < 20:
@@ -176,31 +840,70 @@ class Pet:
 
         # 训练消耗和收益
         self.energy -= 20
-        exp_gain = random.randint(10, 20)
+        exp_gain = (rng or RANDOM.skills).randint(10, 20)
         self.skill_exp[skill_name] += exp_gain
         self.total_training_time += 1
         self.total_training_sessions += 1
+        self.touch()
 
         return f"{self.name}训练了{skill_name},熟练度提升{exp_gain}点"
 
-    def update_mood(self) -> None:
-        """更新心情状态"""
-        current_time = time.time()
-        hours_since_feed = (current_time - self.last_feed_time) / 3600
+    def hunger_at(self, current_time: float) -> float:
+        """指定时间点的饥饿度,从上次设置起按经过的时间增长"""
+        return drifted_stat(self._hunger, self.hunger_since, current_time, self.HUNGER_PER_HOUR)
+
+    def energy_at(self, current_time: float) -> float:
+        """指定时间点的体力,从上次设置起只在睡眠时恢复"""
+        return drifted_stat(self._energy, self.energy_since, current_time,
+                            self.ENERGY_PER_HOUR if self.is_sleeping else 0)
+
+    @property
+    def hunger(self) -> float:
+        """饥饿度,从上次设置起按经过的时间增长"""
+        return self.hunger_at(game_time())
+
+    @hunger.setter
+    def hunger(self, value: float) -> None:
+        self._hunger = value
+        self.hunger_since = game_time()
+
+    @property
+    def energy(self) -> float:
+        """体力,从上次设置起在睡眠期间恢复"""
+        return self.energy_at(game_time())
+
+    @energy.setter
+    def energy(self, value: float) -> None:
+        self._energy = value
+        self.energy_since = game_time()
+
+    @property
+    def mood(self) -> str:
+        """当前心情,读取时根据状态计算"""
+        return self.mood_at(game_time())
+
+    def mood_at(self, current_time: float) -> str:
+        """计算指定时间点的心情状态"""
         hours_since_interaction = (current_time - self.last_interaction_time) / 3600
+        hunger = self.hunger_at(current_time)
+        energy = self.energy_at(current_time)
 
-        if self.hunger > 80:
-            self.mood = "饥饿"
-        elif self.energy < 20:
-            self.mood = "疲惫"
+        if hunger > 80:
+            return "饥饿"
+        elif energy < 20:
+            return "疲惫"
         elif hours_since_interaction > 24:
-            self.mood = "孤独"
+            return "孤独"
         elif self.happiness < 30:
-            self.mood = "沮丧"
+            return "沮丧"
         elif self.happiness > 80:
-            self.mood = "兴奋"
-        else:
-            self.mood = "正常"
+            return "兴奋"
+        return "正常"
+
+    def anchor_stats_at(self, timestamp: float) -> None:
+        """把随时间变化的属性的起算时间设为timestamp,用于加载存档后补算离线期间的变化"""
+        self.hunger_since = timestamp
+        self.energy_since = timestamp
 
     def check_status(self) -> str:
         """检查宠物状态"""
@@ -228,7 +931,7 @@ class Pet:
 {skill_levels}
 训练总次数: {self.total_training_sessions}
 比赛获胜: {self.won_contests}次
-年龄: {int((time.time() - self.birth_time) / 86400)}天
+年龄: {int((game_time() - self.birth_time) / 86400)}天
 """
 
     def get_status(self) -> dict:
@@ -248,37 +951,19 @@ class Pet:
             "energy": self.energy,
             "mood": self.mood,
             "is_sleeping": self.is_sleeping,
-            "skills": self.skills,
-            "skill_levels": self.skill_exp,
-            "age_days": int((time.time() - self.birth_time) / 86400),
+            "skills": list(self.skill_exp),
+            "skill_levels": dict(self.skill_exp),
+            "age_days": int((game_time() - self.birth_time) / 86400),
             "total_training": self.total_training_sessions,
-            "contests_won": self.won_contests
+            "contests_won": self.won_contests,
+            "birth_time": self.birth_time,
+            "last_feed_time": self.last_feed_time,
+            "last_interaction_time": self.last_interaction_time
         }
 
-    def sleep(self) -> str:
-        """睡眠"""
-        if self.is_sleeping:
-            return f"{self.name}已经在睡觉了"
-
-        self.is_sleeping = True
-        self.energy = min(100, self.energy + 50)
-        self.health = min(100, self.health + 10)
-        return f"{self.name}睡着了,开始恢复体力"
-
-    def wake_up(self) -> str:
-        """唤醒"""
-        if not self.is_sleeping:
-            return f"{self.name}已经醒着呢"
-
-        self.is_sleeping = False
-        return f"{self.name}醒来了,精神焕发!"
-
-    def save_pet(self, save_dir="pet_saves"):
-        """保存宠物数据到文件"""
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-
-        pet_data = {
+    def to_dict(self) -> dict:
+        """导出宠物的完整存档数据"""
+        return {
             "name": self.name,
             "species": self.species,
             "level": self.level,
@@ -292,22 +977,134 @@ class Pet:
             "energy": self.energy,
             "mood": self.mood,
             "is_sleeping": self.is_sleeping,
-            "skills": self.skills,
-            "skill_exp": self.skill_exp,
+            "skills": list(self.skill_exp),
+            "skill_exp": dict(self.skill_exp),
             "birth_time": self.birth_time,
             "last_feed_time": self.last_feed_time,
             "last_interaction_time": self.last_interaction_time,
             "total_training_time": self.total_training_time,
             "total_training_sessions": self.total_training_sessions,
             "won_contests": self.won_contests,
-            "friends": self.friends
+            "friends": list(self.friends),
+            "saved_at": game_time()
         }
 
-        file_path = os.path.join(save_dir, f"{self.name}.json")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(pet_data, f, ensure_ascii=False, indent=4)
+    def load_state(self, data: dict, saved_at: Optional[float] = None) -> "Pet":
+        """从存档数据恢复状态,兼容整局存档(get_status)和宠物存档(to_dict)的字段名"""
+        intern = sys.intern
+        self.level = data.get("level", 1)
+        self.experience = data.get("experience", 0)
+        self.health = data.get("health", self.health)
+        self.strength = data.get("strength", self.strength)
+        self.agility = data.get("agility", self.agility)
+        self.intelligence = data.get("intelligence", self.intelligence)
+        self.hunger = data.get("hunger", 50)
+        self.happiness = data.get("happiness", 50)
+        self.energy = data.get("energy", 100)
+        self.is_sleeping = data.get("is_sleeping", False)
+
+        # 技能名驻留后所有宠物共享同一个字符串对象
+        skill_exp = data.get("skill_exp", data.get("skill_levels", {}))
+        self.skill_exp = {intern(skill): skill_exp.get(skill, 0)
+                          for skill in data.get("skills", skill_exp)}
+
+        self.birth_time = data.get("birth_time", self.birth_time)
+        self.last_feed_time = data.get("last_feed_time", self.last_feed_time)
+        self.last_interaction_time = data.get("last_interaction_time", self.last_interaction_time)
+        self.total_training_time = data.get("total_training_time", 0)
+        self.total_training_sessions = data.get(
+            "total_training_sessions", data.get("total_training", 0))
+        self.won_contests = data.get("won_contests", data.get("contests_won", 0))
+        self.friends = tuple(intern(friend) for friend in data.get("friends", ()))
+
+        # 饥饿度和体力从存档时间开始补算
+        if saved_at is None:
+            saved_at = data.get("saved_at", game_time())
+        self.anchor_stats_at(saved_at)
+        self.touch()
+        return self
+
+    @classmethod
+    def from_dict(cls, data: dict, saved_at: Optional[float] = None) -> "Pet":
+        """根据存档数据创建宠物"""
+        return cls(data["name"], data["species"]).load_state(data, saved_at)
+
+    @classmethod
+    def from_record(cls, name: str, species: str, level: int, experience: int,
+                    health: float, strength: float, agility: float, intelligence: float,
+                    hunger: float, happiness: float, energy: float, is_sleeping: bool,
+                    birth_time: float, last_feed_time: float, last_interaction_time: float,
+                    total_training_time: float, total_training_sessions: int, won_contests: int,
+                    saved_at: float, skill_exp: Dict[str, int], friends: Iterable[str]) -> "Pet":
+        """按二进制存档的字段顺序直接创建宠物,不经过__init__和load_state"""
+        intern = sys.intern
+        pet = cls.__new__(cls)
+        pet.name = name
+        pet.species = intern(species)
+        pet.level = level
+        pet.experience = experience
+        pet.health = health
+        pet.strength = strength
+        pet.agility = agility
+        pet.intelligence = intelligence
+        pet._hunger = hunger
+        pet.hunger_since = saved_at
+        pet.happiness = happiness
+        pet._energy = energy
+        pet.energy_since = saved_at
+        pet.is_sleeping = is_sleeping
+        pet.skill_exp = {intern(skill): exp for skill, exp in skill_exp.items()} if skill_exp else NO_SKILLS
+        pet.birth_time = birth_time
+        pet.last_feed_time = last_feed_time
+        pet.last_interaction_time = last_interaction_time
+        pet.total_training_time = total_training_time
+        pet.total_training_sessions = total_training_sessions
+        pet.won_contests = won_contests
+        pet.friends = tuple(intern(friend) for friend in friends)
+        pet.revision = 0
+        return pet
+
+    def sleep(self) -> str:
+        """睡眠"""
+        if self.is_sleeping:
+            return f"{self.name}已经在睡觉了"
+
+        # 先按清醒时的状态结算体力,之后才按睡眠恢复
+        self.energy = min(100, self.energy + 50)
+        self.is_sleeping = True
+        self.health = min(100, self.health + 10)
+        self.touch()
+        return f"{self.name}睡着了,开始恢复体力"
+
+    def wake_up(self) -> str:
+        """唤醒"""
+        if not self.is_sleeping:
+            return f"{self.name}已经醒着呢"
+
+        # 结算睡眠期间恢复的体力,醒来后不再恢复
+        self.energy = self.energy
+        self.is_sleeping = False
+        self.touch()
+        return f"{self.name}醒来了,精神焕发!"
 
-        return f"宠物 {self.name} 已保存到 {file_path}"
+    def save_pet(self, save_dir="pet_saves"):
+        """保存宠物数据到文件"""
+        return self.prepare_save(save_dir)()
+
+    def prepare_save(self, save_dir="pet_saves") -> Callable[[], str]:
+        """复制宠物当前的存档数据,返回写入文件的函数(可在后台线程执行)"""
+        pet_data = self.to_dict()
+        file_name = f"{self.name}.json"
+        file_path = os.path.join(save_dir, file_name)
+
+        def write() -> str:
+            os.makedirs(save_dir, exist_ok=True)
+            atomic_write(file_path, lambda f: json.dump(pet_data, f, ensure_ascii=False, indent=4),
+                         binary=False)
+            PetSaveCatalog(save_dir).update(file_name, pet_data)
+            return f"宠物 {self.name} 已保存到 {file_path}"
+
+        return write
 
     def calculate_value(self) -> int:
         """计算宠物价值"""
@@ -337,29 +1134,257 @@ class Pet:
 
         return total_value
 
-    def play(self, game_type: str) -> str:
+    def play(self, game_type: str, rng: Optional[random.Random] = None) -> str:
         """玩耍活动"""
         if self.energy < 20:
             return f"{self.name}太累了,需要休息"
 
-        games = {
-            "fetch": {"energy": -20, "happiness": 30, "exp": 15},
-            "chase": {"energy": -30, "happiness": 40, "exp": 20},
-            "hide_seek": {"energy": -25, "happiness": 35, "exp": 18},
-            "training": {"energy": -35, "happiness": 25, "exp": 25}
-        }
-
-        if game_type not in games:
+        game = RULES.games.get(game_type)
+        if game is None:
             return "没有这种游戏..."
 
-        game = games[game_type]
         self.energy = max(0, self.energy + game["energy"])
         self.happiness = min(100, self.happiness + game["happiness"])
-        self.gain_experience(game["exp"])
-        self.last_interaction_time = time.time()
+        self.gain_experience(game["exp"], rng)
+        self.last_interaction_time = game_time()
 
         return f"{self.name}玩得很开心! (获得{game['exp']}经验)"
 
+
+class PetRoster:
+    """列式宠物名册:每项数值属性是一段连续数组,宠物对象只是其中一行的视图"""
+
+    # 列名及数据类型,饥饿度和体力存储的是起算值,配合起算时间惰性计算
+    COLUMNS = {
+        "level": "int64",
+        "experience": "int64",
+        "health": "float64",
+        "strength": "float64",
+        "agility": "float64",
+        "intelligence": "float64",
+        "growth_rate": "float64",
+        "hunger": "float64",
+        "hunger_since": "float64",
+        "happiness": "float64",
+        "energy": "float64",
+        "energy_since": "float64",
+        "is_sleeping": "bool",
+        "last_feed_time": "float64",
+        "last_interaction_time": "float64"
+    }
+
+    # 批量计算心情时按编号返回
+    MOODS = ("正常", "饥饿", "疲惫", "孤独", "沮丧", "兴奋")
+    MOOD_CODES = {mood: code for code, mood in enumerate(MOODS)}
+
+    def __init__(self, capacity: int = 1024):
+        if np is None:
+            raise RuntimeError("列式宠物名册需要安装numpy")
+
+        self.size = 0
+        self.capacity = max(1, capacity)
+        self.columns = {name: np.zeros(self.capacity, dtype=dtype)
+                        for name, dtype in self.COLUMNS.items()}
+        self.pets: List["RosterPet"] = []  # 按行号排列的宠物视图
+
+    def __len__(self) -> int:
+        return self.size
+
+    def column(self, name: str):
+        """获取某一列已使用部分的视图"""
+        return self.columns[name][:self.size]
+
+    def _allocate_row(self) -> int:
+        """分配新行,容量不足时成倍扩容"""
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for name, column in self.columns.items():
+                grown = np.zeros(self.capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self.columns[name] = grown
+
+        row = self.size
+        self.size += 1
+        return row
+
+    def create_pet(self, name: str, species: str) -> "RosterPet":
+        """在名册中创建一个新宠物"""
+        pet = RosterPet(self, self._allocate_row(), name, species)
+        self.pets.append(pet)
+        return pet
+
+    def owns(self, pet: Pet) -> bool:
+        """宠物是否存放在这个名册中"""
+        return isinstance(pet, RosterPet) and pet._roster is self
+
+    def release(self, pet: "RosterPet") -> None:
+        """释放宠物占用的行: 最后一行移到空出的位置,已使用的行保持连续。
+        之前取得的行号随之失效,被释放的宠物对象不能再使用"""
+        row = pet._row
+        last = self.size - 1
+        if row != last:
+            for column in self.columns.values():
+                column[row] = column[last]
+            moved = self.pets[last]
+            moved._row = row
+            self.pets[row] = moved
+        self.pets.pop()
+        self.size = last
+        pet._roster = None
+
+    def retain(self, pets: Iterable[Pet]) -> None:
+        """只保留pets中存放在本名册的宠物,按pets的顺序重排行号并释放其余的行
+        (例如加载存档后释放旧的宠物和加载失败时创建的宠物)"""
+        keep = [pet for pet in pets if self.owns(pet)]
+        kept = {id(pet) for pet in keep}
+        for pet in self.pets:
+            if id(pet) not in kept:
+                pet._roster = None
+        rows = np.fromiter((pet._row for pet in keep), dtype=np.intp, count=len(keep))
+        for column in self.columns.values():
+            column[:len(keep)] = column[rows]
+        for row, pet in enumerate(keep):
+            pet._row = row
+        self.pets = keep
+        self.size = len(keep)
+
+    def _select(self, rows):
+        """把行号列表转换为索引,为空时表示全部宠物"""
+        if rows is None:
+            return slice(0, self.size)
+        return np.asarray(rows, dtype=np.intp)
+
+    def hunger_at(self, current_time: float, rows=None):
+        """批量计算指定时间点的饥饿度"""
+        index = self._select(rows)
+        columns = self.columns
+        return drifted_stat(columns["hunger"][index], columns["hunger_since"][index],
+                            current_time, Pet.HUNGER_PER_HOUR)
+
+    def energy_at(self, current_time: float, rows=None):
+        """批量计算指定时间点的体力"""
+        index = self._select(rows)
+        columns = self.columns
+        return drifted_stat(columns["energy"][index], columns["energy_since"][index], current_time,
+                            np.where(columns["is_sleeping"][index], Pet.ENERGY_PER_HOUR, 0))
+
+    def moods_at(self, current_time: Optional[float] = None, rows=None):
+        """批量计算心情编号,规则与Pet.mood_at一致"""
+        if current_time is None:
+            current_time = game_time()
+
+        index = self._select(rows)
+        hunger = self.hunger_at(current_time, rows)
+        energy = self.energy_at(current_time, rows)
+        happiness = self.columns["happiness"][index]
+        hours_since_interaction = (
+            current_time - self.columns["last_interaction_time"][index]) / 3600
+
+        codes = self.MOOD_CODES
+        return np.select(
+            [hunger > 80, energy < 20, hours_since_interaction > 24,
+             happiness < 30, happiness > 80],
+            [codes["饥饿"], codes["疲惫"], codes["孤独"], codes["沮丧"], codes["兴奋"]],
+            default=codes["正常"]
+        )
+
+    def _touch_rows(self, index) -> int:
+        """标记指定行的宠物数据已变化(增量存档和最佳比赛表据此更新),返回行数"""
+        pets = self.pets
+        row_numbers = np.arange(self.size)[index].tolist()
+        for row in row_numbers:
+            pets[row].touch()
+        return len(row_numbers)
+
+    def clamp_stats(self, rows=None, current_time: Optional[float] = None) -> None:
+        """把饥饿度、心情值和体力限制在0~100之间"""
+        if current_time is None:
+            current_time = game_time()
+
+        index = self._select(rows)
+        columns = self.columns
+        columns["hunger"][index] = np.clip(self.hunger_at(current_time, rows), 0, 100)
+        columns["hunger_since"][index] = current_time
+        columns["energy"][index] = np.clip(self.energy_at(current_time, rows), 0, 100)
+        columns["energy_since"][index] = current_time
+        columns["happiness"][index] = np.clip(columns["happiness"][index], 0, 100)
+        self._touch_rows(index)
+
+    def feed_all(self, food_type: str, rows=None, current_time: Optional[float] = None,
+                 rng: Optional[random.Random] = None) -> int:
+        """批量喂食,效果与Pet.feed一致,返回喂食的宠物数量"""
+        food = RULES.foods.get(food_type)
+        if food is None:
+            return 0
+        if current_time is None:
+            current_time = game_time()
+
+        index = self._select(rows)
+        columns = self.columns
+
+        # 更新状态
+        columns["hunger"][index] = np.clip(
+            self.hunger_at(current_time, rows) - food["hunger"] * columns["growth_rate"][index],
+            0, 100)
+        columns["hunger_since"][index] = current_time
+        columns["health"][index] = np.minimum(100, columns["health"][index] + food["health"])
+        columns["happiness"][index] = np.minimum(
+            100, columns["happiness"][index] + food.get("happiness", 5))
+        columns["experience"][index] += food["exp"]
+        columns["last_feed_time"][index] = current_time
+
+        # 只有经验达到升级要求(与Pet.get_exp_needed一致)的宠物才逐个处理升级
+        cumulative = np.asarray(CUMULATIVE_EXP, dtype=np.int64)
+        level = np.clip(columns["level"][index], 1, MAX_LEVEL - 1)
+        exp_needed = cumulative[level] - cumulative[level - 1]
+        ready = np.flatnonzero((columns["level"][index] < MAX_LEVEL)
+                               & (columns["experience"][index] >= exp_needed))
+        row_numbers = np.arange(self.size)[index]
+        for row in row_numbers[ready]:
+            self.pets[row].gain_experience(0, rng)
+        return self._touch_rows(index)
+
+
+def _roster_column(name: str) -> property:
+    """生成读写名册某一列的属性"""
+
+    def getter(self):
+        return self._roster.columns[name][self._row].item()
+
+    def setter(self, value):
+        self._roster.columns[name][self._row] = value
+
+    return property(getter, setter)
+
+
+class RosterPet(Pet):
+    """列式名册中的宠物,数值属性直接读写名册中对应的行"""
+
+    level = _roster_column("level")
+    experience = _roster_column("experience")
+    health = _roster_column("health")
+    strength = _roster_column("strength")
+    agility = _roster_column("agility")
+    intelligence = _roster_column("intelligence")
+    growth_rate = _roster_column("growth_rate")
+    _hunger = _roster_column("hunger")
+    hunger_since = _roster_column("hunger_since")
+    happiness = _roster_column("happiness")
+    _energy = _roster_column("energy")
+    energy_since = _roster_column("energy_since")
+    is_sleeping = _roster_column("is_sleeping")
+    last_feed_time = _roster_column("last_feed_time")
+    last_interaction_time = _roster_column("last_interaction_time")
+
+    __slots__ = ("_roster", "_row")
+
+    def __init__(self, roster: PetRoster, row: int, name: str, species: str):
+        self._roster = roster
+        self._row = row
+        super().__init__(name, species)
+        self.growth_rate = self.SPECIES_BASE_STATS[self.species]["growth_rate"]
+
+
 class DailyTasks:
     """每日任务系统"""
     def __init__(self):
@@ -369,15 +1394,18 @@ class DailyTasks:
             "训练": {"completed": False, "reward": 40, "description": "基础训练（无需道具）"},
             "社交": {"completed": False, "reward": 35, "description": "与其他宠物互动"}
         }
-        self.last_refresh = datetime.now()
+        self.last_refresh = datetime.fromtimestamp(game_time())
 
-    def refresh_tasks(self):
-        """刷新每日任务"""
-        now = datetime.now()
+    def refresh_tasks(self, now: Optional[datetime] = None) -> bool:
+        """刷新每日任务,now为空时使用当前的游戏时间,返回是否发生了刷新"""
+        if now is None:
+            now = datetime.fromtimestamp(game_time())
         if (now - self.last_refresh).days >= 1:
             for task in self.tasks.values():
                 task["completed"] = False
             self.last_refresh = now
+            return True
+        return False
 
     def complete_task(self, task_name: str) -> tuple[bool, int]:
         """完成任务"""
@@ -386,11 +1414,528 @@ class DailyTasks:
             return True, self.tasks[task_name]["reward"]
         return False, 0
 
+class PetCollection:
+    """按名字索引的宠物集合,保持加入顺序,按名字查找、加入和移除都是O(1)"""
+
+    def __init__(self, pets: Iterable[Pet] = ()):
+        self._pets: Dict[str, Pet] = {}
+        for pet in pets:
+            self.append(pet)
+
+    def __iter__(self) -> Iterator[Pet]:
+        return iter(self._pets.values())
+
+    def __len__(self) -> int:
+        return len(self._pets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._pets
+
+    def __getitem__(self, index: Union[int, slice]):
+        """按位置取宠物,需要从头数到index,是O(n)的;
+        界面只用它取第一个宠物,遍历请直接迭代集合"""
+        if isinstance(index, slice):
+            return list(islice(self._pets.values(), *index.indices(len(self._pets))))
+        if index < 0:
+            index += len(self._pets)
+        if not 0 <= index < len(self._pets):
+            raise IndexError("宠物索引超出范围")
+        return next(islice(self._pets.values(), index, None))
+
+    def get(self, name: str) -> Optional[Pet]:
+        """按名字查找宠物"""
+        return self._pets.get(name)
+
+    def append(self, pet: Pet) -> None:
+        """加入宠物,名字必须唯一"""
+        if pet.name in self._pets:
+            raise ValueError(f"宠物名字重复: {pet.name}")
+        self._pets[pet.name] = pet
+
+    def unique_name(self, name: str) -> str:
+        """返回集合中还没有使用的名字: name本身,或依次尝试"name(2)"、"name(3)"..."""
+        candidate, number = name, 1
+        while candidate in self._pets:
+            number += 1
+            candidate = f"{name}({number})"
+        return candidate
+
+    def pop(self, name: str) -> Pet:
+        """按名字移除并返回宠物"""
+        return self._pets.pop(name)
+
+    def remove(self, pet: Pet) -> None:
+        """移除宠物"""
+        del self._pets[pet.name]
+
+
+class BinarySaveFormat:
+    """二进制整局存档格式,按文件扩展名选用(见EXTENSIONS)
+
+    文件结构:
+        文件头  MAGIC, 版本号, 宠物字段表(schema)
+        游戏数据 长度 + JSON(金币、库存、比赛记录、字符串表等少量数据)
+        宠物记录 当前宠物和已售宠物两组,每组为数量 + 逐条记录
+    每条宠物记录为: 名字 + 按字段表打包的定长部分 + 技能 + 好友
+    """
+
+    MAGIC = b"PETSAV"
+    VERSION = 1
+    EXTENSIONS = (".petsav",)
+
+    # 宠物记录的定长字段: (字段名, struct格式); species存字符串表中的序号
+    PET_FIELDS = (
+        ("species", "H"),
+        ("level", "H"),
+        ("experience", "d"),
+        ("health", "d"),
+        ("strength", "d"),
+        ("agility", "d"),
+        ("intelligence", "d"),
+        ("hunger", "d"),
+        ("happiness", "d"),
+        ("energy", "d"),
+        ("is_sleeping", "?"),
+        ("birth_time", "d"),
+        ("last_feed_time", "d"),
+        ("last_interaction_time", "d"),
+        ("total_training_time", "d"),
+        ("total_training_sessions", "I"),
+        ("won_contests", "I"),
+        ("saved_at", "d"),  # 记录写入时间,饥饿度和体力从这一刻开始补算
+    )
+
+    RECORD = struct.Struct("<" + "".join(fmt for _, fmt in PET_FIELDS))
+
+    _HEADER = struct.Struct("<6sHH")
+    _U8 = struct.Struct("<B")
+    _U16 = struct.Struct("<H")
+    _U32 = struct.Struct("<I")
+    _SKILL = struct.Struct("<Hd")
+
+    # 存档时复制的宠物状态: 名字和PET_FIELDS中的字段(species为字符串),最后是好友
+    _CAPTURE = attrgetter(
+        "name", "species", "level", "experience", "health", "strength", "agility",
+        "intelligence", "hunger", "happiness", "energy", "is_sleeping", "birth_time",
+        "last_feed_time", "last_interaction_time", "total_training_time",
+        "total_training_sessions", "won_contests", "friends")
+
+    @classmethod
+    def capture(cls, pets: PetCollection) -> list:
+        """复制一组宠物的存档状态,之后可以在其他线程中用write写入。
+        每项为(状态, 技能熟练度);已售宠物存档区中的宠物为(名字, 起始槽位)"""
+        capture = cls._CAPTURE
+        if isinstance(pets, SoldPetArchive):
+            return pets.raw_entries()
+        return [(capture(pet), dict(pet.skill_exp)) for pet in pets]
+
+    @classmethod
+    def encode_record(cls, state: tuple, skill_exp: Dict[str, Union[int, float]],
+                      string_id: Callable[[str], int], saved_at: float) -> bytes:
+        """打包一条宠物记录(不含名字),state为_CAPTURE取得的状态,saved_at为取得状态的时间"""
+        pack_u16 = cls._U16.pack
+        pack_skill = cls._SKILL.pack
+        (_name, species, level, experience, health, strength, agility, intelligence,
+         hunger, happiness, energy, is_sleeping, birth_time, last_feed_time,
+         last_interaction_time, total_training_time, total_training_sessions,
+         won_contests, friends) = state
+        chunks = [cls.RECORD.pack(
+            string_id(species), int(level), experience,
+            health, strength, agility, intelligence,
+            hunger, happiness, energy, bool(is_sleeping),
+            birth_time, last_feed_time, last_interaction_time,
+            total_training_time, int(total_training_sessions), int(won_contests), saved_at)]
+        chunks.append(pack_u16(len(skill_exp)))
+        for skill, exp in skill_exp.items():
+            chunks.append(pack_skill(string_id(skill), exp))
+        chunks.append(pack_u16(len(friends)))
+        for friend in friends:
+            data = friend.encode("utf-8")
+            chunks.append(pack_u16(len(data)) + data)
+        return b"".join(chunks)
+
+    @classmethod
+    def decode_record(cls, record: struct.Struct, species_index: int, strings: List[str],
+                      buffer, offset: int) -> Tuple[list, Dict[str, Union[int, float]], List[str]]:
+        """解析一条宠物记录(不含名字),返回(定长字段值, 技能熟练度, 好友)"""
+        # 整数值还原为int,与JSON存档读出的类型保持一致
+        values = [int(value) if value.__class__ is float and value.is_integer() else value
+                  for value in record.unpack_from(buffer, offset)]
+        values[species_index] = strings[values[species_index]]
+        offset += record.size
+
+        unpack_u16 = cls._U16.unpack_from
+        (skill_count,) = unpack_u16(buffer, offset)
+        offset += 2
+        skill_exp = {strings[skill_id]: int(exp) if exp.is_integer() else exp
+                     for skill_id, exp in cls._SKILL.iter_unpack(
+                         buffer[offset:offset + skill_count * cls._SKILL.size])}
+        offset += skill_count * cls._SKILL.size
+
+        (friend_count,) = unpack_u16(buffer, offset)
+        offset += 2
+        friends = []
+        for _ in range(friend_count):
+            (size,) = unpack_u16(buffer, offset)
+            friends.append(str(buffer[offset + 2:offset + 2 + size], "utf-8"))
+            offset += 2 + size
+        return values, skill_exp, friends
+
+    @classmethod
+    def write(cls, f, meta: dict, groups: Tuple[list, ...],
+              raw_source: Optional["SoldPetArchive"] = None) -> None:
+        """写入存档,meta为游戏数据,groups依次为各组宠物capture的结果,
+        raw_source为提供原始记录的已售宠物存档区。
+        原始记录带着自己的写入时间原样复制,其余记录的写入时间为meta中的存档时间"""
+        fields = cls.PET_FIELDS
+        pack_u16 = cls._U16.pack
+        saved_at = meta["saved_at"]
+
+        # 原始记录沿用存档区的字符串表,可以原样写回
+        strings: Dict[str, int] = {}
+        if raw_source is not None:
+            strings = {text: i for i, text in enumerate(list(raw_source.strings))}
+
+        def string_id(text: str) -> int:
+            if text not in strings:
+                strings[text] = len(strings)
+            return strings[text]
+
+        def encode_name(text: str) -> bytes:
+            data = text.encode("utf-8")
+            return pack_u16(len(data)) + data
+
+        # 先打包宠物记录,字符串表在打包过程中生成
+        bodies = []
+        for entries in groups:
+            chunks = [cls._U32.pack(len(entries))]
+            for state, skill_exp in entries:
+                if isinstance(skill_exp, int):
+                    chunks.append(encode_name(state))
+                    chunks.append(raw_source.raw_record(skill_exp))
+                    continue
+                chunks.append(encode_name(state[0]))
+                chunks.append(cls.encode_record(state, skill_exp, string_id, saved_at))
+            bodies.append(b"".join(chunks))
+
+        meta = dict(meta, strings=list(strings))
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+        f.write(cls._HEADER.pack(cls.MAGIC, cls.VERSION, len(fields)))
+        for name, fmt in fields:
+            encoded = name.encode("ascii")
+            f.write(cls._U8.pack(len(encoded)) + encoded + fmt.encode("ascii"))
+        f.write(cls._U32.pack(len(meta_bytes)))
+        f.write(meta_bytes)
+        for body in bodies:
+            f.write(body)
+
+    @classmethod
+    def open(cls, f) -> Tuple[dict, "SaveRecordReader"]:
+        """读取文件头和游戏数据,返回游戏数据和逐条读取宠物记录的读取器"""
+        magic, version, field_count = cls._HEADER.unpack(f.read(cls._HEADER.size))
+        if magic != cls.MAGIC:
+            raise ValueError("不是有效的二进制存档文件")
+        if version > cls.VERSION:
+            raise ValueError(f"存档版本{version}过新,当前只支持到版本{cls.VERSION}")
+
+        # 按文件中的字段表解析,字段增减后旧存档仍可读取
+        fields = []
+        for _ in range(field_count):
+            (length,) = cls._U8.unpack(f.read(1))
+            entry = f.read(length + 1).decode("ascii")
+            fields.append((entry[:-1], entry[-1]))
+
+        (length,) = cls._U32.unpack(f.read(4))
+        meta = json.loads(f.read(length).decode("utf-8"))
+        strings = meta.pop("strings")
+        return meta, SaveRecordReader(f, tuple(fields), strings)
+
+
+class SaveRecordReader:
+    """按块读取二进制存档中的宠物记录,一次只解析一条,不需要把整个文件读入内存"""
+
+    BLOCK_SIZE = 1 << 20
+
+    def __init__(self, f, fields: Tuple[Tuple[str, str], ...], strings: List[str]):
+        self._file = f
+        self._buffer = b""
+        self._pos = 0
+        self.fields = tuple(name for name, _ in fields)
+        # 字段表与当前版本一致时可以按位置直接创建宠物
+        self.current_schema = fields == BinarySaveFormat.PET_FIELDS
+        self._record = struct.Struct("<" + "".join(fmt for _, fmt in fields))
+        self._species_index = self.fields.index("species")
+        self.strings = [sys.intern(text) for text in strings]
+
+    def _need(self, size: int) -> None:
+        """确保缓冲区从当前位置起至少有size字节"""
+        if len(self._buffer) - self._pos >= size:
+            return
+        rest = self._buffer[self._pos:]
+        self._buffer = rest + self._file.read(max(self.BLOCK_SIZE, size - len(rest)))
+        self._pos = 0
+        if len(self._buffer) < size:
+            raise ValueError("存档文件不完整")
+
+    def read_count(self) -> Optional[int]:
+        """读取下一组宠物的数量,文件结束时返回None"""
+        if self._pos >= len(self._buffer):
+            self._buffer = self._file.read(self.BLOCK_SIZE)
+            self._pos = 0
+            if not self._buffer:
+                return None
+        self._need(4)
+        (count,) = BinarySaveFormat._U32.unpack_from(self._buffer, self._pos)
+        self._pos += 4
+        return count
+
+    def next_record(self) -> Tuple[str, bytes, int, int]:
+        """读取下一条记录,返回(名字, 缓冲区, 记录其余部分的偏移, 长度),
+        缓冲区只在读取下一条记录之前有效"""
+        unpack_u16 = BinarySaveFormat._U16.unpack_from
+        self._need(2)
+        (size,) = unpack_u16(self._buffer, self._pos)
+        self._need(2 + size)
+        name = str(self._buffer[self._pos + 2:self._pos + 2 + size], "utf-8")
+        self._pos += 2 + size
+
+        # 先确定记录长度,保证整条记录都在缓冲区中
+        length = self._record.size + 2
+        self._need(length)
+        (skill_count,) = unpack_u16(self._buffer, self._pos + length - 2)
+        length += skill_count * BinarySaveFormat._SKILL.size + 2
+        self._need(length)
+        (friend_count,) = unpack_u16(self._buffer, self._pos + length - 2)
+        for _ in range(friend_count):
+            self._need(length + 2)
+            (size,) = unpack_u16(self._buffer, self._pos + length)
+            length += 2 + size
+        self._need(length)
+
+        offset = self._pos
+        self._pos += length
+        return name, self._buffer, offset, length
+
+    def decode(self, buffer, offset: int) -> Tuple[list, Dict[str, Union[int, float]], List[str]]:
+        """解析next_record返回的记录,返回(定长字段值, 技能熟练度, 好友)"""
+        return BinarySaveFormat.decode_record(
+            self._record, self._species_index, self.strings, buffer, offset)
+
+    def to_dict(self, name: str, buffer, offset: int) -> dict:
+        """把记录转换为与Pet.to_dict字段名一致的存档数据"""
+        values, skill_exp, friends = self.decode(buffer, offset)
+        data = dict(zip(self.fields, values))
+        data.update(name=name, skill_exp=skill_exp, friends=friends)
+        return data
+
+
+class LazyPetCollection(PetCollection):
+    """延迟创建的宠物集合:先只记录宠物名字,首次访问某个宠物时才创建Pet对象"""
+
+    def __init__(self, loader: Callable[[str, int], Pet]):
+        super().__init__()
+        self._loader = loader
+
+    def add_pending(self, name: str, token: int) -> None:
+        """加入一个尚未创建的宠物,token由loader解释(例如数据库行号)"""
+        if name in self._pets:
+            raise ValueError(f"宠物名字重复: {name}")
+        self._pets[name] = token
+
+    def _materialize(self, name: str, value) -> Pet:
+        if isinstance(value, int):
+            value = self._loader(name, value)
+            self._pets[name] = value
+        return value
+
+    def __iter__(self) -> Iterator[Pet]:
+        for name, value in list(self._pets.items()):
+            yield self._materialize(name, value)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            names = list(islice(self._pets, *index.indices(len(self._pets))))
+            return [self._materialize(name, self._pets[name]) for name in names]
+        if index < 0:
+            index += len(self._pets)
+        if not 0 <= index < len(self._pets):
+            raise IndexError("宠物索引超出范围")
+        name = next(islice(self._pets, index, None))
+        return self._materialize(name, self._pets[name])
+
+    def get(self, name: str) -> Optional[Pet]:
+        value = self._pets.get(name)
+        return None if value is None else self._materialize(name, value)
+
+    def pop(self, name: str) -> Pet:
+        return self._materialize(name, self._pets.pop(name))
+
+    def snapshot(self) -> List[Tuple[str, Union[Pet, int]]]:
+        """按顺序返回(名字, 宠物或尚未创建的token),用于存档时跳过创建宠物"""
+        return list(self._pets.items())
+
+
+class SoldPetArchive(LazyPetCollection):
+    """已售宠物存档区: 宠物出售后按二进制存档的记录格式写入内存映射的临时文件,
+    内存中只保留名字到记录编号的索引。
+
+    文件按SLOT_SIZE字节的定长槽位划分,一条记录占用连续的若干槽位,
+    槽位开头是记录长度,写入时间保存在记录中;回购时只读取该宠物所在的槽位并创建Pet,
+    腾出的槽位留给之后相同大小的记录复用。存档区中的宠物不会缓存为Pet对象,
+    每次访问都得到一个新的对象。
+    """
+
+    SLOT_SIZE = 128
+    MIN_SLOTS = 1024
+    _SLOT_HEADER = BinarySaveFormat._U32  # 记录长度
+
+    def __init__(self, factory: Callable[[str, list, Dict[str, Union[int, float]], List[str]], Pet],
+                 strings: Optional[List[str]] = None):
+        super().__init__(self._read)
+        self._factory = factory
+        # 字符串表(品种和技能),存档时原样写入存档文件
+        self.strings: List[str] = list(strings or ())
+        self._string_ids = {text: i for i, text in enumerate(self.strings)}
+        self._species_index = [name for name, _ in BinarySaveFormat.PET_FIELDS].index("species")
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._capacity = 0  # 文件中的槽位数
+        self._used = 0  # 已分配到的槽位数
+        self._free: Dict[int, List[int]] = {}  # 连续槽位数 -> 空闲的起始槽位
+        self._slots: Dict[int, Tuple[int, int]] = {}  # 记录编号 -> (起始槽位, 槽位数)
+        self._next_id = 0
+        # 后台存档读取记录期间不能复用槽位或重新映射文件
+        self._lock = threading.Lock()
+        self._pins = 0
+        self._deferred: List[Tuple[int, int]] = []
+
+    def _string_id(self, text: str) -> int:
+        if text not in self._string_ids:
+            self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return self._string_ids[text]
+
+    def _allocate(self, span: int) -> int:
+        """分配连续span个槽位,返回起始槽位"""
+        free = self._free.get(span)
+        if free:
+            return free.pop()
+        if self._used + span > self._capacity:
+            capacity = max(self._capacity * 2, self._used + span, self.MIN_SLOTS)
+            with self._lock:
+                if self._file is None:
+                    self._file = tempfile.TemporaryFile(prefix="sold_pets_")
+                if self._map is not None:
+                    self._map.close()
+                self._file.truncate(capacity * self.SLOT_SIZE)
+                self._map = mmap.mmap(self._file.fileno(), capacity * self.SLOT_SIZE)
+                self._capacity = capacity
+        start = self._used
+        self._used += span
+        return start
+
+    def _release(self, record_id: int) -> None:
+        """释放一条记录占用的槽位"""
+        slot = self._slots.pop(record_id)
+        with self._lock:
+            if self._pins:
+                self._deferred.append(slot)
+                return
+        start, span = slot
+        self._free.setdefault(span, []).append(start)
+
+    def _store(self, name: str, data: bytes) -> None:
+        span = -(-(self._SLOT_HEADER.size + len(data)) // self.SLOT_SIZE)
+        start = self._allocate(span)
+        position = start * self.SLOT_SIZE
+        self._SLOT_HEADER.pack_into(self._map, position, len(data))
+        position += self._SLOT_HEADER.size
+        self._map[position:position + len(data)] = data
+        record_id = self._next_id
+        self._next_id += 1
+        self._slots[record_id] = (start, span)
+        self.add_pending(name, record_id)
+
+    def append(self, pet: Pet) -> None:
+        """把宠物写入存档区,之后不再持有这个Pet对象"""
+        if pet.name in self._pets:
+            raise ValueError(f"宠物名字重复: {pet.name}")
+        state = BinarySaveFormat._CAPTURE(pet)
+        self._store(pet.name, BinarySaveFormat.encode_record(
+            state, pet.skill_exp, self._string_id, game_time()))
+
+    def add_record(self, name: str, buffer, offset: int, length: int) -> None:
+        """加入一条按当前字段表和本存档区字符串表打包的原始记录"""
+        if name in self._pets:
+            raise ValueError(f"宠物名字重复: {name}")
+        self._store(name, bytes(buffer[offset:offset + length]))
+
+    def _read(self, name: str, record_id: int) -> Pet:
+        position = self._slots[record_id][0] * self.SLOT_SIZE
+        values, skill_exp, friends = BinarySaveFormat.decode_record(
+            BinarySaveFormat.RECORD, self._species_index, self.strings,
+            self._map, position + self._SLOT_HEADER.size)
+        return self._factory(name, values, skill_exp, friends)
+
+    def _materialize(self, name: str, value) -> Pet:
+        return self._read(name, value)
+
+    def remove(self, pet: Pet) -> None:
+        self._release(self._pets.pop(pet.name))
+
+    def pop(self, name: str) -> Pet:
+        record_id = self._pets[name]
+        pet = self._read(name, record_id)
+        del self._pets[name]
+        self._release(record_id)
+        return pet
+
+    def raw_entries(self) -> List[Tuple[str, int]]:
+        """按顺序返回(名字, 起始槽位),配合pin在其他线程中用raw_record读取"""
+        slots = self._slots
+        return [(name, slots[record_id][0]) for name, record_id in self._pets.items()]
+
+    def raw_record(self, start: int) -> bytes:
+        """取出从start槽位开始的原始记录(不含槽位头),可以在其他线程中调用"""
+        with self._lock:
+            position = start * self.SLOT_SIZE
+            (length,) = BinarySaveFormat._U32.unpack_from(self._map, position)
+            position += self._SLOT_HEADER.size
+            return self._map[position:position + length]
+
+    def pin(self) -> None:
+        """开始在其他线程读取原始记录,期间释放的槽位暂不复用"""
+        with self._lock:
+            self._pins += 1
+
+    def unpin(self) -> None:
+        with self._lock:
+            self._pins -= 1
+            if self._pins:
+                return
+            deferred, self._deferred = self._deferred, []
+        for start, span in deferred:
+            self._free.setdefault(span, []).append(start)
+
+
 class PetGame:
-    def __init__(self):
+    # 界面视图名称,数据变化时标记对应视图需要重绘
+    VIEWS = ("money", "inventory", "tasks", "pets", "status", "contests")
+    # 宠物列表变化记录的上限,超过后界面直接整体重建列表
+    MAX_PET_CHANGES = 1000
+    # 心情检查间隔(秒): 饥饿度或体力变化0.1所需的最短时间,状态显示不会更快变化
+    MOOD_CHECK_INTERVAL = 3600 * 0.1 / max(Pet.HUNGER_PER_HOUR, Pet.ENERGY_PER_HOUR)
+
+    def __init__(self, columnar: bool = False, seed: Optional[int] = None):
+        # 本局游戏的随机数发生器,seed相同时随机事件逐位相同
+        self.rng = GameRandom(seed)
         self.daily_task = DailyTasks()
-        self.pets = []  # 当前宠物列表
-        self.sold_pets = []  # 已售出宠物
+        self.pets = PetCollection()  # 当前宠物列表
+        self.sold_pets = SoldPetArchive(self.pet_from_values)  # 已售出宠物
+
+        # 列式宠物名册(需要numpy),用于大量宠物的批量运算
+        self.roster = PetRoster() if columnar else None
         self.money = 1000
 
         # 商店系统
@@ -445,25 +1990,209 @@ class PetGame:
         self.daily_tasks = []
         self.task_rewards = {}
 
+        # 比赛系统
+        self.contest_system = ContestSystem(self.rng)
+
+        # 需要重绘的视图,有视图被标记时调用on_dirty(界面借此安排重绘)
+        self.dirty_views = set(self.VIEWS)
+        self.on_dirty: Optional[Callable[[], None]] = None
+
+        # 定时规则(每日任务刷新、比赛刷新、心情检查),由start_rules登记
+        self.scheduler = GameScheduler()
+        # 宠物列表的增量变化: ("add", 名字) / ("remove", 名字), ("reset", "")表示整体重建
+        self.pet_changes: List[Tuple[str, str]] = [("reset", "")]
+
+        # 操作日志(见GameJournal),为空时不记录
+        self.journal: Optional["GameJournal"] = None
+        self.journal_seq = 0  # 最后一条操作记录的序号,随存档保存
+
+        # 各存档文件对应的存储(见GameStorage)
+        self._storages: Dict[str, "GameStorage"] = {}
+
+    def mark_dirty(self, *views: str) -> None:
+        """标记视图需要重绘,不传参数时标记全部视图"""
+        self.dirty_views.update(views or self.VIEWS)
+        if self.on_dirty:
+            self.on_dirty()
+
+    def start_rules(self, now: float, contest_refresh_interval: Optional[float] = 3600.0) -> None:
+        """在调度器中登记游戏规则的定时器,contest_refresh_interval为None时不自动刷新比赛。
+        每日任务的周期从now开始计算(游戏可能在引擎的模拟时钟生效前创建)"""
+        self.daily_task.last_refresh = datetime.fromtimestamp(now)
+        self._schedule_task_refresh()
+        if contest_refresh_interval is None:
+            self.scheduler.cancel("contests")
+        else:
+            self.scheduler.call_every(contest_refresh_interval, self._refresh_contests,
+                                      "contests", start=now + contest_refresh_interval)
+        self.scheduler.call_every(self.MOOD_CHECK_INTERVAL, lambda _now: self.mark_dirty("status"),
+                                  "mood", start=now + self.MOOD_CHECK_INTERVAL)
+
+    def _schedule_task_refresh(self) -> None:
+        """在上次刷新一天后刷新每日任务"""
+        deadline = (self.daily_task.last_refresh + timedelta(days=1)).timestamp()
+        self.scheduler.call_at(deadline, self._refresh_tasks, "daily_tasks")
+
+    def _refresh_tasks(self, now: float) -> None:
+        if self.daily_task.refresh_tasks(datetime.fromtimestamp(now)):
+            self.mark_dirty("tasks")
+        self._schedule_task_refresh()
+
+    def _refresh_contests(self, now: float) -> None:
+        self.contest_system.refresh_contests()
+        self.contest_system.refresh_time = datetime.fromtimestamp(now)
+        self.mark_dirty("contests")
+
+    def take_dirty(self) -> set:
+        """取出并清空需要重绘的视图"""
+        views = self.dirty_views
+        self.dirty_views = set()
+        return views
+
+    def _record_pet_change(self, action: str, name: str = "") -> None:
+        """记录宠物列表的变化,供界面增量更新"""
+        if action == "reset" or len(self.pet_changes) >= self.MAX_PET_CHANGES:
+            self.pet_changes = [("reset", "")]
+        else:
+            self.pet_changes.append((action, name))
+        self.mark_dirty("pets")
+
+    def take_pet_changes(self) -> List[Tuple[str, str]]:
+        """取出并清空宠物列表的变化记录"""
+        changes = self.pet_changes
+        self.pet_changes = []
+        return changes
+
+    def record_action(self, action: str, *pets: Pet,
+                      sold: Iterable[str] = (), bought_back: Iterable[str] = ()) -> None:
+        """把一次操作后的金币、库存、任务、比赛记录、折扣和受影响宠物的状态写入操作日志;
+        随机数子流的状态较大,只记录上一条记录之后抽取过随机数的子流"""
+        if self.journal is None:
+            return
+        self.journal_seq += 1
+        self.journal.append({
+            "seq": self.journal_seq,
+            "action": action,
+            "money": self.money,
+            "food_inventory": self.food_inventory,
+            "items_inventory": self.items_inventory,
+            "task_rewards": self.task_rewards,
+            "daily_tasks": {name: task["completed"] for name, task in self.daily_task.tasks.items()},
+            "contest_record": self.contest_record,
+            "current_discounts": self.current_discounts,
+            "rng": self.rng.changed_streams(self.journal.rng_states),
+            "pets": [pet.to_dict() for pet in pets],
+            "sold": list(sold),
+            "bought_back": list(bought_back)
+        })
+
+    def apply_journal_entry(self, entry: dict) -> None:
+        """重放一条操作记录(旧日志中没有的字段保持不变)"""
+        self.money = entry["money"]
+        self.food_inventory = entry["food_inventory"]
+        self.items_inventory = entry["items_inventory"]
+        if "task_rewards" in entry:
+            self.task_rewards = entry["task_rewards"]
+        for name, completed in entry.get("daily_tasks", {}).items():
+            if name in self.daily_task.tasks:
+                self.daily_task.tasks[name]["completed"] = completed
+        if "contest_record" in entry:
+            self.contest_record = entry["contest_record"]
+        if "current_discounts" in entry:
+            self.current_discounts = entry["current_discounts"]
+        self.rng.load_streams(entry.get("rng", {}))
+
+        for name in entry["sold"]:
+            pet = self.pets.get(name)
+            if pet:
+                self.pets.remove(pet)
+                self.sold_pets.append(self._detach(pet))
+                self._record_pet_change("remove", name)
+        for name in entry["bought_back"]:
+            pet = self.sold_pets.get(name)
+            if pet:
+                self.sold_pets.remove(pet)
+                self.pets.append(self._attach(pet))
+                self._record_pet_change("add", name)
+
+        for pet_data in entry["pets"]:
+            pet = self.pets.get(pet_data["name"])
+            if pet is None:
+                self.pets.append(self.pet_from_dict(pet_data))
+                self._record_pet_change("add", pet_data["name"])
+            else:
+                pet.load_state(pet_data)
+
+        self.journal_seq = entry["seq"]
+        self.mark_dirty()
+
     def add_pet(self, name: str, species: str) -> str:
         """添加新宠物"""
-        # 检查名称是否已存在
-        if any(pet.name == name for pet in self.pets):
+        # 检查名称是否已存在(已售出的宠物仍可能被回购,名字同样不能重复)
+        if self.is_name_taken(name):
             return "这个名字已经被使用了!"
 
         if species not in Pet.SPECIES_BASE_STATS:
             return "不支持的宠物品种!"
 
-        new_pet = Pet(name, species)
+        new_pet = self._create_pet(name, species)
         self.pets.append(new_pet)
+        self._record_pet_change("add", name)
+        self.record_action("add_pet", new_pet)
         return f"欢迎{name}加入家族!"
 
+    def _create_pet(self, name: str, species: str) -> Pet:
+        """创建宠物,启用列式名册时宠物存放在名册中"""
+        if self.roster is not None:
+            return self.roster.create_pet(name, species)
+        return Pet(name, species)
+
+    def _attach(self, pet: Pet) -> Pet:
+        """宠物加入当前宠物列表前调用: 启用列式名册时把名册以外的宠物复制到名册中"""
+        if self.roster is None or self.roster.owns(pet):
+            return pet
+        attached = self.pet_from_dict(pet.to_dict())
+        attached.revision = pet.revision
+        return attached
+
+    def _detach(self, pet: Pet) -> Pet:
+        """宠物离开当前宠物列表后调用: 名册中的宠物复制为普通宠物,并释放它在名册中的行"""
+        if self.roster is None or not self.roster.owns(pet):
+            return pet
+        detached = Pet.from_dict(pet.to_dict())
+        detached.revision = pet.revision
+        self.roster.release(pet)
+        return detached
+
+    def pet_from_dict(self, data: dict, saved_at: Optional[float] = None) -> Pet:
+        """根据存档数据创建宠物(不会加入宠物列表)"""
+        return self._create_pet(data["name"], data["species"]).load_state(data, saved_at)
+
+    def pet_from_values(self, name: str, values: list, skill_exp: Dict[str, Union[int, float]],
+                        friends: List[str]) -> Pet:
+        """根据按BinarySaveFormat.PET_FIELDS顺序排列的字段值创建宠物(不会加入宠物列表),
+        饥饿度和体力从记录中的写入时间开始补算。用于读取已售宠物,
+        得到的总是普通宠物,不占用列式名册,回购时才复制到名册中"""
+        return Pet.from_record(name, *values, skill_exp, friends)
+
+    def adopt_pet(self, pet: Pet) -> str:
+        """加入一个已有的宠物(例如从宠物存档加载)"""
+        if self.is_name_taken(pet.name):
+            return "这个名字已经被使用了!"
+
+        pet = self._attach(pet)
+        self.pets.append(pet)
+        self._record_pet_change("add", pet.name)
+        self.record_action("adopt_pet", pet)
+        return f"欢迎{pet.name}加入家族!"
+
+    def is_name_taken(self, name: str) -> bool:
+        """检查名字是否已被当前或已售出的宠物使用"""
+        return name in self.pets or name in self.sold_pets
+
     def find_pet(self, name: str) -> Optional[Pet]:
         """查找特定宠物"""
-        for pet in self.pets:
-            if pet.name == name:
-                return pet
-        return None
+        return self.pets.get(name)
 
     def buy_food(self, food_type: str, quantity: int) -> str:
         """购买食物"""
@@ -480,6 +2209,8 @@ class PetGame:
         if self.money >= total_cost:
             self.money -= total_cost
             self.food_inventory[food_type] += quantity
+            self.mark_dirty("money", "inventory")
+            self.record_action("buy_food")
             return f"购买了{quantity}份{food_type},花费{total_cost}金币,剩余金币:{self.money}"
         return "金币不足..."
 
@@ -498,6 +2229,8 @@ class PetGame:
         if self.money >= total_cost:
             self.money -= total_cost
             self.items_inventory[item_type] += quantity
+            self.mark_dirty("money", "inventory")
+            self.record_action("buy_item")
             return f"购买了{quantity}个{item_type},花费{total_cost}金币,剩余金币:{self.money}"
         return "金币不足..."
 
@@ -510,21 +2243,58 @@ class PetGame:
         value = pet.calculate_value()
         self.money += value
         self.pets.remove(pet)
-        self.sold_pets.append(pet)
+        self.sold_pets.append(self._detach(pet))
+        self._record_pet_change("remove", pet.name)
+        self.mark_dirty("money")
+        self.record_action("sell_pet", sold=[pet.name])
         return f"你出售了{pet.name},获得{value}金币! 当前金币:{self.money}"
 
     def buy_back_pet(self, name: str) -> str:
         """回购已售出的宠物"""
-        for pet in self.sold_pets:
-            if pet.name == name:
-                value = pet.calculate_value()
-                if self.money >= value:
-                    self.money -= value
-                    self.sold_pets.remove(pet)
-                    self.pets.append(pet)
-                    return f"你回购了{pet.name},花费{value}金币! 当前金币:{self.money}"
-                return "金币不足,无法回购..."
-        return "找不到这个宠物..."
+        pet = self.sold_pets.get(name)
+        if not pet:
+            return "找不到这个宠物..."
+        if name in self.pets:
+            return "这个名字已经被使用了!"
+
+        value = pet.calculate_value()
+        if self.money >= value:
+            self.money -= value
+            self.sold_pets.remove(pet)
+            pet = self._attach(pet)
+            self.pets.append(pet)
+            self._record_pet_change("add", pet.name)
+            self.mark_dirty("money")
+            self.record_action("buy_back_pet", pet, bought_back=[pet.name])
+            return f"你回购了{pet.name},花费{value}金币! 当前金币:{self.money}"
+        return "金币不足,无法回购..."
+
+    def enter_contests(self, entries: List[Tuple[Pet, int]]
+                       ) -> List[Tuple[bool, bool, str, Optional["ContestReward"]]]:
+        """批量参加比赛(见ContestSystem.enter_contests),统一结算报名费和奖励,
+        每项返回(已参赛, 胜利, 消息, 奖励)"""
+        contests = self.contest_system.available_contests
+        results = self.contest_system.enter_contests(entries, budget=self.money)
+
+        entered: Dict[int, Pet] = {}
+        for (pet, contest_index), (joined, success, _message, rewards) in zip(entries, results):
+            if not joined:
+                continue
+            self.money -= contests[contest_index]['entry_fee']
+            entered[id(pet)] = pet
+            if success and rewards:
+                self.money += rewards['money']
+                pet.gain_experience(rewards['exp'], self.rng.skills)
+                for item, count in rewards['items'].items():
+                    if item in self.food_inventory:
+                        self.food_inventory[item] += count
+                    elif item in self.items_inventory:
+                        self.items_inventory[item] += count
+
+        if entered:
+            self.mark_dirty("money", "inventory", "status")
+            self.record_action("contest", *entered.values())
+        return results
 
     def use_item(self, item_type: str, pet_name: str) -> str:
         """使用物品"""
@@ -539,28 +2309,22 @@ class PetGame:
             return "找不到这个宠物..."
 
         # 物品效果
-        effects = {
-            "toy_ball": {"happiness": 20, "energy": -10},
-            "pet_bed": {"energy": 90, "health": 10},
-            "training_book": {"experience": 50},
-            "medicine": {"health": 30},
-            "grooming_kit": {"happiness": 30, "health": -10},
-            "vitamins": {"health": 15, "energy": 15}
-        }
-
-        effect = effects[item_type]
+        effect = RULES.items[item_type]
         self.items_inventory[item_type] -= 1
 
         # 应用效果
         for stat, value in effect.items():
             if stat == "experience":
-                pet.gain_experience(value)
+                pet.gain_experience(value, self.rng.skills)
             elif stat == "happiness":
                 pet.happiness = min(100, pet.happiness + value)
             elif stat == "energy":
                 pet.energy = min(100, pet.energy + value)
             elif stat == "health":
                 pet.health = min(100, pet.health + value)
+        pet.touch()
+        self.mark_dirty("inventory", "status")
+        self.record_action("use_item", pet)
 
         return f"对{pet_name}使用了{item_type},状态得到改善!"
 
@@ -602,77 +2366,491 @@ class PetGame:
                 if task["type"] == task_type:
                     self.task_rewards[task_type] = True
                     self.money += task["reward"]
+                    self.mark_dirty("money")
                     return task["reward"]
         return None
 
-    def save_game(self, filename="game_save.json"):
-        """保存游戏状态"""
-        save_data = {
-            "money": self.money,
-            "food_inventory": self.food_inventory,
-            "items_inventory": self.items_inventory,
-            "pets": [],
-            "sold_pets": [],
-            "contest_record": self.contest_record,
-            "current_discounts": self.current_discounts
-        }
+    def perform_free_activity(self, pet: Pet, activity_type: str) -> str:
+        """执行免费活动"""
+        activity = RULES.activities.get(activity_type)
+        if activity is None:
+            return "无效的活动类型"
 
-        # 保存当前宠物数据
-        for pet in self.pets:
-            pet_data = pet.get_status()
-            save_data["pets"].append(pet_data)
+        # 检查体力
+        if pet.energy < activity["energy_cost"]:
+            return f"{pet.name}太累了，需要休息"
 
-        # 保存已售出宠物数据
-        for pet in self.sold_pets:
-            pet_data = pet.get_status()
-            save_data["sold_pets"].append(pet_data)
+        # 执行活动
+        pet.energy -= activity["energy_cost"]
+        pet.happiness = min(100, pet.happiness + activity["happiness_gain"])
+        pet.gain_experience(activity["exp_gain"], self.rng.skills)
+        self.money += activity["coin_gain"]
+        self.mark_dirty("money", "tasks", "status")
 
-        # 保存到文件
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=4)
+        # 尝试完成每日任务
+        success, bonus = self.daily_task.complete_task(activity_type)
+        if success:
+            self.money += bonus
+        self.record_action("free_activity", pet)
 
-        return "游戏已保存"
+        if success:
+            return f"{pet.name}完成了{activity_type}！获得{activity['coin_gain']}金币和{bonus}金币的任务奖励！"
+
+        return f"{pet.name}完成了{activity_type}！获得{activity['coin_gain']}金币！"
+
+    def save_game(self, filename="game_save.json"):
+        """保存游戏状态,存储方式由扩展名决定(见GameStorage)"""
+        return self.prepare_save(filename)()
+
+    def prepare_save(self, filename="game_save.json") -> Callable[[], str]:
+        """复制存档所需的游戏状态,返回序列化并写入文件的函数。
+        复制在当前线程完成,返回的函数只使用复制出的数据,可以在后台线程执行。
+
+        复制的开销与存储方式有关: JSON和二进制存档每次复制全部当前宠物
+        (每个宠物一个状态字典或元组,1万个宠物时约120ms和60ms);
+        SQLite存档只复制数据版本变化的宠物,没有变化时1万个宠物约8ms。
+        已售宠物存档区中的宠物不在这里复制,由写入函数直接读取原始记录"""
+        return self.storage(filename).prepare_save(self)
+
+    def storage(self, filename: str) -> "GameStorage":
+        """取得存档文件对应的存储,同一个文件复用同一个存储,以便只写入变化的数据"""
+        storage = self._storages.get(filename)
+        if storage is None:
+            storage = self._storages[filename] = GameStorage.for_path(filename)
+        return storage
+
+    def save_meta(self) -> dict:
+        """复制宠物以外的存档数据"""
+        return {
+            "money": self.money,
+            "food_inventory": dict(self.food_inventory),
+            "items_inventory": dict(self.items_inventory),
+            "contest_record": copy.deepcopy(self.contest_record),
+            "current_discounts": dict(self.current_discounts),
+            "journal_seq": self.journal_seq,
+            "rng": self.rng.to_dict(),
+            "saved_at": game_time()
+        }
 
     def load_game(self, filename="game_save.json"):
-        """加载游戏状态"""
+        """加载游戏状态,存储方式由扩展名决定"""
         if not os.path.exists(filename):
             return "没有找到存档文件"
 
+        storage = GameStorage.for_path(filename)
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                save_data = json.load(f)
-
-            # 恢复游戏状态
-            self.money = save_data["money"]
-            self.food_inventory = save_data["food_inventory"]
-            self.items_inventory = save_data["items_inventory"]
-            self.current_discounts = save_data["current_discounts"]
-
-            # 恢复宠物
-            self.pets = []
-            for pet_data in save_data["pets"]:
-                pet = Pet(pet_data["name"], pet_data["species"])
-                # 恢复宠物所有属性
-                for key, value in pet_data.items():
-                    if hasattr(pet, key):
-                        setattr(pet, key, value)
-                self.pets.append(pet)
-
-            # 恢复已售出宠物
-            self.sold_pets = []
-            for pet_data in save_data["sold_pets"]:
-                pet = Pet(pet_data["name"], pet_data["species"])
-                for key, value in pet_data.items():
-                    if hasattr(pet, key):
-                        setattr(pet, key, value)
-                self.sold_pets.append(pet)
-
-            self.contest_record = save_data["contest_record"]
-
-            return "游戏已加载"
+            storage.load(self)
         except Exception as e:
             return f"加载游戏失败: {str(e)}"
 
+        # 游戏状态整体替换后,其他存储记录的已保存状态不再有效
+        self._storages = {filename: storage}
+        self._record_pet_change("reset")
+        self.mark_dirty()
+        return "游戏已加载"
+
+    def restore_state(self, save_data: dict, pets: PetCollection, sold_pets: PetCollection) -> None:
+        """用加载出的数据替换当前游戏状态"""
+        self.money = save_data["money"]
+        self.food_inventory = save_data["food_inventory"]
+        self.items_inventory = save_data["items_inventory"]
+        self.current_discounts = save_data["current_discounts"]
+        self.contest_record = save_data["contest_record"]
+        self.journal_seq = save_data.get("journal_seq", 0)
+        # 旧存档没有随机数状态,沿用当前的发生器
+        if save_data.get("rng"):
+            self.rng.load_dict(save_data["rng"])
+        # 名册中只保留加载出的宠物,旧宠物占用的行全部释放
+        if self.roster is not None:
+            self.roster.retain(pets)
+        self.pets = pets
+        self.sold_pets = sold_pets
+
+
+class GameStorage:
+    """整局存档的存储方式,按文件扩展名选择(见for_path),没有匹配的扩展名时使用JSON"""
+
+    EXTENSIONS: Tuple[str, ...] = ()
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def for_path(path: str) -> "GameStorage":
+        extension = os.path.splitext(path)[1].lower()
+        for storage in (BinaryStorage, SqliteStorage):
+            if extension in storage.EXTENSIONS:
+                return storage(path)
+        return JsonStorage(path)
+
+    def prepare_save(self, game: PetGame) -> Callable[[], str]:
+        """在当前线程复制游戏状态,返回写入存储的函数(可在后台线程执行)"""
+        raise NotImplementedError
+
+    def load(self, game: PetGame) -> None:
+        """加载存档并替换game的状态,失败时抛出异常"""
+        raise NotImplementedError
+
+
+class JsonStorage(GameStorage):
+    """JSON格式的整局存档,用于导出和兼容旧版本存档"""
+
+    EXTENSIONS = (".json",)
+
+    def prepare_save(self, game: PetGame) -> Callable[[], str]:
+        save_data = game.save_meta()
+
+        # 保存当前宠物和已售出宠物数据
+        save_data["pets"] = [pet.get_status() for pet in game.pets]
+        save_data["sold_pets"] = [pet.get_status() for pet in game.sold_pets]
+
+        def write() -> str:
+            atomic_write(self.path, lambda f: json.dump(save_data, f, ensure_ascii=False, indent=4),
+                         binary=False)
+            return "游戏已保存"
+
+        return write
+
+    def load(self, game: PetGame) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            save_data = json.load(f)
+        # 饥饿度和体力从存档时间开始补算
+        saved_at = save_data.get("saved_at", game_time())
+
+        # 恢复宠物
+        pets = PetCollection()
+        for pet_data in save_data["pets"]:
+            # 旧版本允许同名宠物,重名的宠物加载时改名,不丢弃也不拒绝整个存档
+            if pet_data["name"] in pets:
+                pet_data = dict(pet_data, name=pets.unique_name(pet_data["name"]))
+            pets.append(game.pet_from_dict(pet_data, saved_at))
+
+        # 恢复已售出宠物
+        sold_pets = SoldPetArchive(game.pet_from_values)
+        for pet_data in save_data["sold_pets"]:
+            # 旧存档中可能有重名的已售宠物,只保留最早的一个
+            if pet_data["name"] in pets or pet_data["name"] in sold_pets:
+                continue
+            sold_pets.append(Pet.from_dict(pet_data, saved_at))
+
+        game.restore_state(save_data, pets, sold_pets)
+
+
+class BinaryStorage(GameStorage):
+    """二进制整局存档(见BinarySaveFormat)"""
+
+    EXTENSIONS = BinarySaveFormat.EXTENSIONS
+
+    def prepare_save(self, game: PetGame) -> Callable[[], str]:
+        save_data = game.save_meta()
+        groups = (BinarySaveFormat.capture(game.pets), BinarySaveFormat.capture(game.sold_pets))
+        raw_source = game.sold_pets if isinstance(game.sold_pets, SoldPetArchive) else None
+        if raw_source is not None:
+            raw_source.pin()
+
+        def write() -> str:
+            try:
+                atomic_write(self.path, lambda f: BinarySaveFormat.write(f, save_data, groups, raw_source))
+            finally:
+                if raw_source is not None:
+                    raw_source.unpin()
+            return "游戏已保存"
+
+        return write
+
+    def load(self, game: PetGame) -> None:
+        """流式加载: 宠物逐条解析创建,已售宠物的记录直接复制到已售宠物存档区"""
+        with open(self.path, 'rb') as f:
+            save_data, reader = BinarySaveFormat.open(f)
+            saved_at = save_data.get("saved_at", game_time())
+            fast = reader.current_schema and game.roster is None
+
+            def build(name: str, buffer, offset: int,
+                      create: Callable[[dict], Pet] = game.pet_from_dict) -> Pet:
+                if fast:
+                    values, skill_exp, friends = reader.decode(buffer, offset)
+                    return Pet.from_record(name, *values, skill_exp, friends)
+                # 旧字段表的记录没有写入时间,从整个存档的保存时间开始补算
+                data = reader.to_dict(name, buffer, offset)
+                data.setdefault("saved_at", saved_at)
+                return create(data)
+
+            pets = PetCollection()
+            for _ in range(reader.read_count() or 0):
+                name, buffer, offset, _length = reader.next_record()
+                pets.append(build(name, buffer, offset))
+
+            # 字段表一致时记录可以原样复制,否则先创建宠物再按当前字段表写入
+            sold_pets = SoldPetArchive(game.pet_from_values,
+                                       reader.strings if reader.current_schema else None)
+            for _ in range(reader.read_count() or 0):
+                name, buffer, offset, length = reader.next_record()
+                # 旧存档中可能有重名的已售宠物,只保留最早的一个
+                if name in pets or name in sold_pets:
+                    continue
+                if reader.current_schema:
+                    sold_pets.add_record(name, buffer, offset, length)
+                else:
+                    sold_pets.append(build(name, buffer, offset, Pet.from_dict))
+
+        game.restore_state(save_data, pets, sold_pets)
+
+
+class SqliteStorage(GameStorage):
+    """SQLite存档: 游戏数据、宠物、已售宠物、技能、库存和比赛记录分表保存
+
+    同一个存储对象记住已写入的宠物版本号(Pet.revision)和库存,再次保存时
+    只在一个事务中写入发生变化的行;已售宠物加载后写入已售宠物存档区(见SoldPetArchive)。
+    每行宠物记录自己的写入时间(saved_at列),未变化的行不会重写,
+    加载时饥饿度和体力从该行自己的写入时间开始补算,而不是整局最后一次保存的时间。
+    query_pets可以直接按条件查询宠物,例如 query_pets(("level", ">", 30))。
+    """
+
+    EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+    PET_COLUMNS = (
+        "name", "species", "level", "experience", "health", "strength", "agility",
+        "intelligence", "hunger", "happiness", "energy", "is_sleeping", "birth_time",
+        "last_feed_time", "last_interaction_time", "total_training_time",
+        "total_training_sessions", "won_contests", "friends", "saved_at", "position")
+    PET_TABLES = ("pets", "sold_pets")
+    QUERY_OPERATORS = ("=", "!=", "<", "<=", ">", ">=")  # query_pets支持的比较运算符
+    META_KEYS = ("money", "current_discounts", "journal_seq", "rng", "saved_at")
+
+    # NUMERIC列中整数值的小数会按整数保存,读出的类型与JSON存档一致
+    SCHEMA = ["""CREATE TABLE IF NOT EXISTS game (key TEXT PRIMARY KEY, value TEXT)""",
+              """CREATE TABLE IF NOT EXISTS inventory (
+                     kind TEXT, item TEXT, amount INTEGER, PRIMARY KEY (kind, item))""",
+              """CREATE TABLE IF NOT EXISTS contest_records (key TEXT PRIMARY KEY, value TEXT)""",
+              """CREATE TABLE IF NOT EXISTS skills (
+                     pet_name TEXT, skill TEXT, exp NUMERIC, PRIMARY KEY (pet_name, skill))"""] + [
+        f"""CREATE TABLE IF NOT EXISTS {table} (
+                name TEXT PRIMARY KEY, species TEXT NOT NULL, level INTEGER NOT NULL,
+                experience NUMERIC, health NUMERIC, strength NUMERIC, agility NUMERIC,
+                intelligence NUMERIC, hunger NUMERIC, happiness NUMERIC, energy NUMERIC,
+                is_sleeping INTEGER, birth_time REAL, last_feed_time REAL,
+                last_interaction_time REAL, total_training_time NUMERIC,
+                total_training_sessions INTEGER, won_contests INTEGER, friends TEXT,
+                position INTEGER, saved_at REAL)""" for table in PET_TABLES] + [
+        """CREATE INDEX IF NOT EXISTS pets_level ON pets (level)""",
+        """CREATE INDEX IF NOT EXISTS sold_pets_level ON sold_pets (level)"""]
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        # 数据库中已保存的内容: 宠物名字 -> (版本号, 位置)
+        self._saved: Dict[str, Dict[str, Tuple[int, int]]] = {
+            table: {} for table in self.PET_TABLES}
+        self._saved_inventory: Dict[Tuple[str, str], int] = {}
+        self._saved_contests: Dict[str, str] = {}
+        self._next_position = 0
+        # 数据库内容与_saved一致时才能只写入变化的行,否则整体重写
+        self._synced = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        # 旧版本的数据库没有每行的写入时间,补上该列(旧行为NULL,加载时使用整局的保存时间)
+        for table in self.PET_TABLES:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "saved_at" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN saved_at REAL")
+        return conn
+
+    @staticmethod
+    def _pet_row(pet: Pet, position: int, saved_at: float) -> tuple:
+        return (pet.name, pet.species, int(pet.level), pet.experience,
+                pet.health, pet.strength, pet.agility, pet.intelligence,
+                pet.hunger, pet.happiness, pet.energy, int(bool(pet.is_sleeping)),
+                pet.birth_time, pet.last_feed_time, pet.last_interaction_time,
+                pet.total_training_time, int(pet.total_training_sessions), int(pet.won_contests),
+                json.dumps(list(pet.friends), ensure_ascii=False), saved_at, position)
+
+    def _pet_changes(self, table: str, pets: PetCollection, full: bool, saved_at: float):
+        """比较一组宠物与数据库中已保存的版本,返回需要写入的行(写入时间为saved_at)"""
+        saved = self._saved[table]
+        archived = isinstance(pets, SoldPetArchive)
+        entries = pets.snapshot() if isinstance(pets, LazyPetCollection) \
+            else ((pet.name, pet) for pet in pets)
+
+        rows, skill_rows, dirty = [], [], []
+        current: Dict[str, Tuple[int, int]] = {}
+        for name, pet in entries:
+            previous = saved.get(name)
+            revision = None
+            if isinstance(pet, int):
+                if archived:
+                    # 存档区中的记录写入后不再变化,用记录编号(取负数)代替版本号
+                    revision = -1 - pet
+                    if previous is not None and previous[0] == revision and not full:
+                        current[name] = previous
+                        continue
+                pet = pets.get(name)
+            if revision is None:
+                revision = pet.revision
+            if previous is not None and previous[0] == revision and not full:
+                current[name] = previous
+                continue
+            if previous is None or full:
+                position = self._next_position
+                self._next_position += 1
+            else:
+                position = previous[1]
+            current[name] = (revision, position)
+            rows.append(self._pet_row(pet, position, saved_at))
+            skill_rows.extend((name, skill, exp) for skill, exp in pet.skill_exp.items())
+            dirty.append((name,))
+        removed = [(name,) for name in saved if name not in current]
+        return rows, skill_rows, dirty, removed, current
+
+    def prepare_save(self, game: PetGame) -> Callable[[], str]:
+        full = not self._synced
+        meta = game.save_meta()
+        game_rows = [(key, json.dumps(meta[key], ensure_ascii=False)) for key in self.META_KEYS]
+
+        inventory = {("food", item): amount for item, amount in meta["food_inventory"].items()}
+        inventory.update((("items", item), amount) for item, amount in meta["items_inventory"].items())
+        inventory_rows = [(kind, item, amount) for (kind, item), amount in inventory.items()
+                          if full or self._saved_inventory.get((kind, item)) != amount]
+
+        contests = {str(key): json.dumps(value, ensure_ascii=False)
+                    for key, value in meta["contest_record"].items()}
+        contest_rows = [(key, value) for key, value in contests.items()
+                        if full or self._saved_contests.get(key) != value]
+        removed_contests = [(key,) for key in self._saved_contests if key not in contests]
+
+        changes = {table: self._pet_changes(table, pets, full, meta["saved_at"])
+                   for table, pets in zip(self.PET_TABLES, (game.pets, game.sold_pets))}
+
+        def write() -> str:
+            conn = self._connect()
+            try:
+                with conn:  # 所有修改在一个事务中提交
+                    if full:
+                        for table in ("game", "inventory", "contest_records", "skills") + self.PET_TABLES:
+                            conn.execute(f"DELETE FROM {table}")
+                    conn.executemany("INSERT OR REPLACE INTO game VALUES (?, ?)", game_rows)
+                    conn.executemany("INSERT OR REPLACE INTO inventory VALUES (?, ?, ?)", inventory_rows)
+                    conn.executemany("INSERT OR REPLACE INTO contest_records VALUES (?, ?)", contest_rows)
+                    conn.executemany("DELETE FROM contest_records WHERE key = ?", removed_contests)
+
+                    columns = ", ".join(self.PET_COLUMNS)
+                    marks = ", ".join("?" * len(self.PET_COLUMNS))
+                    for table, (rows, _, dirty, removed, _) in changes.items():
+                        conn.executemany(f"DELETE FROM {table} WHERE name = ?", removed)
+                        conn.executemany(f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({marks})",
+                                         rows)
+                        conn.executemany("DELETE FROM skills WHERE pet_name = ?", dirty + removed)
+                    for rows, skill_rows, *_ in changes.values():
+                        conn.executemany("INSERT OR REPLACE INTO skills VALUES (?, ?, ?)", skill_rows)
+            finally:
+                conn.close()
+
+            self._saved = {table: change[4] for table, change in changes.items()}
+            self._saved_inventory = inventory
+            self._saved_contests = contests
+            self._synced = True
+            return "游戏已保存"
+
+        return write
+
+    def _pet_data(self, row: tuple, skill_exp: Dict[str, Union[int, float]],
+                  saved_at: Optional[float] = None) -> dict:
+        """数据库中的一行转换为与Pet.to_dict字段名一致的存档数据;
+        行中没有写入时间(旧版本数据库)时使用saved_at"""
+        data = dict(zip(self.PET_COLUMNS, row))
+        del data["position"]
+        if data["saved_at"] is None:
+            del data["saved_at"]
+            if saved_at is not None:
+                data["saved_at"] = saved_at
+        data["is_sleeping"] = bool(data["is_sleeping"])
+        data["friends"] = json.loads(data["friends"])
+        data["skill_exp"] = skill_exp
+        return data
+
+    def _skills(self, conn: sqlite3.Connection, condition: str, params: tuple = ()) -> Dict[str, dict]:
+        skills: Dict[str, dict] = {}
+        for pet_name, skill, exp in conn.execute(
+                f"SELECT pet_name, skill, exp FROM skills WHERE {condition} ORDER BY rowid", params):
+            skills.setdefault(pet_name, {})[skill] = exp
+        return skills
+
+    def load(self, game: PetGame) -> None:
+        conn = self._connect()
+        try:
+            meta = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM game")}
+            if "money" not in meta:
+                raise ValueError("数据库中没有游戏存档")
+            saved_at = meta.get("saved_at", game_time())
+
+            inventory = {}
+            meta["food_inventory"], meta["items_inventory"] = {}, {}
+            for kind, item, amount in conn.execute("SELECT kind, item, amount FROM inventory ORDER BY rowid"):
+                meta[f"{kind}_inventory"][item] = amount
+                inventory[(kind, item)] = amount
+            contests = dict(conn.execute("SELECT key, value FROM contest_records"))
+            meta["contest_record"] = {key: json.loads(value) for key, value in contests.items()}
+
+            # 当前宠物全部读取
+            skills = self._skills(conn, "pet_name IN (SELECT name FROM pets)")
+            pets = PetCollection()
+            saved_pets = {}
+            for row in conn.execute(f"SELECT {', '.join(self.PET_COLUMNS)} FROM pets ORDER BY position"):
+                pet = game.pet_from_dict(self._pet_data(row, skills.get(row[0], {}), saved_at))
+                pets.append(pet)
+                saved_pets[pet.name] = (pet.revision, row[-1])
+
+            # 已售宠物逐行写入已售宠物存档区,内存中不保留Pet对象,也不占用列式名册
+            sold_skills = self._skills(conn, "pet_name IN (SELECT name FROM sold_pets)")
+            sold_pets = SoldPetArchive(game.pet_from_values)
+            positions = {}
+            for row in conn.execute(
+                    f"SELECT {', '.join(self.PET_COLUMNS)} FROM sold_pets ORDER BY position"):
+                name = row[0]
+                if name in pets or name in sold_pets:
+                    continue
+                sold_pets.append(Pet.from_dict(self._pet_data(row, sold_skills.get(name, {}), saved_at)))
+                positions[name] = row[-1]
+            # 存档区中的记录用记录编号(取负数)代替版本号,与_pet_changes一致
+            saved_sold = {name: (-1 - record_id, positions[name])
+                          for name, record_id in sold_pets.snapshot()}
+
+            (max_position,) = conn.execute(
+                "SELECT MAX(position) FROM (SELECT position FROM pets UNION ALL "
+                "SELECT position FROM sold_pets)").fetchone()
+        finally:
+            conn.close()
+
+        game.restore_state(meta, pets, sold_pets)
+        self._saved = {"pets": saved_pets, "sold_pets": saved_sold}
+        self._saved_inventory = inventory
+        self._saved_contests = contests
+        self._next_position = (max_position or 0) + 1
+        self._synced = True
+
+    def query_pets(self, *filters: Tuple[str, str, object], table: str = "pets") -> List[dict]:
+        """按条件查询数据库中的宠物,返回存档数据(可用PetGame.pet_from_dict创建宠物)。
+        每个条件为(列名, 运算符, 值),列名须在PET_COLUMNS中,运算符须在QUERY_OPERATORS中,
+        值作为SQL参数传入;多个条件需同时满足,没有条件时返回全部宠物"""
+        if table not in self.PET_TABLES:
+            raise ValueError(f"没有这个宠物表: {table}")
+        clauses, params = [], []
+        for column, operator, value in filters:
+            if column not in self.PET_COLUMNS:
+                raise ValueError(f"没有这个宠物字段: {column}")
+            if operator not in self.QUERY_OPERATORS:
+                raise ValueError(f"不支持的比较运算符: {operator}")
+            clauses.append(f"{column} {operator} ?")
+            params.append(value)
+        condition, params = " AND ".join(clauses) or "1", tuple(params)
+        with closing(self._connect()) as conn:
+            skills = self._skills(
+                conn, f"pet_name IN (SELECT name FROM {table} WHERE {condition})", params)
+            return [self._pet_data(row, skills.get(row[0], {})) for row in conn.execute(
+                f"SELECT {', '.join(self.PET_COLUMNS)} FROM {table} WHERE {condition} ORDER BY position",
+                params)]
+
 
 class ContestType(Enum):
     """比赛类型枚举"""
@@ -700,17 +2878,41 @@ class ContestReward(TypedDict):
 class ContestSystem:
     """宠物比赛系统"""
 
-    def __init__(self):
+    # 参赛需要并消耗的体力
+    ENERGY_COST = 30
+    # 参赛后的结果消息
+    WIN_MESSAGE = "比赛胜利！"
+    LOSS_MESSAGE = "比赛失败，再接再厉！"
+
+    # 胜率公式的参数,逐个计算和numpy批量计算共用:
+    # 基础胜率 = BASE_CHANCE + 属性平均值/ATTRIBUTE_SCALE - DIFFICULTY_PENALTY×难度倍数,
+    # 限制在BASE_CHANCE_RANGE之内;技能加成 = SKILL_BONUS_RATE × 相关技能熟练度之和/MAX_SKILL_EXP,
+    # 最高MAX_SKILL_BONUS;最终胜率最高MAX_WIN_CHANCE
+    BASE_CHANCE = 0.5
+    ATTRIBUTE_SCALE = 200
+    DIFFICULTY_PENALTY = 0.1
+    BASE_CHANCE_RANGE = (0.1, 0.9)
+    SKILL_BONUS_RATE = 0.05
+    MAX_SKILL_EXP = 1000  # 假设1000为最高熟练度
+    MAX_SKILL_BONUS = 0.2
+    MAX_WIN_CHANCE = 0.95
+
+    def __init__(self, rng: Optional[GameRandom] = None):
+        # 比赛刷新和结果使用contests子流,物品奖励使用rewards子流
+        self.rng = rng or RANDOM
         self.available_contests: List[Dict] = []
+        # 每个宠物的最佳比赛: 名字 -> (宠物, (数据版本, 体力是否够参赛), 最佳比赛或None)
+        self._best: Dict[str, tuple] = {}
         self.refresh_time = datetime.now()
         self.refresh_contests()
 
     def refresh_contests(self):
         """刷新可参加的比赛"""
         self.available_contests.clear()
+        self._best = {}
         # 为每个难度创建一个比赛
         for difficulty in ContestDifficulty:
-            contest_type = random.choice(list(ContestType))
+            contest_type = self.rng.contests.choice(list(ContestType))
             self.available_contests.append({
                 'type': contest_type,
                 'difficulty': difficulty,
@@ -730,30 +2932,21 @@ class ContestSystem:
 
     def _generate_item_rewards(self, difficulty: ContestDifficulty) -> Dict[str, int]:
         """生成物品奖励"""
+        rng = self.rng.rewards
         items = {}
-        if random.random() < 0.3:
-            items['premium_food'] = random.randint(1, int(3 * difficulty.value[1]))
-        if random.random() < 0.2:
-            items['special_meal'] = random.randint(1, int(2 * difficulty.value[1]))
+        if rng.random() < 0.3:
+            items['premium_food'] = rng.randint(1, int(3 * difficulty.value[1]))
+        if rng.random() < 0.2:
+            items['special_meal'] = rng.randint(1, int(2 * difficulty.value[1]))
         return items
 
     def _get_min_level(self, difficulty: ContestDifficulty) -> int:
         """获取参赛最低等级要求"""
-        return {
-            ContestDifficulty.EASY: 1,
-            ContestDifficulty.NORMAL: 5,
-            ContestDifficulty.HARD: 15,
-            ContestDifficulty.MASTER: 30
-        }[difficulty]
+        return RULES.contest_difficulties[difficulty]["min_level"]
 
     def _get_entry_fee(self, difficulty: ContestDifficulty) -> int:
         """获取参赛费用"""
-        return {
-            ContestDifficulty.EASY: 50,
-            ContestDifficulty.NORMAL: 100,
-            ContestDifficulty.HARD: 200,
-            ContestDifficulty.MASTER: 500
-        }[difficulty]
+        return RULES.contest_difficulties[difficulty]["entry_fee"]
 
     def enter_contest(self, pet: Pet, contest_index: int) -> Tuple[bool, str, Optional[ContestReward]]:
         """参加比赛"""
@@ -762,87 +2955,1139 @@ class ContestSystem:
 
         contest = self.available_contests[contest_index]
 
-        # 检查等级要求
-        if pet.level < self._get_min_level(contest['difficulty']):
-            return False, f"宠物等级不足，需要{self._get_min_level(contest['difficulty'])}级", None
-
-        # 检查体力
-        if pet.energy < 30:
-            return False, "体力不足，需要休息", None
+        # 检查等级和体力
+        error = self.check_entry(pet, contest)
+        if error:
+            return False, error, None
 
         # 计算比赛结果
         result = self._calculate_contest_result(pet, contest)
 
         # 消耗体力
-        pet.energy -= 30
+        pet.energy -= self.ENERGY_COST
+        pet.touch()
 
         if result:
             pet.won_contests += 1
-            return True, "比赛胜利！", contest['rewards']
+            return True, self.WIN_MESSAGE, contest['rewards']
         else:
-            return False, "比赛失败，再接再厉！", None
+            return False, self.LOSS_MESSAGE, None
+
+    def check_entry(self, pet: Pet, contest: Dict, energy: Optional[float] = None) -> Optional[str]:
+        """检查宠物能否参加比赛,不能参加时返回原因;energy为None时使用宠物当前体力"""
+        min_level = self._get_min_level(contest['difficulty'])
+        if pet.level < min_level:
+            return f"宠物等级不足，需要{min_level}级"
+        if (pet.energy if energy is None else energy) < self.ENERGY_COST:
+            return "体力不足，需要休息"
+        return None
+
+    def enter_contests(self, entries: List[Tuple[Pet, int]], budget: Optional[float] = None
+                       ) -> List[Tuple[bool, bool, str, Optional[ContestReward]]]:
+        """批量参加比赛,entries为(宠物, 比赛索引)列表,同一个宠物可以出现多次
+
+        先按顺序一次检查比赛索引、报名费(budget为可用金币,None时不检查)、等级和体力,
+        再用一次批量抽签决定所有比赛的结果。每项返回(已参赛, 胜利, 消息, 奖励),
+        未参赛的项不收报名费,报名费和奖励由调用者统一结算。
+        """
+        results: List[Optional[Tuple[bool, bool, str, Optional[ContestReward]]]] = [None] * len(entries)
+        accepted = []
+        energy: Dict[int, float] = {}  # 宠物id -> 本批次参赛后剩余的体力
+        for position, (pet, contest_index) in enumerate(entries):
+            if not 0 <= contest_index < len(self.available_contests):
+                results[position] = (False, False, "无效的比赛索引", None)
+                continue
+            contest = self.available_contests[contest_index]
+            if budget is not None and budget < contest['entry_fee']:
+                results[position] = (False, False, "金币不足，无法支付报名费", None)
+                continue
+            remaining = energy.get(id(pet), pet.energy)
+            error = self.check_entry(pet, contest, remaining)
+            if error:
+                results[position] = (False, False, error, None)
+                continue
+            if budget is not None:
+                budget -= contest['entry_fee']
+            energy[id(pet)] = remaining - self.ENERGY_COST
+            accepted.append(position)
+
+        if accepted:
+            # 每个宠物对每个比赛的胜率批量计算一次,再统一抽签
+            pets = list({id(entries[position][0]): entries[position][0] for position in accepted}.values())
+            rows = {id(pet): row for row, pet in enumerate(pets)}
+            chances, _expected, _eligible = self.estimate_odds(pets)
+            rng = self.rng.contests
+            if np is not None:
+                draws = np.random.default_rng(rng.getrandbits(64)).random(len(accepted)).tolist()
+            else:
+                draws = [rng.random() for _ in accepted]
+
+            for position, draw in zip(accepted, draws):
+                pet, contest_index = entries[position]
+                contest = self.available_contests[contest_index]
+                won = draw < chances[rows[id(pet)]][contest_index]
+                pet.energy -= self.ENERGY_COST
+                pet.touch()
+                if won:
+                    pet.won_contests += 1
+                    results[position] = (True, True, self.WIN_MESSAGE, contest['rewards'])
+                else:
+                    results[position] = (True, False, self.LOSS_MESSAGE, None)
+        return results
 
     def _calculate_contest_result(self, pet: Pet, contest: Dict) -> bool:
         """计算比赛结果"""
+        return self.rng.contests.random() < self.win_chance(pet, contest)
+
+    def win_chance(self, pet: Pet, contest: Dict) -> float:
+        """计算宠物在比赛中的最终胜率(基础胜率加技能加成,最高95%)"""
         # 基础胜率计算
         base_chance = self._calculate_base_chance(pet, contest)
 
         # 技能加成
         skill_bonus = self._calculate_skill_bonus(pet, contest['type'])
 
-        # 最终胜率
-        final_chance = min(0.95, base_chance + skill_bonus)
-
-        return random.random() < final_chance
+        return self._final_chance(base_chance, skill_bonus)
+
+    @classmethod
+    def _base_chance_of(cls, attribute_value, difficulty_multiplier: float):
+        """由相关属性的平均值计算基础胜率,attribute_value可以是numpy数组"""
+        chance = (cls.BASE_CHANCE + (attribute_value / cls.ATTRIBUTE_SCALE)
+                  - (cls.DIFFICULTY_PENALTY * difficulty_multiplier))
+        low, high = cls.BASE_CHANCE_RANGE
+        if np is not None and isinstance(chance, np.ndarray):
+            return np.clip(chance, low, high)
+        return max(low, min(high, chance))
+
+    @classmethod
+    def _skill_bonus_of(cls, skill_total):
+        """由相关技能的熟练度之和计算技能加成,skill_total可以是numpy数组"""
+        bonus = cls.SKILL_BONUS_RATE * skill_total / cls.MAX_SKILL_EXP
+        if np is not None and isinstance(bonus, np.ndarray):
+            return np.minimum(cls.MAX_SKILL_BONUS, bonus)
+        return min(cls.MAX_SKILL_BONUS, bonus)
+
+    @classmethod
+    def _final_chance(cls, base_chance, skill_bonus):
+        """基础胜率加技能加成,参数可以是numpy数组"""
+        chance = base_chance + skill_bonus
+        if np is not None and isinstance(chance, np.ndarray):
+            return np.minimum(cls.MAX_WIN_CHANCE, chance)
+        return min(cls.MAX_WIN_CHANCE, chance)
+
+    def estimate_odds(self, pets: List[Pet]):
+        """计算每个宠物参加每个比赛的胜率和期望净收益(胜率×奖励金币-报名费)
+
+        返回(胜率, 期望净收益, 可参加) 三个 宠物数×比赛数 的矩阵,
+        安装了numpy时为数组并按整个宠物列表批量计算,否则为嵌套列表并逐个计算;
+        不满足等级或体力要求的组合不能参加,胜率为0。
+        """
+        pets = list(pets)
+        contests = self.available_contests
+        if np is None:
+            chances, expected, eligible = [], [], []
+            for pet in pets:
+                row_eligible = [pet.level >= self._get_min_level(contest['difficulty'])
+                                and pet.energy >= self.ENERGY_COST for contest in contests]
+                row_chances = [self.win_chance(pet, contest) if ok else 0.0
+                               for contest, ok in zip(contests, row_eligible)]
+                chances.append(row_chances)
+                expected.append([chance * contest['rewards']['money'] - contest['entry_fee']
+                                 for contest, chance in zip(contests, row_chances)])
+                eligible.append(row_eligible)
+            return chances, expected, eligible
+
+        count = len(pets)
+        levels = np.fromiter((pet.level for pet in pets), dtype=np.float64, count=count)
+        energy = np.fromiter((pet.energy for pet in pets), dtype=np.float64, count=count)
+        attributes = {}
+        skill_totals = {}
+        for contest in contests:
+            contest_type = contest['type']
+            for name in RULES.contest_attributes[contest_type]:
+                if name not in attributes:
+                    attributes[name] = np.fromiter(
+                        (getattr(pet, name) for pet in pets), dtype=np.float64, count=count)
+            if contest_type not in skill_totals:
+                relevant_skills = RULES.contest_skills[contest_type]
+                skill_totals[contest_type] = np.fromiter(
+                    (sum(exp for skill, exp in pet.skill_exp.items() if skill in relevant_skills)
+                     if pet.skill_exp else 0 for pet in pets), dtype=np.float64, count=count)
+
+        chances = np.zeros((count, len(contests)))
+        eligible = np.zeros((count, len(contests)), dtype=bool)
+        for column, contest in enumerate(contests):
+            names = RULES.contest_attributes[contest['type']]
+            attribute_value = sum(attributes[name] for name in names) / len(names)
+            base_chance = self._base_chance_of(attribute_value, contest['difficulty'].value[1])
+            skill_bonus = self._skill_bonus_of(skill_totals[contest['type']])
+            eligible[:, column] = ((levels >= self._get_min_level(contest['difficulty']))
+                                   & (energy >= self.ENERGY_COST))
+            chances[:, column] = np.where(
+                eligible[:, column], self._final_chance(base_chance, skill_bonus), 0.0)
+
+        rewards = np.array([contest['rewards']['money'] for contest in contests], dtype=np.float64)
+        fees = np.array([contest['entry_fee'] for contest in contests], dtype=np.float64)
+        return chances, chances * rewards - fees, eligible
+
+    def best_contests(self, pets: List[Pet]) -> List[Tuple[Pet, int, float, float]]:
+        """为每个宠物选出期望净收益最高的比赛,按期望净收益从高到低排列,
+        每项为(宠物, 比赛索引, 胜率, 期望净收益);没有可参加比赛的宠物不列出。
+
+        每个宠物的结果会缓存,只有比赛刷新、宠物数据变化(Pet.revision)
+        或体力是否足够参赛发生变化时才重新计算该宠物"""
+        pets = list(pets)
+        cost = self.ENERGY_COST
+        previous = self._best
+        cache: Dict[str, tuple] = {}
+        stale = []
+        for pet in pets:
+            key = (pet.revision, pet.energy >= cost)
+            cached = previous.get(pet.name)
+            if cached is not None and cached[0] is pet and cached[1] == key:
+                cache[pet.name] = cached
+            else:
+                stale.append((pet, key))
+        for (pet, key), best in zip(stale, self._best_options([pet for pet, _key in stale])):
+            cache[pet.name] = (pet, key, best)
+        self._best = cache
+
+        table = [(pet, *best) for pet, _key, best in map(cache.__getitem__, (pet.name for pet in pets))
+                 if best is not None]
+        table.sort(key=lambda row: row[3], reverse=True)
+        return table
+
+    def _best_options(self, pets: List[Pet]) -> List[Optional[Tuple[int, float, float]]]:
+        """计算每个宠物的(最佳比赛索引, 胜率, 期望净收益),没有可参加的比赛时为None"""
+        if not pets:
+            return []
+        chances, expected, eligible = self.estimate_odds(pets)
+        if np is None:
+            options = []
+            for row_chances, row_expected, row_eligible in zip(chances, expected, eligible):
+                allowed = [index for index, ok in enumerate(row_eligible) if ok]
+                if allowed:
+                    best = max(allowed, key=row_expected.__getitem__)
+                    options.append((best, row_chances[best], row_expected[best]))
+                else:
+                    options.append(None)
+            return options
+
+        if not self.available_contests:
+            return [None] * len(pets)
+        expected = np.where(eligible, expected, -np.inf)
+        best = expected.argmax(axis=1)
+        rows = np.arange(len(pets))
+        best_expected = expected[rows, best].tolist()
+        best_chances = chances[rows, best].tolist()
+        return [(index, chance, value) if value != -np.inf else None
+                for index, chance, value in zip(best.tolist(), best_chances, best_expected)]
 
     def _calculate_base_chance(self, pet: Pet, contest: Dict) -> float:
         """计算基础胜率"""
         contest_type = contest['type']
         difficulty_multiplier = contest['difficulty'].value[1]
 
-        # 根据比赛类型选择相关属性
-        attribute_value = {
-            ContestType.AGILITY: pet.agility,
-            ContestType.STRENGTH: pet.strength,
-            ContestType.INTELLIGENCE: pet.intelligence,
-            ContestType.TALENT: (pet.intelligence + pet.agility) / 2,
-            ContestType.BEAUTY: pet.happiness
-        }[contest_type]
+        # 根据比赛类型选择相关属性(多个属性取平均值)
+        attributes = RULES.contest_attributes[contest_type]
+        attribute_value = sum(getattr(pet, name) for name in attributes) / len(attributes)
 
         # 基础胜率计算
-        base_chance = 0.5 + (attribute_value / 200) - (0.1 * difficulty_multiplier)
-        return max(0.1, min(0.9, base_chance))
+        return self._base_chance_of(attribute_value, difficulty_multiplier)
 
     def _calculate_skill_bonus(self, pet: Pet, contest_type: ContestType) -> float:
         """计算技能加成"""
-        relevant_skills = {
-            ContestType.AGILITY: ["灵巧跳跃", "快速跳跃"],
-            ContestType.STRENGTH: ["忠诚守护", "救援能力"],
-            ContestType.INTELLIGENCE: ["夜视能力", "迷宫记忆"],
-            ContestType.TALENT: ["优雅姿态", "团队协作"],
-            ContestType.BEAUTY: ["优雅姿态", "九命"]
+        relevant_skills = RULES.contest_skills[contest_type]
+        skill_total = sum(exp for skill, exp in pet.skill_exp.items() if skill in relevant_skills)
+        return self._skill_bonus_of(skill_total)  # 最高20%技能加成
+
+
+def _round_robin_wins(task: Tuple[int, list, int, int]):
+    """循环赛中第start到stop-1号选手与排在其后的所有选手的对决,返回每个选手的胜场数。
+    task为(随机种子, 实力列表, start, stop),在进程池中执行"""
+    seed, strengths, start, stop = task
+    count = len(strengths)
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        strengths = np.asarray(strengths, dtype=np.float64)
+        wins = np.zeros(count, dtype=np.int64)
+        for first in range(start, stop):
+            others = strengths[first + 1:]
+            won = rng.random(len(others)) < strengths[first] / (strengths[first] + others)
+            wins[first] += np.count_nonzero(won)
+            wins[first + 1:] += ~won
+        return wins
+
+    rng = random.Random(seed)
+    wins = [0] * count
+    for first in range(start, stop):
+        strength = strengths[first]
+        for second in range(first + 1, count):
+            if rng.random() < strength / (strength + strengths[second]):
+                wins[first] += 1
+            else:
+                wins[second] += 1
+    return wins
+
+
+def _elimination_matches(task: Tuple[int, list, list]) -> List[bool]:
+    """淘汰赛中一组对决,task为(随机种子, 一方实力列表, 另一方实力列表),
+    返回每场第一方是否获胜,在进程池中执行"""
+    seed, first, second = task
+    if np is not None:
+        first = np.asarray(first, dtype=np.float64)
+        second = np.asarray(second, dtype=np.float64)
+        return (np.random.default_rng(seed).random(len(first)) < first / (first + second)).tolist()
+    rng = random.Random(seed)
+    return [rng.random() < a / (a + b) for a, b in zip(first, second)]
+
+
+class Tournament:
+    """锦标赛: 多个宠物在同一个比赛(类型和难度)中两两对决
+
+    选手按等级和比赛考察的属性排定种子;每个宠物的实力为它在该比赛中的胜率
+    (ContestSystem._calculate_base_chance加_calculate_skill_bonus),
+    两个宠物对决时一方获胜的概率为 实力 / 双方实力之和。
+    支持循环赛(round_robin)和单败淘汰赛(single_elimination),淘汰赛人数不是
+    2的幂时排名靠前的种子首轮轮空。对决按固定大小分组,每组使用由seed派生的
+    随机种子,比赛场数超过PARALLEL_MATCHES时分组交给进程池执行,
+    同一个seed的结果与是否并行无关,seed为None时从比赛系统的contests子流取得。
+    锦标赛只计算结果,不修改宠物和游戏状态。
+    """
+
+    ROUND_ROBIN = "round_robin"
+    SINGLE_ELIMINATION = "single_elimination"
+
+    # 每组对决的场数,以及使用进程池的比赛场数下限
+    CHUNK_MATCHES = 250_000
+    PARALLEL_MATCHES = 1_000_000
+
+    def __init__(self, contest_system: ContestSystem, contest: Dict, pets: Iterable[Pet],
+                 seed: Optional[int] = None, workers: Optional[int] = None):
+        self.contest_system = contest_system
+        self.contest = contest
+        self.workers = workers
+        if seed is None:
+            seed = contest_system.rng.contests.getrandbits(64)
+        self._random = random.Random(seed)
+        self.entrants = self._seed(list(pets))
+        self.strengths = [contest_system.win_chance(pet, contest) for pet in self.entrants]
+        # 淘汰赛每一轮的对决: (种子序号, 对手种子序号或None表示轮空, 胜者种子序号)
+        self.rounds: List[List[Tuple[int, Optional[int], int]]] = []
+
+    def _seed(self, pets: List[Pet]) -> List[Pet]:
+        """按等级、比赛考察属性的平均值排定种子顺序,同等条件下保持报名顺序"""
+        attributes = RULES.contest_attributes[self.contest['type']]
+        return sorted(pets, key=lambda pet: (
+            pet.level, sum(getattr(pet, name) for name in attributes) / len(attributes)), reverse=True)
+
+    def _run_tasks(self, function, tasks: list, matches: int) -> list:
+        """执行一批对决分组,场数较多时使用进程池"""
+        if matches < self.PARALLEL_MATCHES or len(tasks) < 2:
+            return [function(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(function, tasks))
+
+    def run(self, mode: str = SINGLE_ELIMINATION) -> List[Tuple[Pet, int]]:
+        """进行锦标赛,返回按名次排列的(宠物, 胜场数)"""
+        if mode == self.ROUND_ROBIN:
+            return self.run_round_robin()
+        if mode == self.SINGLE_ELIMINATION:
+            return self.run_single_elimination()
+        raise ValueError(f"不支持的赛制: {mode}")
+
+    def run_round_robin(self) -> List[Tuple[Pet, int]]:
+        """循环赛: 每两个宠物对决一次,按胜场数排名,胜场相同时种子靠前者在前"""
+        count = len(self.entrants)
+        # 按行划分对决,每组大约CHUNK_MATCHES场
+        tasks = []
+        start = 0
+        while start < count:
+            stop = start
+            matches = 0
+            while stop < count and (matches < self.CHUNK_MATCHES or stop == start):
+                matches += count - stop - 1
+                stop += 1
+            tasks.append((self._random.getrandbits(64), self.strengths, start, stop))
+            start = stop
+
+        chunks = self._run_tasks(_round_robin_wins, tasks, count * (count - 1) // 2)
+        if np is not None:
+            wins = np.sum(chunks, axis=0, dtype=np.int64).tolist() if chunks else []
+        else:
+            wins = [sum(values) for values in zip(*chunks)]
+        order = sorted(range(count), key=lambda index: -wins[index])
+        return [(self.entrants[index], wins[index]) for index in order]
+
+    @staticmethod
+    def bracket_order(size: int) -> List[int]:
+        """单败淘汰赛的签位: 返回长度为size(2的幂)的种子序号列表,
+        相邻两个为首轮对手,种子1和2只会在决赛相遇"""
+        order = [0]
+        while len(order) < size:
+            total = len(order) * 2
+            order = [seed for first in order for seed in (first, total - 1 - first)]
+        return order
+
+    def run_single_elimination(self) -> List[Tuple[Pet, int]]:
+        """单败淘汰赛: 按签位逐轮对决,返回按名次排列的(宠物, 胜场数),
+        冠军在前,其余按被淘汰的轮次和种子顺序排列;对决过程保存在rounds中"""
+        count = len(self.entrants)
+        self.rounds = []
+        if count == 0:
+            return []
+        size = 1
+        while size < count:
+            size *= 2
+
+        wins = [0] * count
+        eliminated: List[int] = []  # 按淘汰先后排列的种子序号
+        # 签位中超出人数的种子为轮空
+        slots: List[Optional[int]] = [seed if seed < count else None for seed in self.bracket_order(size)]
+        strengths = self.strengths
+        while len(slots) > 1:
+            pairs = [(slots[i], slots[i + 1]) for i in range(0, len(slots), 2)]
+            played = [(a, b) for a, b in pairs if a is not None and b is not None]
+            tasks = [(self._random.getrandbits(64),
+                      [strengths[a] for a, _ in played[i:i + self.CHUNK_MATCHES]],
+                      [strengths[b] for _, b in played[i:i + self.CHUNK_MATCHES]])
+                     for i in range(0, len(played), self.CHUNK_MATCHES)]
+            outcomes = iter([won for chunk in self._run_tasks(_elimination_matches, tasks, len(played))
+                             for won in chunk])
+
+            matches = []
+            losers = []
+            slots = []
+            for a, b in pairs:
+                if a is None or b is None:
+                    winner = a if b is None else b
+                    if winner is not None:
+                        matches.append((winner, None, winner))
+                    slots.append(winner)
+                    continue
+                winner, loser = (a, b) if next(outcomes) else (b, a)
+                wins[winner] += 1
+                losers.append(loser)
+                matches.append((a, b, winner))
+                slots.append(winner)
+            self.rounds.append(matches)
+            eliminated.extend(sorted(losers, reverse=True))
+
+        champion = slots[0]
+        order = [champion] + eliminated[::-1]
+        return [(self.entrants[index], wins[index]) for index in order]
+
+
+class GameEngine:
+    """无界面的定时引擎,按固定的模拟时间步长推进游戏规则。
+    引擎使用自己的游戏时钟(clock为空时从start_time开始的模拟时钟),
+    执行规则期间通过GameClock.activate生效,不修改全局的CLOCK"""
+
+    def __init__(self, game: PetGame, tick_seconds: float = 1.0,
+                 start_time: Optional[float] = None,
+                 contest_refresh_interval: Optional[float] = 3600.0,
+                 clock: Optional[GameClock] = None):
+        self.game = game
+        self.tick_seconds = tick_seconds
+        if clock is None:
+            clock = GameClock(time.time() if start_time is None else start_time)
+        self.clock = clock
+        self.ticks = 0
+
+        # 比赛刷新间隔(秒),为None时不自动刷新
+        self.contest_refresh_interval = contest_refresh_interval
+        game.start_rules(clock.now() if start_time is None else start_time, contest_refresh_interval)
+
+    def step(self, now: float) -> None:
+        """在指定时间点执行所有到期的定时规则(见PetGame.start_rules),
+        模拟时钟同步为now,真实时间的时钟不受影响"""
+        if self.clock.simulated_time is not None:
+            self.clock.simulated_time = now
+
+        # 宠物的饥饿度、体力和心情在读取时按时间惰性计算,这里无需逐个更新
+        with self.clock.activate():
+            self.game.scheduler.run_due(now)
+
+    def tick(self) -> None:
+        """推进一个模拟时间步"""
+        self.ticks += 1
+        self.step(self.clock.now() + self.tick_seconds)
+
+    def run(self, ticks: int) -> float:
+        """连续推进指定步数,返回模拟结束时的时间戳"""
+        for _ in range(ticks):
+            self.tick()
+        return self.clock.now()
+
+    def run_for(self, seconds: float) -> float:
+        """推进指定的模拟时长(秒)"""
+        return self.run(int(seconds / self.tick_seconds))
+
+
+def _simulate_households(task: Tuple[str, int, int, dict]) -> int:
+    """在工作进程中模拟start到stop-1号家庭,每户的指标写入共享内存中对应的行,
+    返回模拟的家庭数"""
+    shm_name, start, stop, config = task
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        row = HouseholdSimulation._ROW
+        for household in range(start, stop):
+            row.pack_into(shm.buf, household * row.size,
+                          *HouseholdSimulation.simulate_household(household, config))
+    finally:
+        shm.close()
+    return stop - start
+
+
+class HouseholdSimulation:
+    """多户家庭的并行模拟(用于负载测试)
+
+    每户家庭是一个独立的PetGame,随机数种子由总种子和家庭编号派生
+    (GameRandom.spawn),结果与分片方式和进程数无关。家庭按编号分成若干组
+    交给进程池,工作进程用GameEngine推进模拟时间并按固定策略行动
+    (饥饿时喂食、有体力时玩耍、定期参加期望收益为正的最佳比赛),
+    每户的指标直接写入共享内存中属于该户的一行,主进程只在结束后统一汇总,
+    各进程之间除共享内存外不交换数据。
+    """
+
+    # 每户家庭汇总的指标,共享内存中每户一行(float64)
+    METRICS = ("money", "pets", "total_level", "max_level", "skills",
+               "contests_entered", "contests_won")
+    _ROW = struct.Struct("<" + "d" * len(METRICS))
+
+    # 每个工作进程分到的分片数,分片越多负载越均衡
+    SHARDS_PER_WORKER = 4
+
+    def __init__(self, households: int, pets_per_household: int = 10, ticks: int = 100,
+                 tick_seconds: float = 600.0, contest_every: int = 6,
+                 seed: Optional[int] = None, workers: Optional[int] = None):
+        self.households = households
+        self.workers = workers or os.cpu_count() or 1
+        self.config = {
+            "seed": GameRandom(seed).seed,
+            "pets": pets_per_household,
+            "ticks": ticks,
+            "tick_seconds": tick_seconds,
+            "contest_every": contest_every,
+            "start_time": 1_700_000_000.0
+        }
+        self.metrics: List[Tuple[float, ...]] = []  # 运行后为每户的指标
+
+    @staticmethod
+    def simulate_household(household: int, config: dict) -> Tuple[float, ...]:
+        """模拟一户家庭,返回按METRICS排列的指标"""
+        seed = GameRandom(config["seed"]).spawn(f"household-{household}").seed
+        game = PetGame(seed=seed)
+        policy = game.rng.stream("policy")
+        skills = game.rng.skills
+        species = list(Pet.SPECIES_BASE_STATS)
+        engine = GameEngine(game, tick_seconds=config["tick_seconds"],
+                            start_time=config["start_time"])
+
+        # 宠物和规则读取的都是引擎自己的模拟时钟
+        with engine.clock.activate():
+            for index in range(config["pets"]):
+                game.add_pet(f"宠物{index}", policy.choice(species))
+
+            entered = won = 0
+            for tick in range(1, config["ticks"] + 1):
+                engine.tick()
+                for pet in game.pets:
+                    if pet.hunger > 60:
+                        if game.food_inventory["regular_food"] <= 0:
+                            game.buy_food("regular_food", 5)
+                        if game.food_inventory["regular_food"] > 0:
+                            game.food_inventory["regular_food"] -= 1
+                            pet.feed("regular_food", skills)
+                    elif pet.is_sleeping:
+                        # 体力只在睡眠时恢复,睡满后醒来
+                        if pet.energy >= 100:
+                            pet.wake_up()
+                    elif pet.energy >= 60:
+                        pet.play(policy.choice(list(RULES.games)), skills)
+                    else:
+                        pet.sleep()
+
+                if tick % config["contest_every"] == 0:
+                    entries = [(pet, contest_index) for pet, contest_index, _chance, expected
+                               in game.contest_system.best_contests(game.pets) if expected > 0]
+                    for joined, success, _message, _rewards in game.enter_contests(entries):
+                        entered += joined
+                        won += success
+
+        levels = [pet.level for pet in game.pets]
+        return (float(game.money), float(len(levels)), float(sum(levels)), float(max(levels, default=0)),
+                float(sum(len(pet.skill_exp) for pet in game.pets)), float(entered), float(won))
+
+    def run(self) -> dict:
+        """运行模拟,返回汇总结果(各指标的总和与平均值、耗时和每秒模拟的家庭数)"""
+        row = self._ROW
+        shm = shared_memory.SharedMemory(create=True, size=max(1, self.households * row.size))
+        started = time.perf_counter()
+        try:
+            # 按编号均匀分片
+            shards = max(1, min(self.households, self.workers * self.SHARDS_PER_WORKER))
+            bounds = [self.households * i // shards for i in range(shards + 1)]
+            tasks = [(shm.name, start, stop, self.config)
+                     for start, stop in zip(bounds, bounds[1:]) if stop > start]
+            if self.workers <= 1 or len(tasks) < 2:
+                for task in tasks:
+                    _simulate_households(task)
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    list(pool.map(_simulate_households, tasks))
+
+            data = bytes(shm.buf[:self.households * row.size])
+        finally:
+            shm.close()
+            shm.unlink()
+        elapsed = time.perf_counter() - started
+
+        self.metrics = list(row.iter_unpack(data))
+        if np is not None and self.metrics:
+            totals = np.asarray(self.metrics).sum(axis=0).tolist()
+        else:
+            totals = [sum(values) for values in zip(*self.metrics)] or [0.0] * len(self.METRICS)
+        count = max(1, self.households)
+        return {
+            "households": self.households,
+            "workers": self.workers,
+            "ticks": self.config["ticks"],
+            "seconds": elapsed,
+            "households_per_second": self.households / elapsed if elapsed else 0.0,
+            "totals": dict(zip(self.METRICS, totals)),
+            "means": {name: total / count for name, total in zip(self.METRICS, totals)}
         }
 
-        bonus = 0.0
-        for skill in pet.skills:
-            if skill in relevant_skills[contest_type]:
-                skill_level = pet.skill_exp.get(skill, 0) / 1000  # 假设1000为最高熟练度
-                bonus += 0.05 * skill_level
 
-        return min(0.2, bonus)  # 最高20%技能加成
+class BackgroundSaver:
+    """后台存档线程
+
+    主线程先复制好要保存的状态(PetGame.prepare_save / Pet.prepare_save),
+    序列化、fsync和原子替换文件都在工作线程中完成,完成后由root.after在主线程回调,
+    界面线程不会被大存档阻塞。
+    """
+
+    POLL_INTERVAL = 50  # 检查存档是否完成的间隔(毫秒)
+
+    def __init__(self, root):
+        self.root = root
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._results: "queue.Queue" = queue.Queue()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, name="pet-saver", daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Callable[[], str], on_done: Optional[Callable[[bool, str], None]] = None) -> None:
+        """提交写入任务,on_done(是否成功, 结果信息)在主线程调用"""
+        self._pending += 1
+        self._jobs.put((job, on_done))
+        if self._pending == 1:
+            self.root.after(self.POLL_INTERVAL, self._poll)
+
+    @property
+    def busy(self) -> bool:
+        return self._pending > 0
+
+    def _run(self) -> None:
+        while True:
+            job, on_done = self._jobs.get()
+            if job is None:
+                break
+            try:
+                result = (True, job())
+            except Exception as e:
+                result = (False, f"保存失败: {str(e)}")
+            self._results.put((on_done, result))
+
+    def _deliver(self) -> None:
+        """在主线程调用已完成任务的回调"""
+        while True:
+            try:
+                on_done, (ok, message) = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if on_done:
+                on_done(ok, message)
+
+    def _poll(self) -> None:
+        self._deliver()
+        if self._pending:
+            self.root.after(self.POLL_INTERVAL, self._poll)
+
+    def close(self) -> None:
+        """等待所有任务完成并停止工作线程(退出游戏时调用)"""
+        self._jobs.put((None, None))
+        self._thread.join()
+        self._deliver()
+
+
+class GameJournal:
+    """追加写入的操作日志
+
+    每次操作后记录金币、库存以及受影响宠物的完整状态(而不是操作本身,
+    比赛等随机结果因此可以原样重放)。日志第一行记录起点存档和序号,
+    恢复时先加载起点存档,再重放序号更大的记录。
+    flush只写出上次保存以来的新记录,记录数达到snapshot_every时整理为一个快照存档。
+    设置了saver时快照存档在后台线程写入,写完后再原子地替换日志。
+    """
+
+    def __init__(self, path: str = "game_journal.jsonl",
+                 snapshot_path: str = "game_autosave.petsav", snapshot_every: int = 500):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.game: Optional[PetGame] = None
+        self._file = None
+        self._entries = 0  # 起点存档之后的记录数
+        self._unflushed = 0
+        self.saver: Optional[BackgroundSaver] = None
+        # 追加记录后调用(界面借此安排落盘)
+        self.on_append: Optional[Callable[[], None]] = None
+        # 正在写入的起点存档,各自保存开始写入之后追加的记录
+        self._pending_snapshots: List[List[str]] = []
+        # 已记录的随机数子流状态(见GameRandom.changed_streams),开始或继续记录时清空
+        self.rng_states: Dict[str, tuple] = {}
+
+    def start(self, game: PetGame, base: Optional[str] = None) -> None:
+        """以存档base(为空表示新游戏)为起点重新开始记录,清空旧日志"""
+        self.close()
+        self.game = game
+        game.journal = self
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({"base": base, "seq": game.journal_seq}, ensure_ascii=False) + "\n")
+        self._entries = 0
+        self._unflushed = 1
+        self._pending_snapshots = []
+        self.rng_states = {}
+        self.flush()
+
+    def resume(self, game: PetGame) -> None:
+        """恢复之后在原日志末尾继续记录"""
+        self.close()
+        self.game = game
+        game.journal = self
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.rng_states = {}
+
+    def append(self, entry: dict) -> None:
+        """追加一条记录,写入缓冲区,由flush落盘"""
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        self._file.write(line)
+        self._entries += 1
+        self._unflushed += 1
+        for lines in self._pending_snapshots:
+            lines.append(line)
+        if self.on_append:
+            self.on_append()
+
+    def flush(self, compact: bool = True) -> int:
+        """把新记录写入磁盘,返回写出的记录数;记录过多且compact为真时整理为快照"""
+        if self._file is None or not self._unflushed:
+            return 0
+        count = self._unflushed
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unflushed = 0
+        if compact and self._entries >= self.snapshot_every and not self._pending_snapshots:
+            self.compact()
+        return count
+
+    def compact(self) -> None:
+        """保存快照存档,并以它为起点重新开始日志。
+        快照的状态在当前线程复制(开销见PetGame.prepare_save),写入在saver的线程中完成"""
+        self.save_base(self.game.prepare_save(self.snapshot_path), self.snapshot_path)
+
+    def save_base(self, job: Callable[[], str], base: str,
+                  on_done: Optional[Callable[[bool, str], None]] = None) -> None:
+        """执行job写入存档base,完成后以它为新的起点;
+        写入期间的新记录会保留到新日志中,写入失败时旧日志保持不变"""
+        seq = self.game.journal_seq
+        lines: List[str] = []
+        self._pending_snapshots.append(lines)
+
+        def finish(ok: bool, message: str) -> None:
+            # 期间调用过start(例如加载了其他存档)时不再替换日志
+            current = any(pending is lines for pending in self._pending_snapshots)
+            self._pending_snapshots = [
+                pending for pending in self._pending_snapshots if pending is not lines]
+            if ok and current and self._file is not None:
+                self._rebase(base, seq, lines)
+            if on_done:
+                on_done(ok, message)
+
+        if self.saver is not None:
+            self.saver.submit(job, finish)
+            return
+        try:
+            result = (True, job())
+        except Exception as e:
+            result = (False, f"保存失败: {str(e)}")
+        finish(*result)
+
+    def _rebase(self, base: str, seq: int, lines: List[str]) -> None:
+        """原子地把日志替换为新的起点加上lines中的记录"""
+        header = json.dumps({"base": base, "seq": seq}, ensure_ascii=False) + "\n"
+        self._file.close()
+        atomic_write(self.path, lambda f: f.write(header + "".join(lines)), binary=False)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._entries = len(lines)
+        self._unflushed = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            self._file.close()
+            self._file = None
+
+    def has_entries(self) -> bool:
+        """日志中是否有起点存档之后的记录"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.readline() != "" and f.readline() != ""
+
+    def recover(self, game: PetGame) -> str:
+        """加载日志的起点存档并重放之后的记录,game应为新建的游戏"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header["base"]:
+                result = game.load_game(header["base"])
+                if result != "游戏已加载":
+                    return result
+            game.journal_seq = max(game.journal_seq, header["seq"])
+
+            replayed = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 崩溃时最后一条记录可能只写了一半
+                if entry["seq"] > game.journal_seq:
+                    game.apply_journal_entry(entry)
+                    replayed += 1
+
+        self.resume(game)
+        return f"已恢复进度,重放了{replayed}条操作记录"
+
+
+class ActionStats:
+    """一个操作的性能统计: 调用次数、耗时直方图和内存分配"""
+
+    __slots__ = ("count", "total_ms", "max_ms", "buckets", "allocated", "peak")
+
+    def __init__(self, bucket_count: int):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * bucket_count
+        self.allocated = 0  # 各次调用结束时仍未释放的内存之和(字节)
+        self.peak = 0  # 单次调用期间内存峰值的最大值(字节)
+
+
+class GameMetrics:
+    """可选的性能统计,启动前设置环境变量PET_GAME_METRICS=1启用
+
+    attach把游戏、界面和操作日志的入口方法替换成计时包装(实例属性,类本身不受影响),
+    每个操作记录调用次数、耗时直方图,以及tracemalloc统计的内存分配。
+    操作内调用的其他操作(例如界面操作调用的游戏操作)各自计时,内存峰值只在最外层操作统计。
+    统计结果由export写成JSON文件。
+    """
+
+    ENV_VAR = "PET_GAME_METRICS"
+    # 耗时直方图各桶的上界(毫秒),最后一个桶收集更慢的调用
+    BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+    GAME_ACTIONS = ("add_pet", "adopt_pet", "buy_food", "buy_item", "sell_pet", "buy_back_pet",
+                    "enter_contests", "use_item", "perform_free_activity", "record_action",
+                    "prepare_save", "load_game")
+    GUI_ACTIONS = ("feed_pet", "play_with_pet", "sleep_pet", "wake_pet", "use_item", "buy_item",
+                   "train_skill", "interact_with_pet", "enter_selected_contest", "enter_best_contests",
+                   "update_all_displays", "update_pet_list", "update_best_contests", "on_select_pet",
+                   "save_game", "load_game", "save_current_pet", "load_pet_dialog")
+    JOURNAL_ACTIONS = ("flush",)
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.actions: Dict[str, ActionStats] = {}
+        self.started_at = datetime.now()
+        self._depth = 0  # 正在执行的被统计操作的嵌套层数
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["GameMetrics"]:
+        """设置了环境变量ENV_VAR时创建性能统计,否则返回None"""
+        return cls() if os.environ.get(cls.ENV_VAR) else None
+
+    def attach(self, gui: "PetGameGUI") -> None:
+        """包装界面、游戏和操作日志的入口方法。
+        必须在界面创建控件之前调用,按钮保存的是创建时取到的方法"""
+        self.instrument(gui.game, self.GAME_ACTIONS, "game")
+        self.instrument(gui, self.GUI_ACTIONS, "gui")
+        self.instrument(gui.journal, self.JOURNAL_ACTIONS, "journal")
+
+    def instrument(self, obj, names: Iterable[str], prefix: str) -> None:
+        """把obj的各个方法替换成计时包装,统计名称为"前缀.方法名" """
+        for name in names:
+            method = getattr(obj, name, None)
+            if method is not None:
+                setattr(obj, name, self.wrap(f"{prefix}.{name}", method))
+
+    def wrap(self, action: str, func: Callable) -> Callable:
+        """返回统计耗时和内存分配的包装函数"""
+        @wraps(func)
+        def timed(*args, **kwargs):
+            tracing = self.trace_memory and tracemalloc.is_tracing()
+            outermost = self._depth == 0
+            if tracing:
+                if outermost:
+                    tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._depth -= 1
+                allocated = peak = 0
+                if tracing:
+                    current, peak_total = tracemalloc.get_traced_memory()
+                    allocated = current - before
+                    if outermost:
+                        peak = peak_total - before
+                self.record(action, elapsed, allocated, peak)
+        return timed
+
+    def record(self, action: str, seconds: float, allocated: int = 0, peak: int = 0) -> None:
+        """记录一次调用"""
+        stats = self.actions.get(action)
+        if stats is None:
+            stats = self.actions[action] = ActionStats(len(self.BUCKETS_MS) + 1)
+        ms = seconds * 1000
+        stats.count += 1
+        stats.total_ms += ms
+        stats.max_ms = max(stats.max_ms, ms)
+        stats.buckets[bisect_left(self.BUCKETS_MS, ms)] += 1
+        stats.allocated += allocated
+        stats.peak = max(stats.peak, peak)
+
+    def percentile(self, stats: ActionStats, fraction: float) -> float:
+        """按直方图估计耗时分位数(毫秒): 取所在桶的上界,不超过最大耗时"""
+        target = stats.count * fraction
+        seen = 0
+        for bound, count in zip(self.BUCKETS_MS, stats.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, stats.max_ms)
+        return stats.max_ms
+
+    def summary(self) -> dict:
+        """整理全部统计,按总耗时从高到低排列"""
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        actions = {}
+        for action, stats in sorted(self.actions.items(), key=lambda item: -item[1].total_ms):
+            entry = {
+                "count": stats.count,
+                "total_ms": round(stats.total_ms, 3),
+                "mean_ms": round(stats.total_ms / stats.count, 3),
+                "max_ms": round(stats.max_ms, 3),
+                "p50_ms": round(self.percentile(stats, 0.5), 3),
+                "p95_ms": round(self.percentile(stats, 0.95), 3),
+                "p99_ms": round(self.percentile(stats, 0.99), 3),
+                "histogram": dict(zip(labels, stats.buckets)),
+            }
+            if self.trace_memory:
+                entry["allocated_bytes"] = stats.allocated
+                entry["peak_bytes"] = stats.peak
+            actions[action] = entry
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "trace_memory": self.trace_memory,
+            "actions": actions,
+        }
+
+    def export(self, filename: str = "game_metrics.json") -> str:
+        """把统计写入JSON文件"""
+        data = json.dumps(self.summary(), ensure_ascii=False, indent=2)
+        atomic_write(filename, lambda f: f.write(data), binary=False)
+        return f"性能统计已导出到{filename}"
+
+
+class VirtualPetList:
+    """虚拟化的宠物列表:Treeview只保留可见的几行,滚动时替换行内文字,
+    宠物再多也只渲染height行"""
+
+    def __init__(self, master, height: int = 15, on_select=None):
+        self.frame = ttk.Frame(master)
+        self.frame.grid_columnconfigure(0, weight=1)
+        self.frame.grid_rowconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self.frame, show="tree", height=height, selectmode="browse")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.height = height
+        self.names: List[str] = []  # 全部宠物名字,按加入顺序
+        self.first = 0  # 第一个可见行对应的位置
+        self.selected: Optional[str] = None
+        self.on_select = on_select
+
+        # 固定数量的显示行,滚动时只修改文字
+        self._rows = [self.tree.insert("", tk.END, text="") for _ in range(height)]
+
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self._scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda event: self._scroll_by(3))
+
+    def set_names(self, names: Iterable[str]) -> None:
+        """整体替换列表内容"""
+        self.names = list(names)
+        if self.selected not in self.names:
+            self.selected = None
+        self._scroll_to(self.first)
+
+    def insert(self, name: str) -> None:
+        """在末尾加入一个宠物"""
+        self.names.append(name)
+        if len(self.names) - 1 < self.first + self.height:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def remove(self, name: str) -> None:
+        """移除一个宠物"""
+        try:
+            index = self.names.index(name)
+        except ValueError:
+            return
+        del self.names[index]
+        if self.selected == name:
+            self.selected = None
+        if index < self.first:
+            self.first -= 1
+        self._scroll_to(self.first)
+
+    def apply_changes(self, changes: Iterable[Tuple[str, str]], names: Iterable[str]) -> None:
+        """应用PetGame记录的宠物列表变化,遇到reset时用names整体重建"""
+        for action, name in changes:
+            if action == "reset":
+                self.set_names(names)
+                return
+        for action, name in changes:
+            if action == "add":
+                self.insert(name)
+            elif action == "remove":
+                self.remove(name)
+
+    def select(self, name: Optional[str]) -> None:
+        """选中宠物并滚动到可见位置"""
+        self.selected = name
+        if name is not None and name in self.names:
+            index = self.names.index(name)
+            if not self.first <= index < self.first + self.height:
+                self.first = index
+        self._scroll_to(self.first)
+
+    def yview(self, *args) -> None:
+        """滚动条回调"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.names)))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.height
+            self._scroll_by(step)
+
+    def _on_mousewheel(self, event):
+        self._scroll_by(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _scroll_by(self, step: int) -> None:
+        self._scroll_to(self.first + step)
+
+    def _scroll_to(self, first: int) -> None:
+        self.first = max(0, min(first, len(self.names) - self.height))
+        self._render()
+
+    def _render(self) -> None:
+        """刷新可见行的文字和选中状态"""
+        selected_row = None
+        for offset, row in enumerate(self._rows):
+            index = self.first + offset
+            name = self.names[index] if index < len(self.names) else ""
+            if self.tree.item(row, "text") != name:
+                self.tree.item(row, text=name)
+            if name and name == self.selected:
+                selected_row = row
+        self.tree.selection_set(selected_row if selected_row is not None else ())
+        self._update_scrollbar()
+
+    def _update_scrollbar(self) -> None:
+        total = len(self.names)
+        if total <= self.height:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.first / total, (self.first + self.height) / total)
+
+    def _on_tree_select(self, event) -> None:
+        """用户点击某一行;程序设置选中状态时也会触发,名字没变时忽略"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        name = self.tree.item(selection[0], "text")
+        if not name or name == self.selected:
+            return
+        self.selected = name
+        if self.on_select:
+            self.on_select(name)
+
 
 class PetGameGUI:
-    def __init__(self, root, game):
+    # 游戏存档使用二进制格式,JSON格式用于导出
+    SAVE_FILE = "game_save.petsav"
+    EXPORT_FILE = "game_save.json"
+    # 操作日志落盘的间隔(毫秒)
+    AUTOSAVE_INTERVAL = 5000
+    # 最佳比赛表显示的行数
+    BEST_CONTEST_ROWS = 100
+    # 性能统计和性能分析的输出文件,分析结束时在日志中列出累计耗时最多的PROFILE_TOP个函数
+    METRICS_FILE = "game_metrics.json"
+    PROFILE_FILE = "game_profile.prof"
+    PROFILE_TOP = 15
+
+    def __init__(self, root, game, metrics: Optional[GameMetrics] = None):
         self.root = root
         self.root.title("宠物养成游戏")
         self.root.geometry("1200x800")
 
         self.game = game
         self.current_pet = None
+        self._rendered = {}  # 各视图上次绘制时的内容摘要
+        self.saver = BackgroundSaver(root)
+        self.journal = GameJournal()
+        self.journal.saver = self.saver
+        self.profiler: Optional[cProfile.Profile] = None
+        self.quitting = False  # 正在退出时存档完成不再弹出提示框
+
+        # 启用性能统计时,在创建控件之前包装各个入口方法
+        self.metrics = metrics
+        if metrics:
+            metrics.attach(self)
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_game)
 
         # 创建主界面
         self.create_gui()
 
+        # 上次没有正常保存时,从操作日志恢复进度
+        self.start_journal()
+
         self.start_display_updates()
 
         # 初始化每日任务
@@ -852,18 +4097,62 @@ class PetGameGUI:
         self.start_timers()
 
     def start_timers(self):
-        """启动定时任务"""
-
-        def update_pets():
-            # 定期更新所有宠物状态
-            for pet in self.game.pets:
-                pet.update_mood()
-            # 如果有当前选中的宠物，更新其显示
-            if self.current_pet:
-                self.update_status()
-            self.root.after(1000, update_pets)  # 每秒更新一次
-
-        update_pets()
+        """启动定时任务: 定时器都登记在游戏的调度器中,由一个Tk桥接在下一个期限唤醒,
+        空闲时不再每秒轮询"""
+        # 界面下比赛列表由玩家手动刷新,不自动刷新比赛
+        self.engine = GameEngine(self.game, contest_refresh_interval=None, clock=CLOCK)
+        scheduler = self.game.scheduler
+
+        # 每日任务的倒计时精确到分钟,在每分钟开始时重绘
+        now = game_time()
+        scheduler.call_every(60, lambda _now: self.request_display(), "minute",
+                             start=(now // 60 + 1) * 60)
+
+        # 数据变化时安排重绘,有新的操作记录时安排落盘
+        self.game.on_dirty = self.request_display
+        self.journal.on_append = self.schedule_autosave
+        self.schedule_autosave()
+
+        self.bridge = TkSchedulerBridge(self.root, scheduler)
+
+    def request_display(self):
+        """安排尽快重绘一次界面(多次请求合并为一次)"""
+        scheduler = self.game.scheduler
+        if not scheduler.has("display"):
+            scheduler.call_at(game_time(), lambda _now: self.update_all_displays(), "display")
+
+    def schedule_autosave(self):
+        """在AUTOSAVE_INTERVAL毫秒后把新的操作记录写入磁盘(只写出上次落盘以来的记录)"""
+        scheduler = self.game.scheduler
+        if not scheduler.has("autosave"):
+            scheduler.call_at(game_time() + self.AUTOSAVE_INTERVAL / 1000,
+                              lambda _now: self.journal.flush(), "autosave")
+
+    def start_journal(self):
+        """启动操作日志,日志中有未保存的记录时询问是否恢复"""
+        if self.journal.has_entries() and messagebox.askyesno(
+                "恢复进度", "检测到上次未保存的游戏进度，是否恢复？"):
+            result = self.journal.recover(self.game)
+            self.log_message(result)
+            self.refresh_after_load()
+        else:
+            self.journal.start(self.game)
+
+    def quit_game(self):
+        """退出游戏,退出前等待后台存档完成并把操作日志写入磁盘;
+        正在进行的性能分析和启用的性能统计同时写入文件"""
+        self.quitting = True
+        self.bridge.close()
+        # 先关闭日志(退出时不再整理快照),再等待后台存档完成,
+        # 之后完成的存档不会再替换已关闭的日志
+        self.journal.flush(compact=False)
+        self.journal.close()
+        self.saver.close()
+        if self.profiler is not None:
+            self.toggle_profiling()
+        if self.metrics:
+            self.metrics.export(self.METRICS_FILE)
+        self.root.quit()
 
     def create_gui(self):
         # 创建主框架
@@ -897,8 +4186,9 @@ class PetGameGUI:
         file_menu.add_separator()
         file_menu.add_command(label="保存游戏", command=self.save_game)
         file_menu.add_command(label="加载游戏", command=self.load_game)
+        file_menu.add_command(label="导出存档(JSON)", command=self.export_game)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit)
+        file_menu.add_command(label="退出", command=self.quit_game)
 
         # 功能菜单
         function_menu = tk.Menu(menubar, tearoff=0)
@@ -907,55 +4197,18 @@ class PetGameGUI:
         function_menu.add_command(label="宠物社交", command=self.show_social_dialog)
         function_menu.add_command(label="宠物技能", command=self.show_skills_dialog)
         function_menu.add_command(label="成就查看", command=self.show_achievements_dialog)
+        function_menu.add_separator()
+        self.profile_var = tk.BooleanVar(value=False)
+        function_menu.add_checkbutton(label="性能分析(cProfile)", variable=self.profile_var,
+                                      command=self.toggle_profiling)
+        function_menu.add_command(label="导出性能统计", command=self.export_metrics)
 
     def perform_free_activity(self, activity_type: str) -> str:
         """执行免费活动"""
         if not self.current_pet:
             return "请先选择一个宠物！"
 
-        activities = {
-            "遛宠物": {
-                "energy_cost": 10,
-                "happiness_gain": 15,
-                "exp_gain": 10,
-                "coin_gain": 20
-            },
-            "清理": {
-                "energy_cost": 5,
-                "happiness_gain": 10,
-                "exp_gain": 5,
-                "coin_gain": 15
-            },
-            "基础训练": {
-                "energy_cost": 15,
-                "happiness_gain": 5,
-                "exp_gain": 15,
-                "coin_gain": 25
-            }
-        }
-
-        if activity_type not in activities:
-            return "无效的活动类型"
-
-        activity = activities[activity_type]
-
-        # 检查体力
-        if self.current_pet.energy < activity["energy_cost"]:
-            return f"{self.current_pet.name}太累了，需要休息"
-
-        # 执行活动
-        self.current_pet.energy -= activity["energy_cost"]
-        self.current_pet.happiness = min(100, self.current_pet.happiness + activity["happiness_gain"])
-        self.current_pet.gain_experience(activity["exp_gain"])
-        self.game.money += activity["coin_gain"]
-
-        # 尝试完成每日任务
-        success, bonus = self.game.daily_task.complete_task(activity_type)
-        if success:
-            self.game.money += bonus
-            return f"{self.current_pet.name}完成了{activity_type}！获得{activity['coin_gain']}金币和{bonus}金币的任务奖励！"
-
-        return f"{self.current_pet.name}完成了{activity_type}！获得{activity['coin_gain']}金币！"
+        return self.game.perform_free_activity(self.current_pet, activity_type)
 
     def create_main_tab(self):
         """创建主要信息标签页"""
@@ -971,9 +4224,11 @@ class PetGameGUI:
         pet_list_frame = ttk.LabelFrame(main_tab, text="我的宠物", padding="5")
         pet_list_frame.grid(row=0, column=0, rowspan=3, padx=5, pady=5, sticky="nsew")
 
-        self.pet_listbox = tk.Listbox(pet_list_frame, width=20, height=15)
-        self.pet_listbox.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
-        self.pet_listbox.bind('<<ListboxSelect>>', self.on_select_pet)
+        # 只渲染可见行的宠物列表,宠物数量很多时也不会卡顿
+        self.pet_list = VirtualPetList(pet_list_frame, height=15, on_select=self.on_select_pet)
+        self.pet_list.frame.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
+        self.pet_list.set_names(pet.name for pet in self.game.pets)
+        self.game.take_pet_changes()
 
         # 添加宠物按钮
         add_pet_button = ttk.Button(pet_list_frame, text="添加新宠物",
@@ -1068,63 +4323,49 @@ class PetGameGUI:
         skills_frame.grid_rowconfigure(0, weight=1)
 
     def update_all_displays(self):
-        """更新所有显示内容的统一函数"""
+        """更新所有显示内容的统一函数,只重绘数据发生变化的部分;
+        由调度器在数据变化、心情检查和每分钟开始时调用"""
         try:
-            # 1. 更新宠物状态
-            if self.current_pet:
-                self.current_pet.update_mood()
+            dirty = self.game.take_dirty()
+
+            # 1. 更新宠物状态(饥饿度和体力随时间变化,按显示内容判断是否需要重绘)
+            if "status" in dirty or self._status_key() != self._rendered.get("status"):
                 self.update_status()  # 更新主界面的宠物状态显示
+                self.update_contest_pet_info()  # 更新比赛页面的宠物信息
 
-            # 2. 更新每日任务状态和显示
-            if hasattr(self, 'daily_tasks_text'):
-                if hasattr(self.game, 'daily_tasks'):
-                    tasks = self.game.daily_task
-                    if hasattr(tasks, 'refresh_tasks'):  # 检查是否是正确的DailyTasks实例
-                        tasks.refresh_tasks()  # 检查是否需要刷新每日任务
-
-                        self.daily_tasks_text.delete(1.0, tk.END)
-                        self.daily_tasks_text.insert(tk.END, "每日任务状态：\n")
-
-                        # 计算任务刷新倒计时
-                        now = datetime.now()
-                        next_refresh = datetime.combine(
-                            tasks.last_refresh.date() + timedelta(days=1),
-                            datetime.min.time()
-                        )
-                        time_until_refresh = next_refresh - now
-                        hours = time_until_refresh.seconds // 3600
-                        minutes = (time_until_refresh.seconds % 3600) // 60
-
-                        self.daily_tasks_text.insert(tk.END,
-                                                     f"距离任务刷新还有：{hours}小时{minutes}分钟\n\n")
-
-                        # 显示所有任务状态
-                        for task_name, task_info in tasks.tasks.items():
-                            status = "已完成" if task_info["completed"] else \
-                                f"未完成 (奖励{task_info['reward']}金币)"
-                            self.daily_tasks_text.insert(tk.END,
-                                                         f"{task_name}: {status}\n{task_info['description']}\n")
+            # 2. 更新每日任务状态和显示(倒计时精确到分钟)
+            if self.game.daily_task.refresh_tasks():
+                dirty.add("tasks")
+            minute = datetime.now().strftime("%Y-%m-%d %H:%M")
+            if "tasks" in dirty or minute != self._rendered.get("tasks"):
+                self.update_daily_tasks_display()
+                self._rendered["tasks"] = minute
 
             # 3. 更新金币显示
-            if hasattr(self, 'money_label'):
+            if "money" in dirty:
                 self.money_label.config(text=f"当前金币: {self.game.money}")
 
-            # 4. 更新商店显示
-            if hasattr(self, 'update_shop_display'):
+            # 4. 更新商店库存显示
+            if "inventory" in dirty:
                 self.update_shop_display()
 
-            # 5. 如果在比赛标签页，更新比赛相关信息
-            if hasattr(self, 'contest_pet_info'):
-                self.update_contest_pet_info()
-
-            # 6. 更新宠物列表
-            if hasattr(self, 'update_pet_list'):
+            # 5. 更新宠物列表
+            if "pets" in dirty:
                 self.update_pet_list()
 
+            # 6. 更新最佳比赛表
+            if "contests" in dirty:
+                self.update_best_contests()
+
         except Exception as e:
             self.log_message(f"更新显示时发生错误: {str(e)}")
 
-        self.root.after(1000, self.update_all_displays)  # 每秒更新一次
+    def _status_key(self) -> Optional[tuple]:
+        """当前宠物显示内容的摘要,用于判断状态区是否需要重绘"""
+        pet = self.current_pet
+        if not pet:
+            return None
+        return (pet.name, pet.revision, round(pet.hunger, 1), round(pet.energy, 1), pet.mood)
 
     def start_display_updates(self):
         """启动定时更新"""
@@ -1154,7 +4395,7 @@ class PetGameGUI:
 
         self.game_var = tk.StringVar()
         game_combo = ttk.Combobox(play_frame, textvariable=self.game_var)
-        game_combo['values'] = ["fetch", "chase", "hide_seek", "training"]
+        game_combo['values'] = list(RULES.games.names())
         game_combo.pack(fill=tk.X, padx=5, pady=2)
 
         play_button = ttk.Button(play_frame, text="玩耍", command=self.play_with_pet)
@@ -1212,11 +4453,26 @@ class PetGameGUI:
 
     def update_daily_tasks_display(self):
         """更新每日任务显示"""
+        tasks = self.game.daily_task
         self.daily_tasks_text.delete(1.0, tk.END)
         self.daily_tasks_text.insert(tk.END, "每日任务状态：\n")
-        for task_name, task_info in self.game.daily_task.tasks.items():
+
+        # 计算任务刷新倒计时
+        now = datetime.now()
+        next_refresh = datetime.combine(
+            tasks.last_refresh.date() + timedelta(days=1),
+            datetime.min.time()
+        )
+        time_until_refresh = next_refresh - now
+        hours = time_until_refresh.seconds // 3600
+        minutes = (time_until_refresh.seconds % 3600) // 60
+
+        self.daily_tasks_text.insert(tk.END, f"距离任务刷新还有：{hours}小时{minutes}分钟\n\n")
+
+        # 显示所有任务状态
+        for task_name, task_info in tasks.tasks.items():
             status = "已完成" if task_info["completed"] else f"未完成 (奖励{task_info['reward']}金币)"
-            self.daily_tasks_text.insert(tk.END, f"{task_name}: {status}\n")
+            self.daily_tasks_text.insert(tk.END, f"{task_name}: {status}\n{task_info['description']}\n")
 
     def create_shop_tab(self):
         """创建商店标签页"""
@@ -1229,6 +4485,10 @@ class PetGameGUI:
         self.money_label = ttk.Label(money_frame, text=f"当前金币: {self.game.money}")
         self.money_label.pack(side=tk.LEFT)
 
+        # 各商品的库存标签及其当前显示的数量
+        self.stock_labels: Dict[str, ttk.Label] = {}
+        self._stock_shown: Dict[str, int] = {}
+
         # 创建商品列表
         shop_frame = ttk.Frame(shop_tab)
         shop_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -1297,9 +4557,26 @@ class PetGameGUI:
         self.contest_record = tk.Text(record_frame, height=10)
         self.contest_record.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
+        # 每个宠物的最佳比赛(按期望收益排列)
+        best_frame = ttk.LabelFrame(left_frame, text="最佳比赛")
+        best_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        columns = ("宠物", "比赛", "胜率", "期望收益")
+        self.best_contest_tree = ttk.Treeview(best_frame, columns=columns, show="headings", height=8)
+        for col in columns:
+            self.best_contest_tree.heading(col, text=col)
+            self.best_contest_tree.column(col, width=100)
+        self.best_contest_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        odds_button = ttk.Button(best_frame, text="计算胜率", command=self.update_best_contests)
+        odds_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        enter_all_button = ttk.Button(best_frame, text="全部参加最佳比赛", command=self.enter_best_contests)
+        enter_all_button.pack(side=tk.LEFT, padx=5, pady=5)
+
         # 初始化比赛系统
         if not hasattr(self.game, 'contest_system'):
-            self.game.contest_system = ContestSystem()
+            self.game.contest_system = ContestSystem(self.game.rng)
 
         # 初始显示比赛列表
         self.refresh_contest_list()
@@ -1324,6 +4601,22 @@ class PetGameGUI:
             )
             self.contest_tree.insert("", tk.END, values=values)
 
+        self.update_best_contests()
+
+    def update_best_contests(self):
+        """计算所有宠物的最佳比赛,显示期望收益最高的前BEST_CONTEST_ROWS个"""
+        contest_system = self.game.contest_system
+        table = contest_system.best_contests(self.game.pets)
+        self.best_contest_tree.delete(*self.best_contest_tree.get_children())
+        for pet, contest_index, chance, expected in table[:self.BEST_CONTEST_ROWS]:
+            contest = contest_system.available_contests[contest_index]
+            self.best_contest_tree.insert("", tk.END, values=(
+                pet.name,
+                f"{contest['type'].value}（{contest['difficulty'].value[0]}）",
+                f"{chance:.0%}",
+                f"{expected:+.0f}金币"
+            ))
+
     def update_contest_pet_info(self):
         """更新比赛页面的宠物信息"""
         if not self.current_pet:
@@ -1360,46 +4653,48 @@ class PetGameGUI:
             messagebox.showwarning("警告", "金币不足，无法支付报名费！")
             return
 
-        # 扣除报名费
-        self.game.money -= contest['entry_fee']
+        # 参加比赛(报名费和奖励由游戏统一结算)
+        self.run_contests([(self.current_pet, contest_index)])
 
-        # 参加比赛
-        success, message, rewards = self.game.contest_system.enter_contest(
-            self.current_pet, contest_index)
+    def enter_best_contests(self):
+        """让所有宠物参加各自期望收益为正的最佳比赛"""
+        entries = [(pet, contest_index) for pet, contest_index, _chance, expected
+                   in self.game.contest_system.best_contests(self.game.pets) if expected > 0]
+        if not entries:
+            messagebox.showinfo("提示", "没有期望收益为正的比赛")
+            return
+        if not messagebox.askyesno("确认", f"让{len(entries)}个宠物参加各自的最佳比赛？"):
+            return
+        self.run_contests(entries)
+
+    def run_contests(self, entries):
+        """批量参加比赛,记录结果后统一刷新一次界面"""
+        contests = self.game.contest_system.available_contests
+        results = self.game.enter_contests(entries)
 
         # 记录比赛结果
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        record = f"[{timestamp}] {self.current_pet.name} 参加 {contest['type'].value}"
-        record += f"（{contest['difficulty'].value[0]}）: {message}\n"
-
-        if "不足" in message:
-            self.game.money += contest['entry_fee']  # 退还报名费
-
-        if success and rewards:
-            # 发放奖励
-            self.game.money += rewards['money']
-            self.current_pet.gain_experience(rewards['exp'])
-
-            # 更新记录
-            record += f"获得奖励：{rewards['money']}金币, {rewards['exp']}经验"
-            if rewards['items']:
-                record += ", 物品："
-                for item, count in rewards['items'].items():
-                    if item in self.game.food_inventory:
-                        self.game.food_inventory[item] = \
-                            self.game.food_inventory[item] + count
-                    elif item in self.game.items_inventory:
-                        self.game.items_inventory[item] = \
-                            self.game.items_inventory[item] + count
-                    record += f"{item}x{count} "
-            record += "\n"
+        records = []
+        for (pet, contest_index), (_joined, success, message, rewards) in zip(entries, results):
+            contest = contests[contest_index]
+            record = f"[{timestamp}] {pet.name} 参加 {contest['type'].value}"
+            record += f"（{contest['difficulty'].value[0]}）: {message}\n"
+            if success and rewards:
+                record += f"获得奖励：{rewards['money']}金币, {rewards['exp']}经验"
+                if rewards['items']:
+                    record += ", 物品："
+                    for item, count in rewards['items'].items():
+                        record += f"{item}x{count} "
+                record += "\n"
+            records.append(record)
 
         # 显示比赛结果
-        self.contest_record.insert(tk.END, record)
+        self.contest_record.insert(tk.END, "".join(records))
         self.contest_record.see(tk.END)
 
         # 更新显示
         self.update_contest_pet_info()
+        self.update_best_contests()
         self.update_status()  # 更新主页面宠物状态
         self.money_label.config(text=f"当前金币: {self.game.money}")  # 更新金币显示
 
@@ -1450,6 +4745,8 @@ class PetGameGUI:
             # 库存显示
             stock_label = ttk.Label(frame, text=f"库存: {amount}")
             stock_label.pack(side=tk.LEFT, padx=5)
+            self.stock_labels[item] = stock_label
+            self._stock_shown[item] = amount
 
             # 购买数量输入
             quantity_var = tk.StringVar(value="1")
@@ -1478,7 +4775,7 @@ class PetGameGUI:
             result = self.game.buy_item(item_type, quantity)
 
         self.log_message(result)
-        self.update_shop_display()
+        self.update_shop_display([item_type])
 
     def use_item(self):
         """使用物品"""
@@ -1494,53 +4791,35 @@ class PetGameGUI:
         result = self.game.use_item(item_type, self.current_pet.name)
         self.log_message(result)
         self.update_status()
-        self.update_shop_display()
-
-    def update_shop_display(self):
-        """更新商店显示"""
-        # 找到商店标签页
-        for tab in self.notebook.winfo_children():
-            if isinstance(tab, ttk.Frame):
-                # 检查是否是商店标签页
-                for widget in tab.winfo_children():
-                    if isinstance(widget, ttk.Frame):
-                        # 递归更新所有标签
-                        self._update_stock_labels(widget)
-
-                        # 更新金币显示
-                        if hasattr(self, 'money_label'):
-                            self.money_label.config(text=f"当前金币: {self.game.money}")
-
-    def _update_stock_labels(self, widget):
-        """递归更新所有库存标签"""
-        # 检查当前widget是否是标签
-        if isinstance(widget, ttk.Label):
-            text = widget.cget('text')
-            if text.startswith('库存:'):
-                # 从标签文本中提取物品名称
-                for item, amount in self.game.food_inventory.items():
-                    if item in text:
-                        widget.config(text=f"库存: {amount}")
-                for item, amount in self.game.items_inventory.items():
-                    if item in text:
-                        widget.config(text=f"库存: {amount}")
-
-        # 递归处理所有子widget
-        children = []
-        try:
-            children = widget.winfo_children()
-        except:
-            pass
-
-        for child in children:
-            self._update_stock_labels(child)
-
-    def on_select_pet(self, event):
+        self.update_shop_display([item_type])
+
+    def update_shop_display(self, items: Optional[Iterable[str]] = None):
+        """更新商店显示,items为发生变化的商品,为空时检查全部商品"""
+        if items is None:
+            items = self.stock_labels
+
+        for item in items:
+            label = self.stock_labels.get(item)
+            if label is None:
+                continue
+            if item in self.game.food_inventory:
+                amount = self.game.food_inventory[item]
+            else:
+                amount = self.game.items_inventory.get(item, 0)
+            # 库存未变化时不重绘
+            if self._stock_shown.get(item) != amount:
+                label.config(text=f"库存: {amount}")
+                self._stock_shown[item] = amount
+
+        # 更新金币显示
+        self.money_label.config(text=f"当前金币: {self.game.money}")
+
+    def on_select_pet(self, pet_name: str):
         """选择宠物时的回调"""
-        selection = self.pet_listbox.curselection()
-        if selection:
-            pet_name = self.pet_listbox.get(selection[0])
-            self.current_pet = self.game.find_pet(pet_name)
+        pet = self.game.find_pet(pet_name)
+        if pet:
+            self.current_pet = pet
+            self.game.mark_dirty("status")
             self.update_status()
 
     def update_status(self):
@@ -1563,6 +4842,9 @@ class PetGameGUI:
 
         for stat, value in stats:
             if stat in self.status_labels:
+                # 饥饿度和体力随时间连续变化,显示时保留一位小数
+                if isinstance(value, float):
+                    value = round(value, 1)
                 self.status_labels[stat].config(text=str(value))
 
         # 更新进度条
@@ -1583,6 +4865,8 @@ class PetGameGUI:
             exp = self.current_pet.skill_exp.get(skill, 0)
             self.skills_list.insert(tk.END, f"{skill} (熟练度: {exp})")
 
+        self._rendered["status"] = self._status_key()
+
     def show_training_dialog(self):
         """显示训练对话框"""
         if not self.current_pet:
@@ -1608,7 +4892,8 @@ class PetGameGUI:
 
     def train_skill(self, skill):
         """训练技能"""
-        result = self.current_pet.train_skill(skill)
+        result = self.current_pet.train_skill(skill, self.game.rng.skills)
+        self.game.record_action("train_skill", self.current_pet)
         self.log_message(result)
         self.update_status()
 
@@ -1642,11 +4927,12 @@ class PetGameGUI:
         # 这里可以添加具体的互动逻辑
         self.current_pet.happiness += 10
         other_pet.happiness += 10
+        self.current_pet.touch()
+        other_pet.touch()
 
-        if other_pet.name not in self.current_pet.friends:
-            self.current_pet.friends.append(other_pet.name)
-        if self.current_pet.name not in other_pet.friends:
-            other_pet.friends.append(self.current_pet.name)
+        self.current_pet.add_friend(other_pet.name)
+        other_pet.add_friend(self.current_pet.name)
+        self.game.record_action("social", self.current_pet, other_pet)
 
         self.log_message(f"{self.current_pet.name}和{other_pet.name}进行了愉快的互动！")
         self.update_status()
@@ -1678,41 +4964,87 @@ class PetGameGUI:
         self.log_text.see(tk.END)
 
     def save_game(self):
-        """保存游戏"""
-        result = self.game.save_game()
+        """保存游戏(在后台线程写入,存档完成后操作日志以它为起点)"""
+        self.journal.save_base(self.game.prepare_save(self.SAVE_FILE), self.SAVE_FILE,
+                               self.on_save_done)
+
+    def export_game(self):
+        """导出JSON格式的存档"""
+        self.saver.submit(self.game.prepare_save(self.EXPORT_FILE),
+                          lambda ok, result: self.on_save_done(ok, f"{result}: {self.EXPORT_FILE}"))
+
+    def toggle_profiling(self):
+        """开始或结束cProfile性能分析(只分析界面线程),
+        结束时写入PROFILE_FILE并在日志中列出累计耗时最多的函数"""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            self.log_message("已开始性能分析")
+        else:
+            profiler, self.profiler = self.profiler, None
+            profiler.disable()
+            profiler.dump_stats(self.PROFILE_FILE)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.PROFILE_TOP)
+            self.log_message(f"性能分析已写入{self.PROFILE_FILE}\n{report.getvalue()}")
+        self.profile_var.set(self.profiler is not None)
+
+    def export_metrics(self):
+        """把性能统计写入METRICS_FILE"""
+        if self.metrics is None:
+            messagebox.showinfo("提示", f"性能统计未启用，请设置环境变量{GameMetrics.ENV_VAR}=1后重新启动游戏")
+            return
+        self.log_message(self.metrics.export(self.METRICS_FILE))
+
+    def on_save_done(self, ok: bool, result: str):
+        """后台存档完成后的回调"""
         self.log_message(result)
-        messagebox.showinfo("提示", result)
+        if self.quitting:
+            return
+        if ok:
+            messagebox.showinfo("提示", result)
+        else:
+            messagebox.showerror("错误", result)
 
     def load_game(self):
         """加载游戏"""
         if messagebox.askyesno("确认", "加载游戏将覆盖当前进度，是否继续？"):
-            result = self.game.load_game()
+            # 没有二进制存档时读取旧版本的JSON存档
+            filename = self.SAVE_FILE
+            if not os.path.exists(filename):
+                filename = self.EXPORT_FILE
+            result = self.game.load_game(filename)
             self.log_message(result)
+            if result == "游戏已加载":
+                self.journal.start(self.game, filename)
 
-            # 重置当前选中的宠物
-            self.current_pet = None
+            self.refresh_after_load()
+            messagebox.showinfo("提示", result)
 
-            # 更新界面
-            self.notebook.destroy()
-            self.notebook = ttk.Notebook(self.main_frame)
-            self.notebook.grid(row=0, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
+    def refresh_after_load(self):
+        """加载或恢复游戏后重建界面"""
+        # 重置当前选中的宠物
+        self.current_pet = None
 
-            # 重新创建所有标签页
-            self.create_main_tab()  # 主要信息标签页
-            self.create_shop_tab()  # 商店标签页
-            self.create_contest_tab()  # 比赛标签页
-            self.create_task_tab()  # 任务标签页
+        # 更新界面
+        self.notebook.destroy()
+        self.notebook = ttk.Notebook(self.main_frame)
+        self.notebook.grid(row=0, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
 
-            # 更新宠物列表
-            self.update_pet_list()
+        # 重新创建所有标签页
+        self.create_main_tab()  # 主要信息标签页
+        self.create_shop_tab()  # 商店标签页
+        self.create_contest_tab()  # 比赛标签页
+        self.create_task_tab()  # 任务标签页
 
-            # 如果有宠物，选中第一个
-            if self.game.pets:
-                self.pet_listbox.selection_set(0)
-                self.current_pet = self.game.pets[0]
-                self.update_status()
+        # 更新宠物列表
+        self.update_pet_list()
 
-            messagebox.showinfo("提示", result)
+        # 如果有宠物，选中第一个
+        if self.game.pets:
+            self.current_pet = self.game.pets[0]
+            self.pet_list.select(self.current_pet.name)
+            self.update_status()
 
     def show_add_pet_dialog(self):
         """显示添加宠物对话框"""
@@ -1742,7 +5074,7 @@ class PetGameGUI:
                 messagebox.showwarning("警告", "请选择宠物品种！")
                 return
 
-            if any(pet.name == name for pet in self.game.pets):
+            if self.game.is_name_taken(name):
                 messagebox.showwarning("警告", "这个名字已经被使用了！")
                 return
 
@@ -1759,12 +5091,14 @@ class PetGameGUI:
             messagebox.showwarning("警告", "请先选择一个宠物！")
             return
 
-        try:
-            result = self.current_pet.save_pet()
-            self.log_message(result)
-            messagebox.showinfo("成功", result)
-        except Exception as e:
-            messagebox.showerror("错误", f"保存宠物失败: {str(e)}")
+        def done(ok: bool, result: str):
+            if ok:
+                self.log_message(result)
+                messagebox.showinfo("成功", result)
+            else:
+                messagebox.showerror("错误", result)
+
+        self.saver.submit(self.current_pet.prepare_save(), done)
 
     def load_pet_dialog(self):
         """显示加载宠物对话框"""
@@ -1774,9 +5108,9 @@ class PetGameGUI:
             messagebox.showinfo("提示", "没有找到已保存的宠物！")
             return
 
-        # 获取所有宠物存档文件
-        pet_files = [f for f in os.listdir(save_dir) if f.endswith('.json')]
-        if not pet_files:
+        # 从存档索引获取所有宠物的摘要,不需要逐个打开存档文件
+        pet_saves = PetSaveCatalog(save_dir).entries()
+        if not pet_saves:
             messagebox.showinfo("提示", "没有找到已保存的宠物！")
             return
 
@@ -1794,20 +5128,14 @@ class PetGameGUI:
             tree.heading(col, text=col)
             tree.column(col, width=100)
 
-        # 加载并显示宠物信息
-        for file in pet_files:
-            try:
-                with open(os.path.join(save_dir, file), 'r', encoding='utf-8') as f:
-                    pet_data = json.load(f)
-                    # 添加到显示列表
-                    tree.insert("", "end", values=(
-                        pet_data["name"],
-                        pet_data["species"],
-                        pet_data["level"],
-                        "睡眠中" if pet_data["is_sleeping"] else "清醒"
-                    ))
-            except Exception as e:
-                print(f"加载宠物文件 {file} 时出错: {str(e)}")
+        # 显示宠物信息,行id为存档文件名
+        for file_name, summary in sorted(pet_saves.items()):
+            tree.insert("", "end", iid=file_name, values=(
+                summary["name"],
+                summary["species"],
+                summary["level"],
+                "睡眠中" if summary["is_sleeping"] else "清醒"
+            ))
 
         tree.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
 
@@ -1818,23 +5146,23 @@ class PetGameGUI:
                 messagebox.showwarning("警告", "请选择一个宠物！")
                 return
 
-            # 获取选中的宠物名称
-            pet_name = tree.item(selection[0])["values"][0]
-            file_name = f"{pet_name}.json"
+            # 获取选中的宠物存档
+            file_name = selection[0]
+            pet_name = pet_saves[file_name]["name"]
 
             try:
                 # 读取宠物数据
                 with open(os.path.join(save_dir, file_name), 'r', encoding='utf-8') as f:
                     pet_data = json.load(f)
 
-                # 创建新的宠物实例
-                pet = Pet(pet_data["name"], pet_data["species"])
-                for key, value in pet_data.items():
-                    if hasattr(pet, key):
-                        setattr(pet, key, value)
+                # 创建新的宠物实例(加入游戏时才放入列式名册)
+                pet = Pet.from_dict(pet_data)
 
                 # 添加到游戏中
-                self.game.pets.append(pet)
+                if self.game.is_name_taken(pet.name):
+                    messagebox.showwarning("警告", "这个名字已经被使用了！")
+                    return
+                self.game.adopt_pet(pet)
                 self.log_message(f"成功加载宠物 {pet_name}！")
                 self.update_pet_list()
                 dialog.destroy()
@@ -1851,10 +5179,10 @@ class PetGameGUI:
         cancel_button.pack(padx=5, pady=5)
 
     def update_pet_list(self):
-        """更新宠物列表"""
-        self.pet_listbox.delete(0, tk.END)
-        for pet in self.game.pets:
-            self.pet_listbox.insert(tk.END, pet.name)
+        """按PetGame记录的变化增量更新宠物列表"""
+        changes = self.game.take_pet_changes()
+        if changes:
+            self.pet_list.apply_changes(changes, (pet.name for pet in self.game.pets))
 
     def feed_pet(self):
         """喂食宠物"""
@@ -1872,7 +5200,9 @@ class PetGameGUI:
             return
 
         self.game.food_inventory[food_type] -= 1
-        result = self.current_pet.feed(food_type)
+        self.game.mark_dirty("inventory")
+        result = self.current_pet.feed(food_type, self.game.rng.skills)
+        self.game.record_action("feed", self.current_pet)
         self.log_message(result)
         self.update_status()
 
@@ -1887,7 +5217,8 @@ class PetGameGUI:
             messagebox.showwarning("警告", "请选择游戏！")
             return
 
-        result = self.current_pet.play(game_type)
+        result = self.current_pet.play(game_type, self.game.rng.skills)
+        self.game.record_action("play", self.current_pet)
         self.log_message(result)
         self.update_status()
 
@@ -1898,6 +5229,7 @@ class PetGameGUI:
             return
 
         result = self.current_pet.sleep()
+        self.game.record_action("sleep", self.current_pet)
         self.log_message(result)
         self.update_status()
 
@@ -1908,6 +5240,7 @@ class PetGameGUI:
             return
 
         result = self.current_pet.wake_up()
+        self.game.record_action("wake_up", self.current_pet)
         self.log_message(result)
         self.update_status()
 
@@ -1960,7 +5293,8 @@ class PetGameGUI:
 
     def train_skill_from_dialog(self, skill: str, dialog: tk.Toplevel):
         """从技能对话框中训练技能"""
-        result = self.current_pet.train_skill(skill)
+        result = self.current_pet.train_skill(skill, self.game.rng.skills)
+        self.game.record_action("train_skill", self.current_pet)
         self.log_message(result)
         self.update_status()
         # 关闭旧对话框并打开新的，以更新显示
@@ -1969,8 +5303,7 @@ class PetGameGUI:
 
     def get_next_skill_level(self) -> Optional[int]:
         """获取下一个技能解锁等级"""
-        skill_levels = [5, 10, 15, 20, 30]
-        for level in skill_levels:
+        for level in SKILL_UNLOCK_LEVELS:
             if self.current_pet.level < level:
                 return level
         return None
@@ -1979,7 +5312,7 @@ class PetGameGUI:
 def main():
     root = tk.Tk()
     game = PetGame()
-    app = PetGameGUI(root, game)
+    app = PetGameGUI(root, game, GameMetrics.from_env())
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+"""最佳比赛表的缓存"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import ContestSystem, GameRandom, PetGame  # noqa: E402
+
+
+class BestContestsCacheTest(unittest.TestCase):
+    """缓存的结果与重新计算的结果一致,宠物变化后重新计算"""
+
+    def setUp(self):
+        self.game = PetGame(seed=3)
+        for index in range(20):
+            self.game.add_pet(f"宠物{index}", "猫咪")
+        self.contests = self.game.contest_system
+
+    def fresh_table(self):
+        fresh = ContestSystem(GameRandom(0))
+        fresh.available_contests = self.contests.available_contests
+        return fresh.best_contests(self.game.pets)
+
+    def test_cached_table_follows_pet_changes(self):
+        self.assertEqual(self.contests.best_contests(self.game.pets), self.fresh_table())
+
+        pet = self.game.find_pet("宠物7")
+        pet.agility += 300
+        pet.strength += 300
+        pet.intelligence += 300
+        pet.touch()
+        table = self.contests.best_contests(self.game.pets)
+        self.assertIs(table[0][0], pet)
+        self.assertEqual(table, self.fresh_table())
+
+        pet.energy = 0  # 体力不足时不能参赛
+        table = self.contests.best_contests(self.game.pets)
+        self.assertNotIn(pet, [row[0] for row in table])
+
+    def test_win_chance_is_capped(self):
+        pet = self.game.find_pet("宠物0")
+        pet.agility = pet.strength = pet.intelligence = 1000
+        pet.skill_exp = {skill: 10_000 for skill in ("灵巧跳跃", "忠诚守护", "夜视能力", "优雅姿态")}
+        for contest in self.contests.available_contests:
+            self.assertLessEqual(self.contests.win_chance(pet, contest), ContestSystem.MAX_WIN_CHANCE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""无界面引擎的模拟时钟"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import CLOCK, GameEngine, HouseholdSimulation, Pet, PetGame, game_time  # noqa: E402
+
+START = 1_700_000_000.0
+HOURS = 3600
+
+
+class GameEngineClockTest(unittest.TestCase):
+    """引擎推进自己的时钟,不修改全局的CLOCK"""
+
+    def test_engine_clock_is_local(self):
+        game = PetGame(seed=1)
+        engine = GameEngine(game, tick_seconds=HOURS, start_time=START)
+        with engine.clock.activate():
+            game.add_pet("小白", "猫咪")
+        pet = game.find_pet("小白")
+
+        self.assertEqual(engine.run(4), START + 4 * HOURS)
+        self.assertIsNone(CLOCK.simulated_time)
+        with engine.clock.activate():
+            self.assertEqual(game_time(), START + 4 * HOURS)
+            self.assertEqual(pet.hunger, 50 + 4 * Pet.HUNGER_PER_HOUR)
+        self.assertNotEqual(game_time(), START + 4 * HOURS)
+
+    def test_daily_tasks_refresh_on_simulated_days(self):
+        game = PetGame(seed=1)
+        engine = GameEngine(game, tick_seconds=HOURS, start_time=START)
+        game.daily_task.complete_task("遛宠物")
+
+        engine.run(23)
+        self.assertTrue(game.daily_task.tasks["遛宠物"]["completed"])
+        engine.run(2)
+        self.assertFalse(game.daily_task.tasks["遛宠物"]["completed"])
+
+        game.daily_task.complete_task("遛宠物")
+        engine.run(48)
+        self.assertFalse(game.daily_task.tasks["遛宠物"]["completed"])
+
+    def test_household_simulation_is_deterministic(self):
+        config = HouseholdSimulation(households=1, pets_per_household=3, ticks=200, seed=7).config
+        first = HouseholdSimulation.simulate_household(0, config)
+        self.assertEqual(HouseholdSimulation.simulate_household(0, config), first)
+        self.assertIsNone(CLOCK.simulated_time)
+        metrics = dict(zip(HouseholdSimulation.METRICS, first))
+        self.assertGreater(metrics["contests_entered"], 0)
+        self.assertLessEqual(metrics["contests_won"], metrics["contests_entered"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""操作日志的恢复"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import GameJournal, PetGame  # noqa: E402
+
+
+class JournalRecoveryTest(unittest.TestCase):
+    """恢复后任务、折扣和随机数子流与崩溃前一致"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def test_recover_restores_tasks_and_rng(self):
+        game = PetGame(seed=5)
+        game.generate_daily_tasks()
+        journal = GameJournal()
+        journal.start(game)
+
+        game.add_pet("小白", "猫咪")
+        pet = game.find_pet("小白")
+        game.current_discounts["premium_food"] = 0.2
+        game.check_task_completion("contest")
+        game.enter_contests([(pet, 0)])
+        game.daily_task.complete_task("遛宠物")
+        game.record_action("walk", pet)
+        journal.flush()
+        journal.close()
+
+        recovered = PetGame()
+        recovered.generate_daily_tasks()
+        self.assertEqual(GameJournal().recover(recovered), "已恢复进度,重放了3条操作记录")
+        self.assertEqual(recovered.money, game.money)
+        self.assertEqual(recovered.task_rewards, game.task_rewards)
+        self.assertTrue(recovered.daily_task.tasks["遛宠物"]["completed"])
+        self.assertEqual(recovered.current_discounts, {"premium_food": 0.2})
+        for name in ("skills", "contests", "rewards"):
+            self.assertEqual(recovered.rng.stream(name).random(), game.rng.stream(name).random())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""随时间变化的饥饿度和体力"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import CLOCK, Pet  # noqa: E402
+
+START = 1_700_000_000.0
+HOURS = 3600
+
+
+class PetStatDriftTest(unittest.TestCase):
+    """饥饿度随时间增长,体力只在睡眠期间恢复"""
+
+    def setUp(self):
+        CLOCK.simulated_time = START
+        self.pet = Pet("小白", "猫咪")
+
+    def tearDown(self):
+        CLOCK.simulated_time = None
+
+    def test_hunger_rises_over_time(self):
+        CLOCK.simulated_time = START + 4 * HOURS
+        self.assertEqual(self.pet.hunger, 50 + 4 * Pet.HUNGER_PER_HOUR)
+        CLOCK.simulated_time = START + 100 * HOURS
+        self.assertEqual(self.pet.hunger, 100)
+
+    def test_energy_recovers_only_while_sleeping(self):
+        self.pet.energy = 20
+        CLOCK.simulated_time = START + 2 * HOURS
+        self.assertEqual(self.pet.energy, 20)
+
+        self.pet.sleep()  # 入睡时立即恢复50
+        CLOCK.simulated_time = START + 3 * HOURS
+        self.assertEqual(self.pet.energy, 70 + Pet.ENERGY_PER_HOUR)
+        self.assertEqual(self.pet.energy_at(START + 4 * HOURS), 70 + 2 * Pet.ENERGY_PER_HOUR)
+
+        self.pet.wake_up()
+        CLOCK.simulated_time = START + 6 * HOURS
+        self.assertEqual(self.pet.energy, 70 + Pet.ENERGY_PER_HOUR)
+
+
+class PetSkillsTest(unittest.TestCase):
+    """已学技能只读,只能通过unlock_skill学习"""
+
+    def test_skills_are_read_only(self):
+        pet = Pet("小白", "猫咪")
+        self.assertEqual(pet.skills, ())
+        with self.assertRaises(AttributeError):
+            pet.skills.append("灵巧跳跃")
+
+        skill = pet.unlock_skill(random.Random(1))
+        self.assertEqual(pet.skills, (skill,))
+        self.assertEqual(pet.to_dict()["skills"], [skill])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""列式宠物名册的行分配"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import CLOCK, Pet, PetGame, np  # noqa: E402
+
+START = 1_700_000_000.0
+
+
+@unittest.skipIf(np is None, "列式宠物名册需要安装numpy")
+class PetRosterRowsTest(unittest.TestCase):
+    """出售、回购和加载存档后名册中只有当前宠物的行"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)
+        CLOCK.simulated_time = START
+        self.game = PetGame(columnar=True, seed=1)
+        for index in range(5):
+            self.game.add_pet(f"宠物{index}", "猫咪")
+
+    def tearDown(self):
+        CLOCK.simulated_time = None
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def assertRosterMatchesPets(self):
+        roster = self.game.roster
+        self.assertEqual(len(roster), len(self.game.pets))
+        for pet in self.game.pets:
+            self.assertIs(roster.pets[pet._row], pet)
+
+    def test_sell_and_buy_back_release_rows(self):
+        last = self.game.find_pet("宠物4")
+        last.happiness = 77
+        self.game.sell_pet("宠物1")
+        self.assertRosterMatchesPets()
+        self.assertEqual(last.happiness, 77)  # 最后一行移到了空出的位置
+
+        self.game.money = 100_000
+        self.game.buy_back_pet("宠物1")
+        self.assertRosterMatchesPets()
+        self.game.buy_back_pet("宠物1")  # 已经回购,不会再分配行
+        self.assertRosterMatchesPets()
+
+    def test_failed_adopt_does_not_allocate(self):
+        self.game.adopt_pet(Pet("宠物0", "小狗"))
+        self.assertRosterMatchesPets()
+
+    def test_load_game_replaces_rows(self):
+        self.game.sell_pet("宠物2")
+        self.game.save_game("game_save.json")
+        for _ in range(3):
+            self.assertEqual(self.game.load_game("game_save.json"), "游戏已加载")
+            self.assertRosterMatchesPets()
+        self.assertIsNotNone(self.game.sold_pets.get("宠物2"))
+        self.assertRosterMatchesPets()
+
+    def test_feed_all_levels_up_like_pet(self):
+        roster = self.game.roster
+        pet = self.game.find_pet("宠物0")
+        pet.experience = pet.get_exp_needed() - 1
+        revision = pet.revision
+        roster.feed_all("regular_food")
+        self.assertEqual(pet.level, 2)
+        self.assertGreater(pet.revision, revision)
+
+    def test_clamp_stats_marks_pets_changed(self):
+        pet = self.game.find_pet("宠物3")
+        pet.happiness = 150
+        self.game.save_game("game_save.db")
+        revisions = [other.revision for other in self.game.pets]
+        self.game.roster.clamp_stats()
+        self.assertTrue(all(other.revision > revision
+                            for other, revision in zip(self.game.pets, revisions)))
+
+        self.game.save_game("game_save.db")  # 增量保存写入限制后的值
+        loaded = PetGame()
+        loaded.load_game("game_save.db")
+        self.assertEqual(loaded.find_pet("宠物3").happiness, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
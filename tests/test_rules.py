@@ -0,0 +1,45 @@
+"""规则数据文件的加载"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import DEFAULT_RULES, GameRules  # noqa: E402
+
+
+class GameRulesLoadTest(unittest.TestCase):
+    """规则文件无效时给出警告并使用默认规则"""
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self._dir.name, "game_rules.json")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def write(self, text):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_partial_file_overrides_tables(self):
+        self.write(json.dumps({"foods": {"bone": {"hunger": 5, "health": 1, "exp": 2}}}))
+        rules = GameRules.load(self.filename)
+        self.assertEqual(list(rules.foods), ["bone"])
+        self.assertEqual(list(rules.games), list(DEFAULT_RULES["games"]))
+
+    def test_invalid_file_falls_back_to_defaults(self):
+        for text in ("{", "[]", json.dumps({"foods": {"bone": {"hunger": 5}}}),
+                     json.dumps({"contest_skills": {"AGILITY": ["灵巧跳跃"]}})):
+            self.write(text)
+            with self.assertWarns(RuntimeWarning):
+                rules = GameRules.load(self.filename)
+            self.assertEqual(list(rules.foods), list(DEFAULT_RULES["foods"]))
+            self.assertEqual(list(rules.contest_skills), list(DEFAULT_RULES["contest_skills"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
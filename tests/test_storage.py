@@ -0,0 +1,152 @@
+"""整局存档的往返测试: 保存 → 推进时钟 → 再次保存 → 重新加载"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from main_GUI_V5 import CLOCK, PetGame, PetSaveCatalog, SoldPetArchive, SqliteStorage  # noqa: E402
+
+START = 1_700_000_000.0
+HOURS = 3600
+
+
+class StorageRoundTripTest(unittest.TestCase):
+    """存档中没有变化的宠物也要从自己的保存时间补算饥饿度"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)
+        CLOCK.simulated_time = START
+
+    def tearDown(self):
+        CLOCK.simulated_time = None
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def new_game(self) -> PetGame:
+        game = PetGame(seed=1)
+        game.add_pet("小白", "猫咪")
+        game.add_pet("小黑", "小狗")
+        game.add_pet("小灰", "兔子")
+        game.sell_pet("小灰")
+        return game
+
+    def round_trip(self, filename: str) -> None:
+        game = self.new_game()
+        hunger = game.find_pet("小白").hunger
+        sold_hunger = game.sold_pets.get("小灰").hunger
+        game.save_game(filename)
+
+        # 推进时钟后再次保存,宠物本身没有变化,增量保存不会重写它们
+        CLOCK.simulated_time = START + 4 * HOURS
+        game.find_pet("小黑").happiness = 60
+        game.find_pet("小黑").touch()
+        game.save_game(filename)
+        expected = game.find_pet("小白").hunger
+        self.assertGreater(expected, hunger)
+
+        loaded = PetGame()
+        self.assertEqual(loaded.load_game(filename), "游戏已加载")
+        self.assertAlmostEqual(loaded.find_pet("小白").hunger, expected)
+        self.assertEqual(loaded.find_pet("小黑").happiness, 60)
+        self.assertAlmostEqual(loaded.sold_pets.get("小灰").hunger,
+                               sold_hunger + (expected - hunger))
+        self.assertIsInstance(loaded.sold_pets, SoldPetArchive)
+
+    def test_json(self):
+        self.round_trip("game_save.json")
+
+    def test_sqlite(self):
+        self.round_trip("game_save.db")
+
+    def test_sqlite_sell_after_load(self):
+        # 加载数据库后出售的宠物同样写入存档区,增量保存后两只已售宠物都在
+        self.new_game().save_game("game_save.db")
+        game = PetGame()
+        game.load_game("game_save.db")
+        game.find_pet("小黑").happiness = 61
+        game.sell_pet("小黑")
+        self.assertIsInstance(game.sold_pets, SoldPetArchive)
+        game.save_game("game_save.db")
+
+        loaded = PetGame()
+        loaded.load_game("game_save.db")
+        self.assertEqual([pet.name for pet in loaded.pets], ["小白"])
+        self.assertEqual([pet.name for pet in loaded.sold_pets], ["小灰", "小黑"])
+        self.assertEqual(loaded.sold_pets.get("小黑").happiness, 61)
+
+    def test_sqlite_query_pets_above_level(self):
+        game = self.new_game()
+        for name, level in (("小白", 31), ("小黑", 30)):
+            game.find_pet(name).level = level
+        game.find_pet("小白").skill_exp = {"灵巧跳跃": 12}
+        game.save_game("game_save.db")
+
+        storage = SqliteStorage("game_save.db")
+        found = storage.query_pets(("level", ">", 30))
+        self.assertEqual([data["name"] for data in found], ["小白"])
+        self.assertEqual(found[0]["skill_exp"], {"灵巧跳跃": 12})
+        self.assertEqual(len(storage.query_pets()), 2)
+        self.assertEqual([data["name"] for data in storage.query_pets(
+            ("species", "=", "兔子"), table="sold_pets")], ["小灰"])
+        with self.assertRaises(ValueError):
+            storage.query_pets(("level > 0; DROP TABLE pets; --", ">", 0))
+        with self.assertRaises(ValueError):
+            storage.query_pets(("level", "OR 1 OR", 0))
+
+    def test_json_duplicate_names(self):
+        # 旧版本的存档中可能有同名宠物,加载时改名而不是拒绝整个存档
+        game = self.new_game()
+        game.save_game("game_save.json")
+        with open("game_save.json", encoding="utf-8") as f:
+            save_data = json.load(f)
+        save_data["pets"].append(dict(save_data["pets"][0]))
+        with open("game_save.json", "w", encoding="utf-8") as f:
+            json.dump(save_data, f, ensure_ascii=False)
+
+        loaded = PetGame()
+        self.assertEqual(loaded.load_game("game_save.json"), "游戏已加载")
+        self.assertEqual([pet.name for pet in loaded.pets], ["小白", "小黑", "小白(2)"])
+
+    def test_binary(self):
+        self.round_trip("game_save.petsav")
+
+    def test_binary_resave_after_load(self):
+        # 加载后已售宠物的记录原样复制到新存档,写入时间不能变成新存档的时间
+        self.new_game().save_game("game_save.petsav")
+        game = PetGame()
+        game.load_game("game_save.petsav")
+        sold_hunger = game.sold_pets.get("小灰").hunger
+
+        CLOCK.simulated_time = START + 4 * HOURS
+        game.save_game("game_save.petsav")
+        expected = game.sold_pets.get("小灰").hunger
+        self.assertGreater(expected, sold_hunger)
+
+        loaded = PetGame()
+        loaded.load_game("game_save.petsav")
+        self.assertAlmostEqual(loaded.sold_pets.get("小灰").hunger, expected)
+
+    def test_pet_save_catalog_written_lazily(self):
+        # 保存宠物只记下摘要,列出存档时才写入索引文件
+        game = self.new_game()
+        for pet in game.pets:
+            pet.save_pet()
+        catalog = PetSaveCatalog()
+        self.assertFalse(os.path.exists(catalog.index_path))
+
+        entries = catalog.entries()
+        self.assertEqual(sorted(entries), ["小白.json", "小黑.json"])
+        self.assertEqual(entries["小黑.json"]["species"], "小狗")
+        with open(catalog.index_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["pets"], entries)
+        self.assertEqual(PetSaveCatalog().entries(), entries)
+
+
+if __name__ == "__main__":
+    unittest.main()